@@ -12,6 +12,9 @@ while ! nc -z db 5432; do
     sleep 1
 done
 
+# /src/entry_points/maintain_ita_partition_entry.py を実行（ita_tableのパーティションの事前作成と削除）
+/usr/local/bin/python3 /src/entry_points/maintain_ita_partition_entry.py
+
 # /src/entry_points/set_target_code_entry.py を実行
 /usr/local/bin/python3 /src/entry_points/set_target_code_entry.py
 
@@ -1,8 +1,12 @@
 -- init.sql
 
+-- ita_tableは取引日（日本時間）毎のレンジパーティションに分割します。
+-- 日毎のパーティションは entry_points/maintain_ita_partition_entry.py とコレクターの起動時に事前作成され、
+-- 保持期間を過ぎたパーティションはDROPで削除されます。
+
 CREATE TABLE
     IF NOT EXISTS ita_table (
-        id SERIAL PRIMARY KEY,
+        id SERIAL,
         code integer,
         pDPP numeric(6, 1),
         pDV integer,
@@ -59,21 +63,32 @@ CREATE TABLE
         pGBV3 integer,
         pGBV2 integer,
         pGBV1 integer,
+        tick_id bigint,
         created_at timestamp(6)
         with
-            time zone DEFAULT NOW(),
+            time zone NOT NULL DEFAULT NOW(),
             updated_at timestamp(6)
         with
-            time zone DEFAULT NOW()
-    );
+            time zone DEFAULT NOW(),
+            PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+
+-- 日毎のパーティションが作成されていない時刻の行を受け止めるデフォルトパーティション
+
+CREATE TABLE
+    IF NOT EXISTS ita_table_default PARTITION OF ita_table DEFAULT;
+
+-- CODE列とcreated_at列の複合インデックスを作成（各パーティションに作成されます）
+
+CREATE INDEX idx_ita_table_code_created_at ON ita_table (code, created_at);
 
--- CODE列にインデックスを作成
+-- created_at列にBRINインデックスを作成（各パーティションに作成されます）
 
-CREATE INDEX idx_ita_table_code ON ita_table (code);
+CREATE INDEX idx_ita_table_created_at_brin ON ita_table USING BRIN (created_at);
 
--- created_at列にインデックスを作成
+-- tick_id列にインデックスを作成（シャード取得したスナップショットの結合用）
 
-CREATE INDEX idx_ita_table_created_at ON ita_table (created_at);
+CREATE INDEX idx_ita_table_tick_id ON ita_table (tick_id);
 
 CREATE TABLE
     master_stock_table (
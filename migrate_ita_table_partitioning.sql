@@ -0,0 +1,35 @@
+-- migrate_ita_table_partitioning.sql
+-- 既存の（パーティション化されていない）ita_tableを、取引日毎のレンジパーティションに移行するスクリプトです。
+-- 新規に作成するデータベースでは init.sql がパーティション化されたita_tableを作成するため不要です。
+--
+-- 既存の行はそのまま ita_table_legacy パーティション（移行日より前の範囲）として取り込みます。
+-- 実行後に entry_points/maintain_ita_partition_entry.py を実行して日毎のパーティションを作成してください。
+-- 実行方法: psql -h db -U myuser -d mydatabase -v cutover="'2024-01-05 00:00:00+09'" -f migrate_ita_table_partitioning.sql
+
+BEGIN;
+
+ALTER TABLE ita_table RENAME TO ita_table_legacy;
+ALTER INDEX IF EXISTS ita_table_pkey RENAME TO ita_table_legacy_pkey;
+ALTER INDEX IF EXISTS idx_ita_table_code RENAME TO idx_ita_table_legacy_code;
+ALTER INDEX IF EXISTS idx_ita_table_created_at RENAME TO idx_ita_table_legacy_created_at;
+ALTER INDEX IF EXISTS idx_ita_table_tick_id RENAME TO idx_ita_table_legacy_tick_id;
+
+-- パーティションキーはNOT NULLである必要があるため、created_atが空の行は更新日時で補完
+UPDATE ita_table_legacy SET created_at = COALESCE(updated_at, NOW()) WHERE created_at IS NULL;
+ALTER TABLE ita_table_legacy ALTER COLUMN created_at SET NOT NULL;
+ALTER TABLE ita_table_legacy ADD COLUMN IF NOT EXISTS tick_id bigint;
+ALTER TABLE ita_table_legacy DROP CONSTRAINT ita_table_legacy_pkey;
+
+CREATE TABLE ita_table (LIKE ita_table_legacy INCLUDING DEFAULTS, PRIMARY KEY (id, created_at))
+    PARTITION BY RANGE (created_at);
+ALTER SEQUENCE ita_table_id_seq OWNED BY ita_table.id;
+
+CREATE TABLE ita_table_default PARTITION OF ita_table DEFAULT;
+
+CREATE INDEX idx_ita_table_code_created_at ON ita_table (code, created_at);
+CREATE INDEX idx_ita_table_created_at_brin ON ita_table USING BRIN (created_at);
+CREATE INDEX idx_ita_table_tick_id ON ita_table (tick_id);
+
+ALTER TABLE ita_table ATTACH PARTITION ita_table_legacy FOR VALUES FROM (MINVALUE) TO (:cutover);
+
+COMMIT;
@@ -0,0 +1,16 @@
+-- migrate_ita_table_tick_id.sql
+-- 既存のita_tableに、シャード取得したスナップショットを結合するためのtick_id列とインデックスを追加するスクリプトです。
+-- 新規に作成するデータベースでは init.sql がtick_id列を作成するため不要です。
+--
+-- デフォルト値のないNULL許容の列の追加はカタログの更新だけで終わるため、既存の行は書き換えません。
+-- 何度実行しても同じ結果になります（列とインデックスがすでにある場合は何もしません）。
+-- migrate_ita_table_partitioning.sql より前に実行した場合も、後に実行した場合も使用できます。
+-- 実行方法: psql -h db -U myuser -d mydatabase -f migrate_ita_table_tick_id.sql
+
+BEGIN;
+
+ALTER TABLE ita_table ADD COLUMN IF NOT EXISTS tick_id bigint;
+
+CREATE INDEX IF NOT EXISTS idx_ita_table_tick_id ON ita_table (tick_id);
+
+COMMIT;
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、疑似サーバー（dev_servers.fake_tachibana_server）とローカルのPostgreSQLに対して
+コレクター全体（ログイン → asyncioコレクター → execute_task → ita_table）を動かすベンチマークです。
+
+ファイル内の主な処理ステップ:
+1. 疑似サーバーを同じプロセス内で起動し（--server-url を指定した場合は起動済みのサーバーを使用）、ログインします。
+2. 銘柄数と同時実行数の組み合わせ毎に、asyncioコレクターを --duration 秒間動かします。
+3. 書き込みが完了する毎に、tick_id（ティック開始時刻のエポックミリ秒）からコミットまでの時間を記録します。
+4. snapshots/sec、rows/sec、tick-to-commitのp50/p99を出力し、コミットのハッシュと一緒にJSON Linesで保存します。
+5. ベンチマークで書き込んだ行は最後に削除します（--keep-rows を指定した場合は残します）。
+
+実行方法:
+python3 /src/benchmarks/collector_e2e_benchmark.py --codes 50 220 --concurrency 4 10 --duration 30
+
+注意事項:
+- ita_tableに書き込むため、本番とは別のデータベースを POSTGRES_* に指定して実行してください。
+"""
+import argparse
+import asyncio
+import datetime
+import functools
+import json
+import os
+import subprocess
+import threading
+import time
+import numpy as np
+import psycopg2
+from database.db_connector import pooled_connection
+from database.insert_ita_database import insert_rows
+from dev_servers.fake_tachibana_server import (
+    FakeTachibanaServer, DEFAULT_CHANGE_RATE, DEFAULT_ERROR_RATE, DEFAULT_JITTER, DEFAULT_LATENCY
+)
+from http_requests.insert_ita_requests import login_and_get_account_instance
+from logic.async_collector_logic import run_async_collector
+from logic.insert_ita_logic import execute_task
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "collector_e2e.jsonl")
+
+
+class CommitTimer:
+    """
+    execute_task の writer として渡し、行を同期的に書き込んでtick-to-commitを記録するクラス
+
+    Attributes:
+        latencies_ms (list): tick-to-commit（ミリ秒）のリスト（シャード毎に1件）
+        rows (int): 書き込んだ行数
+        tick_ids (set): 書き込んだtick_idの集合
+    """
+
+    def __init__(self, db_params):
+        self.db_params = db_params
+        self.latencies_ms = []
+        self.rows = 0
+        self.tick_ids = set()
+        self._lock = threading.Lock()
+
+    def put(self, rows):
+        insert_rows(self.db_params, rows)
+        committed_ms = time.time() * 1000
+        tick_id = rows[0]["tick_id"]
+        with self._lock:
+            self.latencies_ms.append(committed_ms - tick_id)
+            self.rows += len(rows)
+            self.tick_ids.add(tick_id)
+
+
+def run_case(account_instance, code_list, db_params, concurrency, shard_size, interval, duration):
+    """
+    1つの組み合わせでコレクターを duration 秒間動かし、結果を返す関数
+
+    Args:
+        account_instance (ClassTachibanaAccount): 立花証券口座クラスのインスタンス
+        code_list (list): 銘柄コードのリスト
+        db_params (dict): データベースへの接続情報が格納された辞書
+        concurrency (int): 同時に実行するタスク数の上限
+        shard_size (int): 1リクエストあたりの銘柄数（Noneの場合は分割しない）
+        interval (float): タスク実行の間隔（秒）
+        duration (float): 実行する秒数
+
+    Returns:
+        tuple: (計測結果の辞書, 書き込んだtick_idの集合)
+    """
+    timer = CommitTimer(db_params)
+    task = functools.partial(execute_task, shard_size=shard_size, writer=timer)
+    start_time = time.monotonic()
+    deadline = start_time + duration
+    stats = asyncio.run(run_async_collector(
+        account_instance, code_list, db_params,
+        should_continue=lambda: time.monotonic() < deadline,
+        interval=interval, max_in_flight=concurrency, task=task,
+    ))
+    elapsed = time.monotonic() - start_time
+
+    latencies = np.array(timer.latencies_ms) if timer.latencies_ms else np.array([np.nan])
+    return {
+        "codes": len(code_list),
+        "concurrency": concurrency,
+        "shard_size": shard_size,
+        "interval": interval,
+        "seconds": round(elapsed, 3),
+        "snapshots": len(timer.tick_ids),
+        "snapshots_per_sec": round(len(timer.tick_ids) / elapsed, 2),
+        "rows_per_sec": round(timer.rows / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "failed": stats["failed"],
+        "skipped": stats["skipped"],
+    }, timer.tick_ids
+
+
+def delete_benchmark_rows(db_params, tick_ids):
+    """
+    ベンチマークで書き込んだ行を削除する関数
+
+    Args:
+        db_params (dict): データベースへの接続情報が格納された辞書
+        tick_ids (set): 削除するtick_idの集合
+    """
+    if not tick_ids:
+        return
+    with pooled_connection(db_params) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM ita_table WHERE tick_id = ANY(%s);", (sorted(tick_ids),))
+        conn.commit()
+
+
+def current_commit():
+    """
+    現在のgitのコミットのハッシュを返す関数
+
+    Returns:
+        str: コミットのハッシュ（取得できない場合はNone）
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    """
+    メイン関数：組み合わせ毎にベンチマークを実行し、結果を出力・保存します。
+    """
+    parser = argparse.ArgumentParser(description="end-to-end collector benchmark against a fake Tachibana server")
+    parser.add_argument("--codes", type=int, nargs="+", default=[50, 220], help="銘柄数（複数指定可）")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 10], help="同時実行数（複数指定可）")
+    parser.add_argument("--shard-size", type=int, default=0, help="1リクエストあたりの銘柄数（0の場合は分割しない）")
+    parser.add_argument("--interval", type=float, default=0.1, help="タスク実行の間隔（秒）")
+    parser.add_argument("--duration", type=float, default=30.0, help="1組み合わせあたりの実行秒数")
+    parser.add_argument("--server-url", default=None, help="起動済みの疑似サーバーのURL（省略時は同じプロセスで起動）")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY)
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER)
+    parser.add_argument("--error-rate", type=float, default=DEFAULT_ERROR_RATE)
+    parser.add_argument("--change-rate", type=float, default=DEFAULT_CHANGE_RATE)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="結果を追記するJSON Linesファイル")
+    parser.add_argument("--keep-rows", action="store_true", help="書き込んだ行を削除しない")
+    args = parser.parse_args()
+
+    db_params = {
+        "host": os.environ.get("POSTGRES_HOST"),
+        "database": os.environ.get("POSTGRES_DB"),
+        "user": os.environ.get("POSTGRES_USER"),
+        "password": os.environ.get("POSTGRES_PASSWORD"),
+    }
+
+    server = None
+    url_base = args.server_url
+    if url_base is None:
+        server = FakeTachibanaServer(
+            latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, change_rate=args.change_rate
+        )
+        server.start_background()
+        url_base = server.url_base()
+    os.environ["TACHIBANA_URL_BASE"] = url_base
+    # 同時実行数が接続プールの上限で頭打ちにならないようにする
+    os.environ.setdefault("ITA_HTTP_POOL_MAXSIZE", str(max(args.concurrency)))
+
+    commit = current_commit()
+    started_at = datetime.datetime.now().isoformat(timespec="seconds")
+    results = []
+    try:
+        account_instance = login_and_get_account_instance()
+        for code_count in args.codes:
+            code_list = [str(1300 + index) for index in range(code_count)]
+            for concurrency in args.concurrency:
+                result, tick_ids = run_case(
+                    account_instance, code_list, db_params, concurrency,
+                    args.shard_size or None, args.interval, args.duration,
+                )
+                if not args.keep_rows:
+                    delete_benchmark_rows(db_params, tick_ids)
+                results.append(result)
+                print(
+                    f"codes={result['codes']:5d} concurrency={result['concurrency']:3d} "
+                    f"snapshots/sec={result['snapshots_per_sec']:8.2f} rows/sec={result['rows_per_sec']:10.1f} "
+                    f"p50={result['p50_ms']:8.2f}ms p99={result['p99_ms']:8.2f}ms "
+                    f"failed={result['failed']} skipped={result['skipped']}"
+                )
+    except psycopg2.DatabaseError as db_error:
+        print(f"An error occurred in the database: {db_error}")
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "a") as file:
+        for result in results:
+            file.write(json.dumps(dict(
+                result, commit=commit, started_at=started_at, latency=args.latency, jitter=args.jitter,
+                error_rate=args.error_rate, change_rate=args.change_rate,
+            )) + "\n")
+    print(f"results saved: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
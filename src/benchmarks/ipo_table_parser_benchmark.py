@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、IPO一覧のHTMLからIPOデータのDataFrameを作成する処理の所要時間を比較するベンチマークです。
+
+ファイル内の主な処理ステップ:
+1. 保存したIPO一覧のHTML（--html）を読み込みます。指定しない場合は、疑似サーバーと同じ形式のHTMLを
+   --rows 行・後続のHTML --trailing-kb KBで作成します。
+2. 従来の BeautifulSoup + pd.read_html（2回の解析）と、parse_ipo_df（IpoTableParserによる1回の走査）の
+   結果が同じであることを確認します。
+3. それぞれを --count 回実行し、1回あたりの所要時間を出力します。
+
+実行方法:
+curl -o /tmp/ipo-list.html https://c-eye.co.jp/ipo-list
+python3 /src/benchmarks/ipo_table_parser_benchmark.py --html /tmp/ipo-list.html --count 50
+"""
+import argparse
+import io
+import time
+import pandas as pd
+from bs4 import BeautifulSoup
+from dev_servers.fake_master_data_server import make_ipo_html
+from logic.set_code_logic import parse_ipo_df
+
+# 作成するHTMLの市場（「東」以外の市場と上場中止の行は捨てられる）
+FIXTURE_MARKETS = ("東G", "東S", "東P", "名M", "福Q")
+
+
+def legacy_parse_ipo_df(html_content):
+    """
+    従来の parse_ipo_df（BeautifulSoupで解析した文字列を pd.read_html で再度解析し、2つ目の表を使用）
+
+    Args:
+        html_content (str): IPO一覧のHTML
+
+    Returns:
+        pd.DataFrame: 抽出・整形したIPOデータが格納されたDataFrame
+    """
+    soup = BeautifulSoup(html_content, "html.parser")
+    tables = pd.read_html(io.StringIO(str(soup)), header=0)
+    df = tables[1].loc[:, ["ｺｰﾄﾞ", "銘柄", "市場"]]
+    df = df.rename(columns={"ｺｰﾄﾞ": "code", "銘柄": "name", "市場": "market_product_category"})
+    df = df[df["market_product_category"].str.startswith("東")]
+    df["market_product_category"] = df["market_product_category"].str.replace("東", "", regex=False)
+    df = df[~df["name"].str.contains("中止")]
+    return df
+
+
+def make_fixture(rows, trailing_kb):
+    """
+    ベンチマーク用のIPO一覧のHTMLを作成する関数
+
+    Args:
+        rows (int): 表の行数
+        trailing_kb (int): 表の後に続くHTMLの大きさ（KB）
+
+    Returns:
+        str: IPO一覧のHTML
+    """
+    ipo_rows = [
+        (
+            str(9000 + index % 1000),
+            f"テスト銘柄{index}" + ("(中止)" if index % 17 == 0 else ""),
+            FIXTURE_MARKETS[index % len(FIXTURE_MARKETS)],
+        )
+        for index in range(rows)
+    ]
+    document = make_ipo_html(ipo_rows).decode("utf-8")
+    link = '<li><a href="/ipo/{0}">関連ニュース {0}</a></li>'
+    trailing = "<ul>" + "".join(link.format(index) for index in range(trailing_kb * 1024 // 48)) + "</ul>"
+    return document.replace("</body>", trailing + "</body>")
+
+
+def per_call_ms(function, html_content, count):
+    """
+    functionを count 回呼び出し、1回あたりの所要時間（ミリ秒）を返す関数
+
+    Args:
+        function (callable): HTMLを引数に取る関数
+        html_content (str): IPO一覧のHTML
+        count (int): 呼び出す回数
+
+    Returns:
+        float: 1回あたりの所要時間（ミリ秒）
+    """
+    start_time = time.perf_counter()
+    for _ in range(count):
+        function(html_content)
+    return (time.perf_counter() - start_time) / count * 1e3
+
+
+def main():
+    """
+    メイン関数：IPO一覧のHTMLの解析の所要時間を比較して出力します。
+    """
+    parser = argparse.ArgumentParser(description="IPO table parser benchmark")
+    parser.add_argument("--html", nargs="*", default=[], help="保存したIPO一覧のHTMLのパス")
+    parser.add_argument("--rows", type=int, default=100, help="作成するHTMLの表の行数")
+    parser.add_argument("--trailing-kb", type=int, default=200, help="作成するHTMLの表の後に続くHTMLの大きさ（KB）")
+    parser.add_argument("--count", type=int, default=50, help="計測する呼び出し回数")
+    args = parser.parse_args()
+
+    fixtures = []
+    for path in args.html:
+        with open(path, encoding="utf-8") as file:
+            fixtures.append((path, file.read()))
+    if not fixtures:
+        fixtures.append((f"generated rows={args.rows}", make_fixture(args.rows, args.trailing_kb)))
+
+    for name, html_content in fixtures:
+        # 従来の処理と同じDataFrameになることを確認
+        expected = legacy_parse_ipo_df(html_content)
+        actual = parse_ipo_df(html_content)
+        try:
+            pd.testing.assert_frame_equal(actual, expected)
+        except AssertionError as error:
+            raise SystemExit(f"{name}: parse_ipo_df does not match the legacy result\n{error}")
+
+        legacy_ms = per_call_ms(legacy_parse_ipo_df, html_content, args.count)
+        parser_ms = per_call_ms(parse_ipo_df, html_content, args.count)
+        print(f"{name}: size={len(html_content) / 1024:.0f}KB rows={len(actual)} count={args.count}")
+        print(f"  BeautifulSoup + read_html {legacy_ms:8.2f} ms/page")
+        print(f"  IpoTableParser            {parser_ms:8.2f} ms/page  x{legacy_ms / parser_ms:.1f} faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、ita_tableへの書き込み方式（executemany / 複数行VALUES / COPY）の速度を比較するベンチマークです。
+
+ファイル内の主な処理ステップ:
+1. 環境変数からPostgreSQLの接続情報を取得します。
+2. ita_tableと同じ定義の一時テーブルを作成します（ita_table自体には書き込みません）。
+3. 指定された銘柄数のダミーのスナップショットを作成し、各方式で指定回数書き込みます。
+4. 方式毎の rows/sec と、executemanyに対する倍率を出力します。
+
+実行方法:
+python3 /src/benchmarks/ita_insert_benchmark.py --codes 220 --snapshots 50
+"""
+import argparse
+import os
+import random
+import time
+import psycopg2
+from database.insert_ita_database import (
+    ITA_ITEM_KEYS, WRITE_METHOD_COPY, WRITE_METHOD_EXECUTEMANY, WRITE_METHOD_VALUES, write_rows_with_cursor
+)
+
+BENCHMARK_TABLE = "ita_table_benchmark"
+
+
+def make_snapshot(code_count, tick_id):
+    """
+    ダミーのスナップショット（株価データの辞書のリスト）を作成する関数
+
+    Args:
+        code_count (int): 銘柄数
+        tick_id (int): スナップショットのtick_id
+
+    Returns:
+        list: 株価データの辞書のリスト
+    """
+    snapshot = []
+    for index in range(code_count):
+        item = {key: None if random.random() < 0.1 else f"{random.randint(100, 99999) / 10:.1f}"
+                for key in ITA_ITEM_KEYS}
+        for key in ITA_ITEM_KEYS:
+            if key.startswith(("pGAV", "pGBV", "pDV", "pAAV", "pQOV", "pQUV")) and item[key] is not None:
+                item[key] = str(random.randint(0, 100000))
+        item["sIssueCode"] = str(1300 + index)
+        item["tick_id"] = tick_id
+        snapshot.append(item)
+    return snapshot
+
+
+def run_method(conn, method, snapshots):
+    """
+    指定された方式でスナップショットを書き込み、rows/secを返す関数
+
+    Args:
+        conn (psycopg2.extensions.connection): 接続
+        method (str): 書き込み方式
+        snapshots (list): スナップショットのリスト
+
+    Returns:
+        float: 1秒あたりの書き込み行数
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {BENCHMARK_TABLE};")
+    conn.commit()
+
+    rows = sum(len(snapshot) for snapshot in snapshots)
+    start_time = time.perf_counter()
+    for snapshot in snapshots:
+        with conn.cursor() as cursor:
+            write_rows_with_cursor(cursor, snapshot, method=method, table_name=BENCHMARK_TABLE)
+        conn.commit()
+    return rows / (time.perf_counter() - start_time)
+
+
+def main():
+    """
+    メイン関数：各書き込み方式のベンチマークを実行して結果を出力します。
+    """
+    parser = argparse.ArgumentParser(description="ita_table write benchmark")
+    parser.add_argument("--codes", type=int, default=220, help="1スナップショットあたりの銘柄数")
+    parser.add_argument("--snapshots", type=int, default=50, help="書き込むスナップショット数")
+    args = parser.parse_args()
+
+    db_params = {
+        "host": os.environ.get("POSTGRES_HOST"),
+        "database": os.environ.get("POSTGRES_DB"),
+        "user": os.environ.get("POSTGRES_USER"),
+        "password": os.environ.get("POSTGRES_PASSWORD"),
+    }
+    snapshots = [make_snapshot(args.codes, tick_id) for tick_id in range(args.snapshots)]
+
+    conn = psycopg2.connect(**db_params)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE {BENCHMARK_TABLE} (LIKE ita_table INCLUDING DEFAULTS);"
+            )
+        conn.commit()
+
+        results = {}
+        for method in (WRITE_METHOD_EXECUTEMANY, WRITE_METHOD_VALUES, WRITE_METHOD_COPY):
+            results[method] = run_method(conn, method, snapshots)
+
+        baseline = results[WRITE_METHOD_EXECUTEMANY]
+        print(f"codes={args.codes} snapshots={args.snapshots}")
+        for method, rows_per_sec in results.items():
+            print(f"{method:12s} {rows_per_sec:12.0f} rows/sec  x{rows_per_sec / baseline:.1f}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、板のスナップショット1件あたりのメモリ使用量を、辞書形式とコンパクト形式で比較するベンチマークです。
+
+ファイル内の主な処理ステップ:
+1. get_stock_data と同じ形式のダミーの辞書を作成し、tracemallocで1件あたりのバイト数を測ります。
+2. 同じ内容を OrderBookSnapshot に変換し、1件あたりのバイト数を測ります。
+3. OrderBookRingBuffer が1件あたりに確保するバイト数を出力します。
+
+実行方法:
+python3 /src/benchmarks/order_book_memory_benchmark.py --count 10000
+"""
+import argparse
+import datetime
+import random
+import time
+import tracemalloc
+from http_requests.market_price_decoder import MARKET_PRICE_COLUMNS, INTEGER_COLUMNS
+from logic.order_book_logic import OrderBookRingBuffer, OrderBookSnapshot
+
+
+def make_row(code):
+    """
+    get_stock_data と同じ形式のダミーの辞書を作成する関数
+
+    Args:
+        code (int): 銘柄コード
+
+    Returns:
+        dict: 株価データの辞書
+    """
+    row = {"sIssueCode": str(code)}
+    for key in MARKET_PRICE_COLUMNS:
+        if key in INTEGER_COLUMNS:
+            row[key] = str(random.randint(0, 100000))
+        else:
+            row[key] = f"{random.randint(1000, 99999) / 10:.1f}"
+    row["created_at"] = datetime.datetime.now()
+    row["tick_id"] = time.time_ns() // 1_000_000
+    return row
+
+
+def measure(factory, count):
+    """
+    factoryで作成したオブジェクト1件あたりのメモリ使用量を測る関数
+
+    Args:
+        factory (callable): インデックスを受け取ってオブジェクトを返す関数
+        count (int): 作成する件数
+
+    Returns:
+        float: 1件あたりのバイト数
+    """
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [factory(index) for index in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del objects
+    return size / count
+
+
+def main():
+    """
+    メイン関数：辞書形式とコンパクト形式のメモリ使用量を比較して出力します。
+    """
+    parser = argparse.ArgumentParser(description="order book snapshot memory benchmark")
+    parser.add_argument("--count", type=int, default=10000, help="作成するスナップショット数")
+    args = parser.parse_args()
+
+    rows = [make_row(1300 + index % 220) for index in range(args.count)]
+
+    dict_bytes = measure(lambda index: make_row(1300 + index % 220), args.count)
+    snapshot_bytes = measure(lambda index: OrderBookSnapshot.from_row(rows[index]), args.count)
+    ring = OrderBookRingBuffer(args.count)
+    ring_bytes = ring.nbytes() / args.count
+
+    start_time = time.perf_counter()
+    for row in rows:
+        ring.append(OrderBookSnapshot.from_row(row))
+    append_seconds = (time.perf_counter() - start_time) / args.count
+
+    print(f"count={args.count}")
+    print(f"dict             {dict_bytes:10.0f} bytes/snapshot")
+    print(f"OrderBookSnapshot{snapshot_bytes:10.0f} bytes/snapshot  x{dict_bytes / snapshot_bytes:.1f} smaller")
+    print(f"ring buffer      {ring_bytes:10.0f} bytes/snapshot  x{dict_bytes / ring_bytes:.1f} smaller")
+    print(f"from_row+append  {append_seconds * 1e6:10.1f} us/snapshot")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、時価情報のリクエストURLを作成する処理の1件あたりの所要時間を比較するベンチマークです。
+
+ファイル内の主な処理ステップ:
+1. 従来の make_url_request + encode_request_url（トランスポートで行っていたURLエンコード）を計測します。
+2. RequestTemplate.build（固定部分はエンコード済み）を計測します。
+3. p_sd_date の作成（pytz + 文字列連結 / format_p_sd_date）を個別に計測します。
+4. 複数のスレッドから next_p_no() を呼び出し、request通番に重複がないことを確認します。
+
+実行方法:
+python3 /src/benchmarks/request_builder_benchmark.py --codes 220 --count 20000
+"""
+import argparse
+import datetime
+import threading
+import time
+import pytz
+from http_requests.http_transport import decode_request_url, encode_request_url
+from http_requests.insert_ita_requests import ClassTachibanaAccount, make_url_request, p_sd_date
+from http_requests.market_price_decoder import TARGET_COLUMN
+from http_requests.request_builder import format_p_sd_date
+
+
+def per_call_us(function, count):
+    """
+    functionを count 回呼び出し、1回あたりの所要時間（マイクロ秒）を返す関数
+
+    Args:
+        function (callable): 引数なしの関数
+        count (int): 呼び出す回数
+
+    Returns:
+        float: 1回あたりの所要時間（マイクロ秒）
+    """
+    start_time = time.perf_counter()
+    for _ in range(count):
+        function()
+    return (time.perf_counter() - start_time) / count * 1e6
+
+
+def count_duplicate_p_no(account, threads, calls):
+    """
+    複数のスレッドから next_p_no() を呼び出し、重複したrequest通番の数を返す関数
+
+    Args:
+        account (ClassTachibanaAccount): 立花証券口座クラスのインスタンス
+        threads (int): スレッド数
+        calls (int): 1スレッドあたりの呼び出し回数
+
+    Returns:
+        int: 重複した通番の数
+    """
+    results = [[] for _ in range(threads)]
+
+    def run(numbers):
+        for _ in range(calls):
+            numbers.append(account.next_p_no())
+
+    workers = [threading.Thread(target=run, args=(numbers,)) for numbers in results]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    numbers = [number for numbers in results for number in numbers]
+    return len(numbers) - len(set(numbers))
+
+
+def main():
+    """
+    メイン関数：リクエストURLの作成の所要時間を比較して出力します。
+    """
+    parser = argparse.ArgumentParser(description="market price request builder benchmark")
+    parser.add_argument("--codes", type=int, default=220, help="1リクエストあたりの銘柄数")
+    parser.add_argument("--count", type=int, default=20000, help="計測する呼び出し回数")
+    parser.add_argument("--threads", type=int, default=10, help="通番の重複を確認するスレッド数")
+    args = parser.parse_args()
+
+    account = ClassTachibanaAccount('"4"', "https://localhost/e_api_v4r3/", "user", "password", "password2")
+    account.price_url = "https://localhost/e_api_v4r3/price/"
+    code_list = [str(1300 + index) for index in range(args.codes)]
+    target_codes = ",".join(code_list)
+
+    def legacy():
+        req_item_list = [
+            {"key": '"sCLMID"', "value": '"CLMMfdsGetMarketPrice"'},
+            {"key": '"sTargetIssueCode"', "value": target_codes},
+            {"key": '"sTargetColumn"', "value": TARGET_COLUMN},
+            {"key": '"sJsonOfmt"', "value": account.json_fmt},
+        ]
+        return encode_request_url(make_url_request(False, account.price_url, account, req_item_list))
+
+    def template():
+        return account.market_price_template().build(account.next_p_no(), sTargetIssueCode=target_codes)
+
+    # 同じ通番・送信日時であれば同じリクエストになることを確認
+    built = template()
+    p_no = int(decode_request_url(built).split('"p_no":"')[1].split('"')[0])
+    sd_date = decode_request_url(built).split('"p_sd_date":"')[1].split('"')[0]
+    account.int_p_no = p_no - 1
+    expected = make_url_request(False, account.price_url, account, [
+        {"key": '"sCLMID"', "value": '"CLMMfdsGetMarketPrice"'},
+        {"key": '"sTargetIssueCode"', "value": target_codes},
+        {"key": '"sTargetColumn"', "value": TARGET_COLUMN},
+        {"key": '"sJsonOfmt"', "value": account.json_fmt},
+    ])
+    expected = expected.replace(expected.split('"p_sd_date":"')[1].split('"')[0], sd_date)
+    if decode_request_url(built) != expected:
+        raise SystemExit("RequestTemplate.build does not match make_url_request")
+
+    tokyo = pytz.timezone("Asia/Tokyo")
+    legacy_us = per_call_us(legacy, args.count)
+    template_us = per_call_us(template, args.count)
+    legacy_date_us = per_call_us(lambda: p_sd_date(datetime.datetime.now(tokyo)), args.count)
+    fast_date_us = per_call_us(format_p_sd_date, args.count)
+    duplicates = count_duplicate_p_no(account, args.threads, args.count)
+
+    print(f"codes={args.codes} count={args.count} url_length={len(built)}")
+    print(f"make_url_request + encode {legacy_us:8.2f} us/request")
+    print(f"RequestTemplate.build     {template_us:8.2f} us/request  x{legacy_us / template_us:.1f} faster")
+    print(f"p_sd_date (pytz)          {legacy_date_us:8.2f} us/call")
+    print(f"format_p_sd_date          {fast_date_us:8.2f} us/call  x{legacy_date_us / fast_date_us:.1f} faster")
+    print(f"duplicate p_no ({args.threads} threads x {args.count}) {duplicates}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,386 @@
 
 ファイル内の主な処理ステップ:
 1. 必要なモジュールのインポート: データベースへの接続とクエリ実行に必要なモジュールをインポートします。
-2. データベースへのクエリ実行: データベースに接続して指定されたSQLクエリを実行する関数を定義します。
+2. コネクションプール: 接続情報毎にプロセス共通のスレッドセーフなコネクションプールを保持します。
+3. データベースへのクエリ実行: プールから接続を借りて指定されたSQLクエリを実行する関数を定義します。
 
 注意事項:
 - このモジュールは、データベース操作に関する関数を提供します。データベース接続情報やクエリが正しく設定されていることを確認してください。
 - クエリの実行中にエラーが発生した場合、適切な例外が発生し、エラーがログに記録されます。
+- プールのサイズ等は環境変数 `DB_POOL_MIN_SIZE`, `DB_POOL_MAX_SIZE`, `DB_POOL_MAX_USES`,
+  `DB_POOL_TIMEOUT`, `DB_POOL_HEALTH_CHECK_INTERVAL` で変更できます。
+- プールはプロセス毎に作成されます。fork後の子プロセスでは親の接続を使わずに新しいプールを作成します。
 
 """
+import os
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+from utilities.metrics import gauge
+
+POOL_IN_USE = gauge("ita_db_pool_in_use", "Connections checked out of the pool.")
+POOL_UTILIZATION = gauge("ita_db_pool_utilization", "Checked-out connections divided by max_size.")
+
+# コネクションプールの既定値
+DEFAULT_POOL_MIN_SIZE = 1
+DEFAULT_POOL_MAX_SIZE = 10
+DEFAULT_POOL_MAX_USES = 1000
+DEFAULT_POOL_TIMEOUT = 30.0
+DEFAULT_POOL_HEALTH_CHECK_INTERVAL = 30.0
+
+
+class ConnectionPool:
+    """
+    スレッドセーフなPostgreSQLのコネクションプールクラス
+
+    Attributes:
+        db_params (dict): データベースへの接続情報が格納された辞書
+        min_size (int): 常に保持する接続数
+        max_size (int): 同時に貸し出す接続数の上限
+        max_uses (int): 1接続あたりの貸し出し回数の上限（超えた接続は作り直します）
+        timeout (float): 接続が空くまで待つ秒数の上限
+        health_check_interval (float): この秒数以上使われていない接続は貸し出し前に疎通確認を行います
+
+    Methods:
+        getconn(): 接続を借りるメソッド
+        putconn(conn, discard): 接続を返すメソッド
+        connection(): 接続を借りて返すコンテキストマネージャ
+        stats(): 待ち時間や使用率などの統計を返すメソッド
+        closeall(): すべての接続を閉じるメソッド
+    """
+
+    def __init__(self, db_params, min_size=DEFAULT_POOL_MIN_SIZE, max_size=DEFAULT_POOL_MAX_SIZE,
+                 max_uses=DEFAULT_POOL_MAX_USES, timeout=DEFAULT_POOL_TIMEOUT,
+                 health_check_interval=DEFAULT_POOL_HEALTH_CHECK_INTERVAL):
+        """
+        コネクションプールクラスのコンストラクタ
+
+        Args:
+            db_params (dict): データベースへの接続情報が格納された辞書
+            min_size (int): 常に保持する接続数
+            max_size (int): 同時に貸し出す接続数の上限
+            max_uses (int): 1接続あたりの貸し出し回数の上限
+            timeout (float): 接続が空くまで待つ秒数の上限
+            health_check_interval (float): 疎通確認を行う未使用時間（秒）
+        """
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"invalid pool size: min_size={min_size}, max_size={max_size}")
+
+        self.db_params = db_params
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._condition = threading.Condition()
+        self._idle = []  # (conn, 最後に返却された時刻) のリスト
+        self._uses = {}  # id(conn) -> 貸し出し回数
+        self._in_use = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "discarded": 0,
+            "health_check_failures": 0,
+            "timeouts": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "in_use_max": 0,
+        }
+
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _incr(self, name, value=1):
+        """
+        統計のカウンターを加算するメソッド
+
+        Args:
+            name (str): カウンター名
+            value (int): 加算する値
+        """
+        with self._condition:
+            self._stats[name] += value
+
+    def _connect(self):
+        """
+        新しい接続を作成するメソッド
+
+        Returns:
+            psycopg2.extensions.connection: 作成した接続
+        """
+        conn = psycopg2.connect(**self.db_params)
+        self._uses[id(conn)] = 0
+        self._incr("created")
+        return conn
+
+    def _close(self, conn):
+        """
+        接続を閉じてプールの管理対象から外すメソッド
+
+        Args:
+            conn (psycopg2.extensions.connection): 閉じる接続
+        """
+        self._uses.pop(id(conn), None)
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _is_healthy(self, conn, idle_since):
+        """
+        接続が利用可能かどうかを確認するメソッド
+
+        Args:
+            conn (psycopg2.extensions.connection): 確認する接続
+            idle_since (float): 最後に返却された時刻
+
+        Returns:
+            bool: 利用可能であればTrue
+        """
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            self._incr("health_check_failures")
+            return False
+
+    def getconn(self):
+        """
+        プールから接続を借りるメソッド（空きがない場合はtimeout秒まで待ちます）
+
+        Returns:
+            psycopg2.extensions.connection: 借りた接続
+
+        Raises:
+            psycopg2.pool.PoolError: timeout秒待っても接続が空かなかった場合
+        """
+        wait_start = time.monotonic()
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise psycopg2.pool.PoolError("connection pool is closed")
+                if self._idle or self._in_use < self.max_size:
+                    break
+                remaining = self.timeout - (time.monotonic() - wait_start)
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise psycopg2.pool.PoolError(f"no connection available within {self.timeout} seconds")
+                self._condition.wait(remaining)
+
+            wait_seconds = time.monotonic() - wait_start
+            self._stats["checkouts"] += 1
+            self._stats["wait_seconds_total"] += wait_seconds
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], wait_seconds)
+
+            # 枠を確保してからロックの外で接続の確認・作成を行う
+            self._in_use += 1
+            self._stats["in_use_max"] = max(self._stats["in_use_max"], self._in_use)
+            idle = self._idle.pop() if self._idle else None
+
+        try:
+            if idle is not None:
+                conn, idle_since = idle
+                if self._is_healthy(conn, idle_since):
+                    self._uses[id(conn)] = self._uses.get(id(conn), 0) + 1
+                    return conn
+                self._incr("discarded")
+                self._close(conn)
+            conn = self._connect()
+            self._uses[id(conn)] = 1
+            return conn
+        except Exception:
+            with self._condition:
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+
+    def putconn(self, conn, discard=False):
+        """
+        プールに接続を返すメソッド
+
+        Args:
+            conn (psycopg2.extensions.connection): 返す接続
+            discard (bool): Trueの場合は接続を再利用せずに閉じます
+        """
+        if not discard and not conn.closed and conn.status != psycopg2.extensions.STATUS_READY:
+            # トランザクションが残っている場合は取り消してから返す
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        if not discard and self._uses.get(id(conn), 0) >= self.max_uses:
+            self._incr("recycled")
+            discard = True
+
+        if discard or conn.closed:
+            if not discard:
+                self._incr("discarded")
+            self._close(conn)
+            conn = None
+
+        with self._condition:
+            self._in_use -= 1
+            if conn is not None:
+                if self._closed:
+                    self._close(conn)
+                else:
+                    self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        接続を借り、ブロックを抜けるときに返すコンテキストマネージャ
+
+        Yields:
+            psycopg2.extensions.connection: 借りた接続
+        """
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # 接続自体が壊れている可能性があるため再利用しない
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def stats(self):
+        """
+        待ち時間や使用率などの統計を返すメソッド
+
+        Returns:
+            dict: プールの統計
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats["in_use"] = self._in_use
+            stats["idle"] = len(self._idle)
+            stats["max_size"] = self.max_size
+            stats["utilization"] = self._in_use / self.max_size
+            stats["wait_seconds_avg"] = (
+                stats["wait_seconds_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+            )
+        return stats
+
+    def closeall(self):
+        """
+        すべての接続を閉じるメソッド（貸し出し中の接続は返却時に閉じます）
+        """
+        with self._condition:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._close(conn)
+            self._idle = []
+            self._condition.notify_all()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+def _pool_key(db_params):
+    """
+    接続情報からプールを識別するキーを作成する関数
+
+    Args:
+        db_params (dict): データベースへの接続情報が格納された辞書
+
+    Returns:
+        tuple: プールのキー
+    """
+    return tuple(sorted((key, str(value)) for key, value in db_params.items()))
+
+
+def get_pool(db_params):
+    """
+    接続情報に対応するプロセス共通のコネクションプールを返す関数（初回呼び出し時に作成）
+
+    Args:
+        db_params (dict): データベースへの接続情報が格納された辞書
+
+    Returns:
+        ConnectionPool: コネクションプール
+    """
+    global _pools, _pools_pid
+    key = _pool_key(db_params)
+    with _pools_lock:
+        # fork後の子プロセスでは親プロセスの接続を使わない
+        if _pools_pid != os.getpid():
+            _pools = {}
+            _pools_pid = os.getpid()
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                db_params,
+                min_size=int(os.environ.get("DB_POOL_MIN_SIZE", DEFAULT_POOL_MIN_SIZE)),
+                max_size=int(os.environ.get("DB_POOL_MAX_SIZE", DEFAULT_POOL_MAX_SIZE)),
+                max_uses=int(os.environ.get("DB_POOL_MAX_USES", DEFAULT_POOL_MAX_USES)),
+                timeout=float(os.environ.get("DB_POOL_TIMEOUT", DEFAULT_POOL_TIMEOUT)),
+                health_check_interval=float(
+                    os.environ.get("DB_POOL_HEALTH_CHECK_INTERVAL", DEFAULT_POOL_HEALTH_CHECK_INTERVAL)
+                ),
+            )
+            _pools[key] = pool
+            label = f'{db_params.get("host")}/{db_params.get("database")}'
+            POOL_IN_USE.set_function(lambda: pool.stats()["in_use"], pool=label)
+            POOL_UTILIZATION.set_function(lambda: pool.stats()["utilization"], pool=label)
+    return pool
+
+
+def pooled_connection(db_params):
+    """
+    プールから接続を借り、ブロックを抜けるときに返すコンテキストマネージャを返す関数
+
+    Args:
+        db_params (dict): データベースへの接続情報が格納された辞書
+
+    Returns:
+        contextmanager: 接続を返すコンテキストマネージャ
+    """
+    return get_pool(db_params).connection()
+
+
+def get_pool_stats():
+    """
+    プロセス内のすべてのコネクションプールの統計を返す関数
+
+    Returns:
+        dict: 接続先（host/database）をキーとするプールの統計の辞書
+    """
+    with _pools_lock:
+        pools = list(_pools.values()) if _pools_pid == os.getpid() else []
+    return {
+        f'{pool.db_params.get("host")}/{pool.db_params.get("database")}': pool.stats()
+        for pool in pools
+    }
+
+
+def close_all_pools():
+    """
+    プロセス内のすべてのコネクションプールを閉じる関数
+    """
+    global _pools
+    with _pools_lock:
+        pools = list(_pools.values()) if _pools_pid == os.getpid() else []
+        _pools = {}
+    for pool in pools:
+        pool.closeall()
 
 
 def execute_query(db_params, query, data=None, fetch=False, use_executemany=False):
@@ -27,8 +399,8 @@ def execute_query(db_params, query, data=None, fetch=False, use_executemany=Fals
     Returns:
     None or list: fetchがTrueの場合、クエリ結果のリストを返す
     """
-    try:
-        with psycopg2.connect(**db_params) as conn:
+    with pooled_connection(db_params) as conn:
+        try:
             with conn.cursor() as cursor:
                 if data:
                     if use_executemany:
@@ -41,6 +413,7 @@ def execute_query(db_params, query, data=None, fetch=False, use_executemany=Fals
                 if fetch:
                     return cursor.fetchall()
                 return
-    except psycopg2.DatabaseError as error:
-        conn.rollback()
-        raise error
+        except psycopg2.DatabaseError as error:
+            if not conn.closed:
+                conn.rollback()
+            raise error
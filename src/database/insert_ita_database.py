@@ -12,10 +12,62 @@
 - データベーステーブル (`ita_table`) は事前に作成されている必要があります。
 - `table_data` に含まれるカラムは、テーブルのカラムと一致する必要があります。
 - データの挿入に失敗した場合は、トランザクションがロールバックされます。
+- 挿入は既定で `COPY FROM STDIN` による一括書き込みで行います。COPYが使えない環境では複数行のVALUESによる
+  INSERTに切り替わります。環境変数 `ITA_WRITE_METHOD` に `copy` / `values` / `executemany` を指定して固定することもできます。
 
 """
-import datetime
-from database.db_connector import execute_query
+import io
+import os
+import psycopg2
+import psycopg2.extras
+from database.db_connector import execute_query, pooled_connection
+from utilities.metrics import counter, stage_timer
+
+ROWS_WRITTEN = counter("ita_rows_written_total", "Rows committed to ita_table.")
+DB_WRITE_FAILURES = counter("ita_db_write_failures_total", "Failed ita_table write transactions.")
+
+# ita_tableのカラム名と、株価データの辞書のキーの対応
+ITA_COLUMNS = (
+    ("code", "sIssueCode"), ("pdpp", "pDPP"), ("pdv", "pDV"), ("pprp", "pPRP"), ("pdop", "pDOP"),
+    ("pdhp", "pDHP"), ("pdlp", "pDLP"), ("pvwap", "pVWAP"), ("pqap", "pQAP"), ("pqas", "pQAS"),
+    ("pqbp", "pQBP"), ("pqbs", "pQBS"), ("paav", "pAAV"), ("pabv", "pABV"), ("pqov", "pQOV"), ("pquv", "pQUV"),
+) + tuple(
+    (f"{prefix.lower()}{level}", f"{prefix}{level}")
+    for prefix in ("pGAP", "pGBP", "pGAV", "pGBV")
+    for level in range(10, 0, -1)
+) + (
+    ("tick_id", "tick_id"),
+)
+
+ITA_COLUMN_NAMES = ", ".join(column for column, _ in ITA_COLUMNS)
+ITA_ITEM_KEYS = tuple(key for _, key in ITA_COLUMNS)
+
+# executemanyで使用する名前付きパラメータのINSERT文（1行毎に1文が送信されます）
+INSERT_QUERY = """
+    INSERT INTO ita_table (
+        code, pdpp, pdv, pprp, pdop, pdhp, pdlp, pvwap, pqap, pqas, pqbp, pqbs, paav, pabv,
+        pqov, pquv, pgap10, pgap9, pgap8, pgap7, pgap6, pgap5, pgap4, pgap3, pgap2, pgap1,
+        pgbp10, pgbp9, pgbp8, pgbp7, pgbp6, pgbp5, pgbp4, pgbp3, pgbp2, pgbp1, pgav10, pgav9,
+        pgav8, pgav7, pgav6, pgav5, pgav4, pgav3, pgav2, pgav1, pgbv10, pgbv9, pgbv8, pgbv7,
+        pgbv6, pgbv5, pgbv4, pgbv3, pgbv2, pgbv1, tick_id
+    )
+    VALUES (
+        %(sIssueCode)s, %(pDPP)s, %(pDV)s, %(pPRP)s, %(pDOP)s, %(pDHP)s, %(pDLP)s, %(pVWAP)s, %(pQAP)s,
+        %(pQAS)s, %(pQBP)s, %(pQBS)s, %(pAAV)s, %(pABV)s, %(pQOV)s, %(pQUV)s, %(pGAP10)s, %(pGAP9)s,
+        %(pGAP8)s, %(pGAP7)s, %(pGAP6)s, %(pGAP5)s, %(pGAP4)s, %(pGAP3)s, %(pGAP2)s, %(pGAP1)s,
+        %(pGBP10)s, %(pGBP9)s, %(pGBP8)s, %(pGBP7)s, %(pGBP6)s, %(pGBP5)s, %(pGBP4)s, %(pGBP3)s,
+        %(pGBP2)s, %(pGBP1)s, %(pGAV10)s, %(pGAV9)s, %(pGAV8)s, %(pGAV7)s, %(pGAV6)s, %(pGAV5)s,
+        %(pGAV4)s, %(pGAV3)s, %(pGAV2)s, %(pGAV1)s, %(pGBV10)s, %(pGBV9)s, %(pGBV8)s, %(pGBV7)s,
+        %(pGBV6)s, %(pGBV5)s, %(pGBV4)s, %(pGBV3)s, %(pGBV2)s, %(pGBV1)s, %(tick_id)s
+    )
+"""
+
+WRITE_METHOD_COPY = "copy"
+WRITE_METHOD_VALUES = "values"
+WRITE_METHOD_EXECUTEMANY = "executemany"
+
+# COPYのテキスト形式でエスケープが必要な文字
+_COPY_ESCAPE = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
 
 
 def search_codes_by_api_id(db_params, api_id_value):
@@ -34,36 +86,280 @@ def search_codes_by_api_id(db_params, api_id_value):
     return result
 
 
+def search_api_ids(db_params):
+    """
+    マスターストックテーブルに設定されているAPI IDの値を重複なく検索し、結果を返す関数。
+
+    Args:
+    db_params (dict): データベース接続のためのパラメータ
+
+    Returns:
+    list: API IDの値のリスト（昇順）
+    """
+    select_query = (
+        "SELECT DISTINCT api_id FROM master_stock_table WHERE api_id IS NOT NULL AND api_id <> '' ORDER BY api_id;"
+    )
+    result = execute_query(db_params, select_query, None, True)
+    return result
+
+
+def format_copy_value(value):
+    """
+    値をCOPYのテキスト形式の1フィールドに変換する関数
+
+    Args:
+        value (object): 変換する値（Noneの場合はNULL）
+
+    Returns:
+        str: COPYのテキスト形式の文字列
+    """
+    if value is None:
+        return "\\N"
+    return str(value).translate(_COPY_ESCAPE)
+
+
+def _copy_sql(table_name, with_created_at=False):
+    """
+    ita_tableと同じカラム構成のテーブルへのCOPY文を返す関数
+
+    Args:
+        table_name (str): 書き込み先のテーブル名
+        with_created_at (bool): Trueの場合はcreated_atも書き込む（省略時はDEFAULT NOW()）
+
+    Returns:
+        str: COPY文
+    """
+    columns = f"{ITA_COLUMN_NAMES}, created_at" if with_created_at else ITA_COLUMN_NAMES
+    return f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT text, NULL '\\N')"
+
+
+def make_copy_buffer(data):
+    """
+    株価データのリストをCOPYのテキスト形式のバッファに変換する関数
+
+    Args:
+        data (list): 株価データの辞書のリスト
+
+    Returns:
+        io.StringIO: 先頭にシークしたCOPY用のバッファ
+    """
+    buffer = io.StringIO()
+    write = buffer.write
+    for item in data:
+        write("\t".join([format_copy_value(item.get(key)) for key in ITA_ITEM_KEYS]))
+        write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+def _write_batch_copy_lines(buffer, batch, with_created_at=False):
+    """
+    列指向のバッチをCOPYのテキスト形式でバッファに書き込む関数
+
+    Args:
+        buffer (io.StringIO): 書き込み先のバッファ
+        batch (ItaColumnarBatch): 項目毎の型付き配列とNULLマスクを持つバッチ
+        with_created_at (bool): Trueの場合は末尾にバッチのcreated_atを書き込む
+    """
+    row_count = len(batch)
+    fields = []
+    for _, key in ITA_COLUMNS:
+        if key == "sIssueCode":
+            fields.append(batch.codes.astype(str).tolist())
+        elif key == "tick_id":
+            fields.append(["\\N" if batch.tick_id is None else str(batch.tick_id)] * row_count)
+        else:
+            strings = batch.columns[key].astype(str).tolist()
+            null_mask = batch.null_mask[key]
+            if null_mask.any():
+                strings = ["\\N" if is_null else value for value, is_null in zip(strings, null_mask.tolist())]
+            fields.append(strings)
+    if with_created_at:
+        fields.append([batch.created_at.isoformat()] * row_count)
+
+    buffer.writelines("\t".join(row) + "\n" for row in zip(*fields))
+
+
+def make_batch_copy_buffer(batch, with_created_at=False):
+    """
+    列指向のバッチ（ItaColumnarBatch）をCOPYのテキスト形式のバッファに変換する関数
+
+    Args:
+        batch (ItaColumnarBatch): 項目毎の型付き配列とNULLマスクを持つバッチ
+        with_created_at (bool): Trueの場合は末尾にバッチのcreated_atを書き込む
+
+    Returns:
+        io.StringIO: 先頭にシークしたCOPY用のバッファ
+    """
+    buffer = io.StringIO()
+    _write_batch_copy_lines(buffer, batch, with_created_at)
+    buffer.seek(0)
+    return buffer
+
+
+def copy_rows_with_cursor(cursor, data, table_name="ita_table"):
+    """
+    COPY FROM STDIN で株価データを一括書き込みする関数（コミットは呼び出し側で行います）
+
+    Args:
+        cursor (psycopg2.extensions.cursor): カーソル
+        data (list): 株価データの辞書のリスト
+        table_name (str): 書き込み先のテーブル名
+    """
+    cursor.copy_expert(
+        _copy_sql(table_name),
+        make_copy_buffer(data),
+    )
+
+
+def insert_values_with_cursor(cursor, data, table_name="ita_table", page_size=500):
+    """
+    複数行のVALUESによるINSERTで株価データを書き込む関数（コミットは呼び出し側で行います）
+
+    Args:
+        cursor (psycopg2.extensions.cursor): カーソル
+        data (list): 株価データの辞書のリスト
+        table_name (str): 書き込み先のテーブル名
+        page_size (int): 1文あたりの行数
+    """
+    psycopg2.extras.execute_values(
+        cursor,
+        f"INSERT INTO {table_name} ({ITA_COLUMN_NAMES}) VALUES %s",
+        [tuple(item.get(key) for key in ITA_ITEM_KEYS) for item in data],
+        page_size=page_size,
+    )
+
+
+def write_rows_with_cursor(cursor, data, method=None, table_name="ita_table"):
+    """
+    指定された方式で株価データを書き込む関数（コミットは呼び出し側で行います）
+
+    Args:
+        cursor (psycopg2.extensions.cursor): カーソル
+        data (list): 株価データの辞書のリスト
+        method (str): 書き込み方式（copy / values / executemany、省略時は環境変数 ITA_WRITE_METHOD）
+        table_name (str): 書き込み先のテーブル名
+
+    Returns:
+        str: 実際に使用した書き込み方式
+    """
+    if method is None:
+        method = os.environ.get("ITA_WRITE_METHOD", WRITE_METHOD_COPY)
+
+    if method == WRITE_METHOD_COPY:
+        cursor.execute("SAVEPOINT ita_copy;")
+        try:
+            copy_rows_with_cursor(cursor, data, table_name)
+            cursor.execute("RELEASE SAVEPOINT ita_copy;")
+            return WRITE_METHOD_COPY
+        except (psycopg2.NotSupportedError, psycopg2.ProgrammingError):
+            # COPYが使えない環境ではVALUESによるINSERTに切り替える
+            cursor.execute("ROLLBACK TO SAVEPOINT ita_copy;")
+            method = WRITE_METHOD_VALUES
+
+    if method == WRITE_METHOD_VALUES:
+        insert_values_with_cursor(cursor, data, table_name)
+        return WRITE_METHOD_VALUES
+
+    if method == WRITE_METHOD_EXECUTEMANY:
+        cursor.executemany(INSERT_QUERY.replace("ita_table", table_name, 1), data)
+        return WRITE_METHOD_EXECUTEMANY
+
+    raise ValueError(f"unknown write method: {method}")
+
+
 def insert_rows(db_params, data):
     """
     データベースに行を挿入する関数。
 
     Args:
     db_params (dict): データベース接続のためのパラメータ
-    data (dict): 挿入するデータの辞書。キーに対応するカラム名と値を含む。
+    data (list): 挿入するデータの辞書のリスト。キーに対応するカラム名と値を含む。
+
+    Returns:
+    None
+    """
+    if not data:
+        return
+
+    with stage_timer("db_write"), pooled_connection(db_params) as conn:
+        try:
+            with conn.cursor() as cursor:
+                write_rows_with_cursor(cursor, data)
+            conn.commit()
+        except psycopg2.DatabaseError as error:
+            DB_WRITE_FAILURES.inc()
+            if not conn.closed:
+                conn.rollback()
+            raise error
+    ROWS_WRITTEN.inc(len(data))
+    return
+
+
+def insert_batch(db_params, batch, table_name="ita_table"):
+    """
+    列指向のバッチ（ItaColumnarBatch）を行毎の辞書を作らずにCOPYで書き込む関数
+
+    Args:
+    db_params (dict): データベース接続のためのパラメータ
+    batch (ItaColumnarBatch): 項目毎の型付き配列とNULLマスクを持つバッチ
+    table_name (str): 書き込み先のテーブル名
 
     Returns:
     None
     """
+    if len(batch) == 0:
+        return
 
-    insert_query = """
-        INSERT INTO ita_table (
-            code, pdpp, pdv, pprp, pdop, pdhp, pdlp, pvwap, pqap, pqas, pqbp, pqbs, paav, pabv,
-            pqov, pquv, pgap10, pgap9, pgap8, pgap7, pgap6, pgap5, pgap4, pgap3, pgap2, pgap1,
-            pgbp10, pgbp9, pgbp8, pgbp7, pgbp6, pgbp5, pgbp4, pgbp3, pgbp2, pgbp1, pgav10, pgav9,
-            pgav8, pgav7, pgav6, pgav5, pgav4, pgav3, pgav2, pgav1, pgbv10, pgbv9, pgbv8, pgbv7,
-            pgbv6, pgbv5, pgbv4, pgbv3, pgbv2, pgbv1
-        )
-        VALUES (
-            %(sIssueCode)s, %(pDPP)s, %(pDV)s, %(pPRP)s, %(pDOP)s, %(pDHP)s, %(pDLP)s, %(pVWAP)s, %(pQAP)s,
-            %(pQAS)s, %(pQBP)s, %(pQBS)s, %(pAAV)s, %(pABV)s, %(pQOV)s, %(pQUV)s, %(pGAP10)s, %(pGAP9)s,
-            %(pGAP8)s, %(pGAP7)s, %(pGAP6)s, %(pGAP5)s, %(pGAP4)s, %(pGAP3)s, %(pGAP2)s, %(pGAP1)s,
-            %(pGBP10)s, %(pGBP9)s, %(pGBP8)s, %(pGBP7)s, %(pGBP6)s, %(pGBP5)s, %(pGBP4)s, %(pGBP3)s,
-            %(pGBP2)s, %(pGBP1)s, %(pGAV10)s, %(pGAV9)s, %(pGAV8)s, %(pGAV7)s, %(pGAV6)s, %(pGAV5)s,
-            %(pGAV4)s, %(pGAV3)s, %(pGAV2)s, %(pGAV1)s, %(pGBV10)s, %(pGBV9)s, %(pGBV8)s, %(pGBV7)s,
-            %(pGBV6)s, %(pGBV5)s, %(pGBV4)s, %(pGBV3)s, %(pGBV2)s, %(pGBV1)s
-        )
-    """
-    execute_query(db_params, insert_query, data, False, True)
-    print("insert sucsess: ", datetime.datetime.now())
+    with stage_timer("db_write"), pooled_connection(db_params) as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.copy_expert(
+                    _copy_sql(table_name),
+                    make_batch_copy_buffer(batch),
+                )
+            conn.commit()
+        except psycopg2.DatabaseError as error:
+            DB_WRITE_FAILURES.inc()
+            if not conn.closed:
+                conn.rollback()
+            raise error
+    ROWS_WRITTEN.inc(len(batch))
     return
+
+
+def insert_journal_batches(db_params, batches, table_name="ita_table"):
+    """
+    ジャーナルから復元したバッチを1トランザクションでCOPYする関数
+
+    created_atには応答のp_rv_dateを書き込みます。書き込み済みかどうかはジャーナルのレコード毎の
+    適用済みフラグ（logic.response_journal_logic）で判定するため、ここでは除外しません。
+
+    Args:
+    db_params (dict): データベース接続のためのパラメータ
+    batches (list): ItaColumnarBatchのリスト
+    table_name (str): 書き込み先のテーブル名
+
+    Returns:
+    int: 書き込んだ行数
+    """
+    if not batches:
+        return 0
+
+    buffer = io.StringIO()
+    row_count = 0
+    for batch in batches:
+        _write_batch_copy_lines(buffer, batch, with_created_at=True)
+        row_count += len(batch)
+    buffer.seek(0)
+
+    with pooled_connection(db_params) as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.copy_expert(_copy_sql(table_name, with_created_at=True), buffer)
+            conn.commit()
+        except psycopg2.DatabaseError as error:
+            if not conn.closed:
+                conn.rollback()
+            raise error
+    return row_count
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、ita_tableの日毎のパーティションを作成・一覧・削除する関数を提供するモジュールです。
+
+ファイルの概要:
+- partition_name(day): 取引日に対応するパーティション名を返す関数
+- create_partition(db_params, day): 取引日のパーティションを作成する関数
+- list_partitions(db_params): 日毎のパーティションの一覧を返す関数
+- drop_partition(db_params, day): 取引日のパーティションを削除する関数
+
+注意事項:
+- パーティションの境界は日本時間の0時です。
+- パーティション作成前にデフォルトパーティションに入った行は、作成時に新しいパーティションへ移動します。
+- 作成・削除は1トランザクションで行われます。
+"""
+import datetime
+import re
+from database.db_connector import execute_query, pooled_connection
+
+PARENT_TABLE = "ita_table"
+DEFAULT_PARTITION = "ita_table_default"
+PARTITION_PREFIX = "ita_table_p"
+PARTITION_PATTERN = re.compile(r"^ita_table_p(\d{8})$")
+# パーティションの境界のタイムゾーン
+PARTITION_TIMEZONE = "+09"
+
+
+def partition_name(day):
+    """
+    取引日に対応するパーティション名を返す関数
+
+    Args:
+        day (datetime.date): 取引日
+
+    Returns:
+        str: パーティション名（例: ita_table_p20240105）
+    """
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def _partition_bounds(day):
+    """
+    取引日のパーティションの境界（日本時間の0時から翌日の0時）を返す関数
+
+    Args:
+        day (datetime.date): 取引日
+
+    Returns:
+        tuple: (開始時刻の文字列, 終了時刻の文字列)
+    """
+    next_day = day + datetime.timedelta(days=1)
+    return (f"{day:%Y-%m-%d} 00:00:00{PARTITION_TIMEZONE}", f"{next_day:%Y-%m-%d} 00:00:00{PARTITION_TIMEZONE}")
+
+
+def create_partition(db_params, day):
+    """
+    取引日のパーティションを作成する関数（作成済みの場合は何もしない）
+
+    Args:
+        db_params (dict): データベースへの接続情報が格納された辞書
+        day (datetime.date): 取引日
+
+    Returns:
+        bool: 新しく作成した場合はTrue
+    """
+    name = partition_name(day)
+    lower, upper = _partition_bounds(day)
+
+    with pooled_connection(db_params) as conn:
+        try:
+            with conn.cursor() as cursor:
+                # 同時に複数のプロセスが作成しないようにロック
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (PARENT_TABLE,))
+                cursor.execute("SELECT to_regclass(%s);", (name,))
+                if cursor.fetchone()[0] is not None:
+                    conn.rollback()
+                    return False
+
+                # 単独のテーブルとして作成し、デフォルトパーティションに入った行を移してからアタッチする
+                cursor.execute(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS);")
+                cursor.execute(
+                    f"""
+                    WITH moved AS (
+                        DELETE FROM {DEFAULT_PARTITION}
+                        WHERE created_at >= %s AND created_at < %s
+                        RETURNING *
+                    )
+                    INSERT INTO {name} SELECT * FROM moved;
+                    """,
+                    (lower, upper),
+                )
+                cursor.execute(
+                    f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s);",
+                    (lower, upper),
+                )
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+    return True
+
+
+def list_partitions(db_params):
+    """
+    日毎のパーティションの一覧を返す関数
+
+    Args:
+        db_params (dict): データベースへの接続情報が格納された辞書
+
+    Returns:
+        list: (取引日, パーティション名) のタプルを取引日の昇順に並べたリスト
+    """
+    select_query = """
+    SELECT child.relname
+    FROM pg_inherits
+    JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+    JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+    WHERE parent.relname = %s;
+    """
+    result = execute_query(db_params, select_query, (PARENT_TABLE,), True)
+
+    partitions = []
+    for (name,) in result:
+        matched = PARTITION_PATTERN.match(name)
+        if matched:
+            partitions.append((datetime.datetime.strptime(matched.group(1), "%Y%m%d").date(), name))
+    return sorted(partitions)
+
+
+def drop_partition(db_params, day):
+    """
+    取引日のパーティションを削除する関数
+
+    Args:
+        db_params (dict): データベースへの接続情報が格納された辞書
+        day (datetime.date): 取引日
+
+    Returns:
+        None
+    """
+    execute_query(db_params, f"DROP TABLE IF EXISTS {partition_name(day)};")
@@ -4,58 +4,120 @@
 
 ファイルの概要:
 - select_existing_codes(db_params): データベースから既存の銘柄コードを選択する関数
-- insert_rows_to_database(db_params, data): データベースに新しい行を挿入する関数
-- update_rows_on_database(df, db_params): リアルタイムの株価データをデータベースのテーブルにInsertかUpdateする関数
+- master_table_has_rows(db_params): master_stock_tableに行があるかどうかを返す関数
+- insert_rows_to_database(db_params, rows): master_stock_tableにない銘柄だけを1つのINSERT文で挿入する関数
+- update_rows_on_database(db_params, rows): JPXの銘柄一覧をmaster_stock_tableに一括でInsertかUpdateする関数
 """
 
-from database.db_connector import execute_query
+import io
+import psycopg2
+from database.db_connector import execute_query, pooled_connection
+from database.insert_ita_database import format_copy_value
+
+# JPXの銘柄一覧から書き込むmaster_stock_tableのカラム
+MASTER_COLUMNS = (
+    "code", "name", "market_product_category", "sector33_code", "sector33_category",
+    "sector17_code", "sector17_category", "scale_code", "scale_category",
+)
+_MASTER_COLUMN_NAMES = ", ".join(MASTER_COLUMNS)
+_UPDATED_COLUMNS = MASTER_COLUMNS[1:]
+
+# 一時テーブルから反映するクエリ（値が変わっていない行は WHERE で更新しない）
+# xmax = 0 の行は挿入、それ以外は更新された行
+_UPSERT_QUERY = f"""
+WITH upserted AS (
+    INSERT INTO master_stock_table ({_MASTER_COLUMN_NAMES})
+    SELECT DISTINCT ON (code) {_MASTER_COLUMN_NAMES} FROM master_stock_stage ORDER BY code
+    ON CONFLICT (code) DO UPDATE
+    SET
+        {", ".join(f"{column} = EXCLUDED.{column}" for column in _UPDATED_COLUMNS)},
+        updated_at = current_timestamp
+    WHERE
+        ({", ".join(f"master_stock_table.{column}" for column in _UPDATED_COLUMNS)})
+        IS DISTINCT FROM
+        ({", ".join(f"EXCLUDED.{column}" for column in _UPDATED_COLUMNS)})
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT
+    (SELECT count(DISTINCT code) FROM master_stock_stage),
+    count(*) FILTER (WHERE inserted),
+    count(*) FILTER (WHERE NOT inserted)
+FROM upserted
+"""
 
 
-def update_rows_on_database(db_params, df):
+def _master_copy_value(value):
     """
-    リアルタイムの株価データをデータベースのテーブルにInsertかUpdateする関数
+    DataFrameの値をCOPYのテキスト形式の1フィールドに変換する関数
 
     Args:
-        df (pd.DataFrame): 更新する株価データが格納されたDataFrame
-        db_params (dict): データベースへの接続情報が格納された辞書
+        value (object): 変換する値（None・NaNの場合はNULL）
 
     Returns:
-        None
+        str: COPYのテキスト形式の文字列
     """
-    # dfのデータをmaster_stock_tableに挿入します
-    insert_query = """
-    INSERT INTO master_stock_table (
-        code, name, market_product_category, sector33_code, sector33_category,
-        sector17_code, sector17_category, scale_code, scale_category
-    ) VALUES (
-        %s, %s, %s, %s, %s, %s, %s, %s, %s
-    ) ON CONFLICT (code) DO UPDATE
-    SET
-        name = EXCLUDED.name,
-        market_product_category = EXCLUDED.market_product_category,
-        sector33_code = EXCLUDED.sector33_code,
-        sector33_category = EXCLUDED.sector33_category,
-        sector17_code = EXCLUDED.sector17_code,
-        sector17_category = EXCLUDED.sector17_category,
-        scale_code = EXCLUDED.scale_code,
-        scale_category = EXCLUDED.scale_category
+    # NaN（欠損値）はNULL、整数のfloat（欠損値を含む列の業種コード等）は整数として書き込む
+    if isinstance(value, float):
+        if value != value:
+            return format_copy_value(None)
+        if value.is_integer():
+            value = int(value)
+    return format_copy_value(value)
+
+
+def _master_code_value(code):
     """
+    銘柄コードを integer[] の配列の要素の文字列に変換する関数
 
-    for _, row in df.iterrows():
-        data = (
-            row["code"],
-            row["name"],
-            row["market_product_category"],
-            row["sector33_code"],
-            row["sector33_category"],
-            row["sector17_code"],
-            row["sector17_category"],
-            row["scale_code"],
-            row["scale_category"],
-        )
-        execute_query(db_params, insert_query, data)
+    Args:
+        code (object): 銘柄コード（空のコードを含む列は浮動小数点数になります）
 
-    return
+    Returns:
+        str: 銘柄コードの文字列（整数のfloatは整数として "1234.0" ではなく "1234" にする）
+    """
+    if isinstance(code, float) and code.is_integer():
+        code = int(code)
+    return str(code)
+
+
+def update_rows_on_database(db_params, rows):
+    """
+    JPXの銘柄一覧をmaster_stock_tableに一括でInsertかUpdateする関数
+
+    一時テーブルにCOPYで読み込み、1回の INSERT ... ON CONFLICT (code) DO UPDATE で反映します。
+    値が変わっていない行は更新しないため、updated_at は値が変わった行だけ更新されます。
+
+    Args:
+        db_params (dict): データベースへの接続情報が格納された辞書
+        rows (iterable): MASTER_COLUMNS の順の値のタプル
+
+    Returns:
+        dict: 読み込んだ行数（rows）、挿入した行数（inserted）、更新した行数（updated）、変化のなかった行数（unchanged）
+    """
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join([_master_copy_value(value) for value in row]))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    with pooled_connection(db_params) as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "CREATE TEMP TABLE master_stock_stage (LIKE master_stock_table INCLUDING DEFAULTS) ON COMMIT DROP"
+                )
+                cursor.copy_expert(
+                    f"COPY master_stock_stage ({_MASTER_COLUMN_NAMES}) FROM STDIN WITH (FORMAT text, NULL '\\N')",
+                    buffer,
+                )
+                cursor.execute(_UPSERT_QUERY)
+                staged, inserted, updated = cursor.fetchone()
+            conn.commit()
+        except psycopg2.DatabaseError:
+            if not conn.closed:
+                conn.rollback()
+            raise
+    return {"rows": staged, "inserted": inserted, "updated": updated, "unchanged": staged - inserted - updated}
 
 
 def select_existing_codes(db_params):
@@ -74,20 +136,51 @@ def select_existing_codes(db_params):
     return return_codes
 
 
-def insert_rows_to_database(db_params, data):
+def master_table_has_rows(db_params):
+    """
+    master_stock_tableに行があるかどうかを返す関数
+
+    Args:
+        db_params (dict): データベースへの接続情報が格納された辞書
+
+    Returns:
+        bool: 1行以上あればTrue
+    """
+    select_query = "SELECT EXISTS (SELECT 1 FROM master_stock_table);"
+    return bool(execute_query(db_params, select_query, fetch=True)[0][0])
+
+
+def insert_rows_to_database(db_params, rows):
     """
-    データベースに新しい行を挿入する関数
+    master_stock_tableにない銘柄だけを1つのINSERT文で挿入する関数
 
     Args:
         db_params (dict): データベースへの接続情報が格納された辞書
-        data (tuple): 挿入するデータが格納されたタプル
+        rows (iterable): (code, name, market_product_category) のタプル（codeがNaNの行は除いておくこと）
 
     Returns:
-        None
+        int: 挿入した行数
     """
+    rows = list(rows)
+    if not rows:
+        return 0
+    codes, names, categories = (list(column) for column in zip(*rows))
+    # 既存の銘柄を除く（アンチジョイン）。入力内で重複した銘柄と、同時に挿入された銘柄は ON CONFLICT で読み飛ばす
     insert_query = """
-    INSERT INTO master_stock_table
-    (code, name, market_product_category)
-    VALUES (%s, %s, %s);
+    INSERT INTO master_stock_table (code, name, market_product_category)
+    SELECT new.code, new.name, new.market_product_category
+    FROM unnest(%s::integer[], %s::varchar[], %s::varchar[]) AS new (code, name, market_product_category)
+    WHERE NOT EXISTS (SELECT 1 FROM master_stock_table existing WHERE existing.code = new.code)
+    ON CONFLICT (code) DO NOTHING;
     """
-    execute_query(db_params, insert_query, data)
+    with pooled_connection(db_params) as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(insert_query, ([_master_code_value(code) for code in codes], names, categories))
+                inserted = cursor.rowcount
+            conn.commit()
+        except psycopg2.DatabaseError:
+            if not conn.closed:
+                conn.rollback()
+            raise
+    return inserted
@@ -12,21 +12,36 @@
 - 予期せぬエラーが発生した場合、適切な例外が発生し、エラーがログに記録されます。
 
 関連する外部モジュール:
-- database.db_connector: データベースへの接続とクエリ実行を行うためのモジュール
+- database.db_connector: データベースへの接続プールを提供するモジュール
 """
-from database.db_connector import execute_query
+import psycopg2
+from database.db_connector import pooled_connection
 
 
-def update_codes_by_api_id(db_params, api_id_value, code):
+def update_codes_by_api_id(db_params, api_id_value, code_list):
     """
-    データベース行を更新する関数
+    コードリストに該当する行のapi_idを1つのUPDATE文で更新する関数
 
     Args:
         db_params (dict): データベースへの接続情報が格納された辞書
-        data (tuple): 挿入するデータが格納されたタプル
+        api_id_value (str): 設定するapi_idの値
+        code_list (list): 更新対象となるコードリスト
 
     Returns:
-        None
+        int: 更新した行数（既に同じapi_idの行は更新しません）
     """
-    update_query = "UPDATE master_stock_table SET api_id = %s WHERE code = %s;"
-    execute_query(db_params, update_query, (api_id_value, code))
+    update_query = """
+    UPDATE master_stock_table SET api_id = %s, updated_at = current_timestamp
+    WHERE code = ANY(%s::integer[]) AND api_id IS DISTINCT FROM %s;
+    """
+    with pooled_connection(db_params) as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(update_query, (api_id_value, [str(code) for code in code_list], api_id_value))
+                updated = cursor.rowcount
+            conn.commit()
+        except psycopg2.DatabaseError:
+            if not conn.closed:
+                conn.rollback()
+            raise
+    return updated
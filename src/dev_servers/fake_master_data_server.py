@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、JPXの銘柄一覧（data_j.xls）とIPO一覧のページの代わりに使うローカルの疑似サーバーを提供するモジュールです。
+
+ファイル内の主な処理ステップ:
+1. /data_j.xls には jpx_content（--jpx-file で指定したファイルの内容）を、/ipo-list にはIPO一覧のHTMLを返します。
+   IPO一覧のHTMLは ipo_rows から作成し、make_ipo_df が読み込む2つ目の表に ｺｰﾄﾞ / 銘柄 / 市場 の列を持ちます。
+2. 応答には内容のハッシュから作ったETagと、内容を設定した時刻のLast-Modifiedを付けます。
+3. If-None-Match が一致する場合、または If-Modified-Since 以降に内容が変わっていない場合は304を返します。
+4. set_content(path, content) で内容を差し替えると、ETagとLast-Modifiedが変わります。
+
+実行方法:
+python3 /src/dev_servers/fake_master_data_server.py --port 18081 --jpx-file ./data_j.xls
+バッチからは環境変数 JPX_DATA_URL=http://localhost:18081/data_j.xls IPO_LIST_URL=http://localhost:18081/ipo-list
+を指定して接続します。
+
+注意事項:
+- --no-validators を指定すると、ETagとLast-Modifiedを返しません（内容のハッシュによる判定の確認用）。
+"""
+import argparse
+import email.utils
+import hashlib
+import html
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+JPX_PATH = "/data_j.xls"
+IPO_PATH = "/ipo-list"
+
+# IPO一覧の既定の行: (ｺｰﾄﾞ, 銘柄, 市場)
+DEFAULT_IPO_ROWS = (
+    ("9999", "テストホールディングス", "東G"),
+    ("9998", "サンプル工業", "東S"),
+    ("9997", "中止テスト(中止)", "東G"),
+    ("9996", "名証テスト", "名M"),
+)
+
+
+def make_ipo_html(rows):
+    """
+    IPO一覧のHTMLを作成する関数
+
+    Args:
+        rows (iterable): (ｺｰﾄﾞ, 銘柄, 市場) のタプル
+
+    Returns:
+        bytes: UTF-8のHTML
+    """
+    body_rows = "".join(
+        "<tr><td>2024/01/05</td>" + "".join(f"<td>{html.escape(str(value))}</td>" for value in row) + "</tr>"
+        for row in rows
+    )
+    document = (
+        '<html><head><meta charset="utf-8"><title>IPO</title></head><body>'
+        "<table><tr><th>更新日</th></tr><tr><td>2024/01/01</td></tr></table>"
+        "<table><tr><th>上場日</th><th>ｺｰﾄﾞ</th><th>銘柄</th><th>市場</th></tr>"
+        f"{body_rows}</table></body></html>"
+    )
+    return document.encode("utf-8")
+
+
+class FakeMasterDataHandler(BaseHTTPRequestHandler):
+    """
+    JPXの銘柄一覧とIPO一覧の疑似リクエストハンドラクラス（内容は server から読み込みます）
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        return
+
+    def do_GET(self):
+        server = self.server
+        path = self.path.split("?", 1)[0]
+        resource = server.get_resource(path)
+        if resource is None:
+            server.count(path, 404)
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        content, content_type, etag, modified_at = resource
+        if server.validators and self._not_modified(etag, modified_at):
+            server.count(path, 304)
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        server.count(path, 200)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        if server.validators:
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", email.utils.formatdate(modified_at, usegmt=True))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _not_modified(self, etag, modified_at):
+        """
+        条件付きリクエストの条件から、304を返すかどうかを判定するメソッド
+
+        Args:
+            etag (str): 現在の内容のETag
+            modified_at (float): 現在の内容を設定した時刻（エポック秒）
+
+        Returns:
+            bool: 304を返す場合はTrue
+        """
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return etag in (tag.strip() for tag in if_none_match.split(","))
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            # Last-Modified は秒単位のため、秒未満を切り捨てて比較する
+            return int(modified_at) <= since
+        return False
+
+
+class FakeMasterDataServer(ThreadingHTTPServer):
+    """
+    JPXの銘柄一覧とIPO一覧の疑似サーバークラス
+
+    Attributes:
+        validators (bool): ETagとLast-Modifiedを返すかどうか
+        requests (dict): (パス, ステータスコード) -> リクエスト数
+
+    Methods:
+        set_content(path, content, content_type): パスの内容を差し替えるメソッド
+        get_resource(path): パスの内容、Content-Type、ETag、更新時刻を返すメソッド
+        url(path): パスのURLを返すメソッド
+        start_background(): 別スレッドでサーバーを起動するメソッド
+    """
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, jpx_content=None, ipo_rows=DEFAULT_IPO_ROWS, validators=True):
+        """
+        疑似サーバーのコンストラクタ
+
+        Args:
+            host (str): 待ち受けるホスト
+            port (int): 待ち受けるポート（0の場合は空いているポート）
+            jpx_content (bytes): /data_j.xls の内容（省略時は404を返す）
+            ipo_rows (iterable): IPO一覧の (ｺｰﾄﾞ, 銘柄, 市場) のタプル
+            validators (bool): ETagとLast-Modifiedを返すかどうか
+        """
+        super().__init__((host, port), FakeMasterDataHandler)
+        self.validators = validators
+        self.requests = {}
+        self._resources = {}
+        self._lock = threading.Lock()
+        if jpx_content is not None:
+            self.set_content(JPX_PATH, jpx_content, "application/vnd.ms-excel")
+        self.set_content(IPO_PATH, make_ipo_html(ipo_rows), "text/html; charset=utf-8")
+
+    def set_content(self, path, content, content_type="application/octet-stream"):
+        """
+        パスの内容を差し替えるメソッド（ETagと更新時刻も変わります）
+
+        Args:
+            path (str): パス
+            content (bytes): 内容
+            content_type (str): Content-Type
+        """
+        etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+        with self._lock:
+            self._resources[path] = (content, content_type, etag, time.time())
+
+    def get_resource(self, path):
+        """
+        パスの内容、Content-Type、ETag、更新時刻を返すメソッド
+
+        Args:
+            path (str): パス
+
+        Returns:
+            tuple: (内容, Content-Type, ETag, 更新時刻)。パスがない場合はNone
+        """
+        with self._lock:
+            return self._resources.get(path)
+
+    def count(self, path, status):
+        with self._lock:
+            self.requests[(path, status)] = self.requests.get((path, status), 0) + 1
+
+    def url(self, path):
+        """
+        パスのURLを返すメソッド
+
+        Args:
+            path (str): パス
+
+        Returns:
+            str: URL
+        """
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def start_background(self):
+        """
+        別スレッドでサーバーを起動するメソッド
+
+        Returns:
+            threading.Thread: サーバーのスレッド
+        """
+        thread = threading.Thread(target=self.serve_forever, name="fake-master-data", daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    """
+    メイン関数：疑似サーバーを起動します。
+    """
+    parser = argparse.ArgumentParser(description="fake JPX / IPO master data server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=18081)
+    parser.add_argument("--jpx-file", default=None, help="/data_j.xls として返すファイル")
+    parser.add_argument("--no-validators", action="store_true", help="ETagとLast-Modifiedを返さない")
+    args = parser.parse_args()
+
+    jpx_content = None
+    if args.jpx_file is not None:
+        with open(args.jpx_file, "rb") as file:
+            jpx_content = file.read()
+    server = FakeMasterDataServer(args.host, args.port, jpx_content, validators=not args.no_validators)
+    print(f"fake master data server: {server.url(JPX_PATH)} {server.url(IPO_PATH)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,449 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、立花証券e支店APIの代わりに使うローカルの疑似サーバーを提供するモジュールです。
+
+ファイル内の主な処理ステップ:
+1. make_url_request が作成する「URL?{JSON}」（JSON部分はURLエンコード）形式のリクエストを解析します。
+2. CLMAuthLoginRequest には、このサーバーを指す仮想URL（sUrlRequest / sUrlEvent / sUrlMaster / sUrlPrice）を返します。
+   仮想URLにはログイン毎のセッションIDが含まれ、session_ttl 秒を過ぎたセッションや expire_sessions() で
+   無効にしたセッションへの要求には、セッション切れ（p_errno=2）を返します。
+3. CLMMfdsGetMarketPrice には、指定された銘柄と項目の板情報を返します。
+   板は銘柄毎に保持し、リクエスト毎に change_rate の確率で値が動きます。
+4. 応答の前に latency ± jitter 秒待ち、error_rate の確率でHTTP 503を返します。
+5. 仮想URL（sUrlEvent）への購読には、chunkedの応答でプッシュ配信を続けます（http_requests.event_stream の形式）。
+   最初に購読した銘柄のすべての項目を、以降は stream_interval 秒毎に変化した項目だけをFDメッセージで送り、
+   変化がない間は keepalive_interval 秒毎にKPメッセージを送ります。drop_streams() で配信中の接続を切断します。
+
+実行方法:
+python3 /src/dev_servers/fake_tachibana_server.py --port 18080 --latency 0.05 --jitter 0.02 --error-rate 0.01
+コレクターからは環境変数 TACHIBANA_URL_BASE=http://localhost:18080/e_api_v4r3/ を指定して接続します。
+
+注意事項:
+- 負荷試験用のサーバーです。認証情報は検証しません。
+- HTTP/1.1のkeep-aliveに対応しています。
+"""
+import argparse
+import datetime
+import json
+import random
+import secrets
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 既定値
+DEFAULT_LATENCY = 0.05
+DEFAULT_JITTER = 0.02
+DEFAULT_ERROR_RATE = 0.0
+DEFAULT_CHANGE_RATE = 0.3
+DEFAULT_STREAM_INTERVAL = 0.1
+DEFAULT_KEEPALIVE_INTERVAL = 5.0
+SESSION_INVALID_ERRNO = "2"
+
+_BASE_PATH = "/e_api_v4r3/"
+# プッシュ配信で送る項目（sTargetColumn と同じ項目）
+_STREAM_COLUMNS = tuple(
+    ["pDPP", "pDV", "pPRP", "pDOP", "pDHP", "pDLP", "pVWAP", "pQAP", "pQAS", "pQBP", "pQBS",
+     "pAAV", "pABV", "pQOV", "pQUV"]
+    + [f"{prefix}{level}" for prefix in ("pGAP", "pGBP", "pGAV", "pGBV") for level in range(10, 0, -1)]
+)
+_INTEGER_PREFIXES = ("pDV", "pAAV", "pQOV", "pQUV", "pGAV", "pGBV")
+
+
+def format_p_date(value):
+    """
+    datetimeを p_sd_date / p_rv_date の書式（例: 2024.01.05-09:00:00.123）に変換する関数
+
+    Args:
+        value (datetime.datetime): 変換する日時
+
+    Returns:
+        str: 変換した文字列
+    """
+    return value.strftime("%Y.%m.%d-%H:%M:%S.") + f"{value.microsecond // 1000:03d}"
+
+
+class FakeMarket:
+    """
+    銘柄毎の板を保持し、リクエスト毎に確率的に動かすクラス
+
+    Attributes:
+        change_rate (float): 1リクエストで板が変化する確率
+    """
+
+    def __init__(self, change_rate=DEFAULT_CHANGE_RATE, seed=None):
+        """
+        疑似市場クラスのコンストラクタ
+
+        Args:
+            change_rate (float): 1リクエストで板が変化する確率
+            seed (int): 乱数のシード（省略可能）
+        """
+        self.change_rate = change_rate
+        self._random = random.Random(seed)
+        self._boards = {}
+        self._lock = threading.Lock()
+
+    def _new_board(self, code):
+        """
+        銘柄の初期の板を作成するメソッド
+
+        Args:
+            code (str): 銘柄コード
+
+        Returns:
+            dict: 項目名 -> 値
+        """
+        price = self._random.randint(100, 9000)
+        board = {"price": price, "volume": self._random.randint(0, 1_000_000)}
+        board["sizes"] = [self._random.randint(1, 500) * 100 for _ in range(20)]
+        return board
+
+    def _move(self, board):
+        """
+        板を1ティック分動かすメソッド
+
+        Args:
+            board (dict): 銘柄の板
+        """
+        board["price"] = max(1, board["price"] + self._random.choice((-1, 0, 1)))
+        board["volume"] += self._random.randint(0, 5000)
+        board["sizes"] = [max(0, size + self._random.randint(-2, 2) * 100) for size in board["sizes"]]
+
+    def quote(self, code, columns):
+        """
+        銘柄の現在の板を、指定された項目の文字列の辞書で返すメソッド
+
+        Args:
+            code (str): 銘柄コード
+            columns (list): 項目名のリスト
+
+        Returns:
+            dict: sIssueCode と各項目の値（文字列）
+        """
+        with self._lock:
+            board = self._boards.get(code)
+            if board is None:
+                board = self._new_board(code)
+                self._boards[code] = board
+            elif self._random.random() < self.change_rate:
+                self._move(board)
+            price = board["price"]
+            volume = board["volume"]
+            sizes = list(board["sizes"])
+
+        item = {"sIssueCode": code}
+        for column in columns:
+            if column.startswith(("pGAP", "pGBP")):
+                level = int(column[4:])
+                value = f"{price + level if column.startswith('pGAP') else price - level:.1f}"
+            elif column.startswith(("pGAV", "pGBV")):
+                level = int(column[4:])
+                value = str(sizes[level - 1 if column.startswith("pGAV") else level + 9])
+            elif column == "pDV":
+                value = str(volume)
+            elif column.startswith(_INTEGER_PREFIXES):
+                value = str(sizes[0])
+            elif column in ("pQAS", "pQBS"):
+                value = ""
+            else:
+                value = f"{price:.1f}"
+            item[column] = value
+        return item
+
+
+class FakeTachibanaHandler(BaseHTTPRequestHandler):
+    """
+    立花証券APIの疑似リクエストハンドラクラス（設定は server の属性から読み込みます）
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # 負荷試験中にリクエスト毎のログを出さない
+        return
+
+    def _send_json(self, status, value):
+        body = json.dumps(value).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _parse_request(self):
+        """
+        「URL?{JSON}」形式のリクエストを解析するメソッド
+
+        Returns:
+            tuple: (パス, リクエストのJSONの辞書)
+        """
+        path, _, query = self.path.partition("?")
+        return path, json.loads(urllib.parse.unquote(query)) if query else {}
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream_events(self, session_id, query):
+        """
+        購読した銘柄の時価情報をプッシュ配信するメソッド
+
+        Args:
+            session_id (str): 仮想URLのセッションID
+            query (str): 購読のクエリ文字列（p_gyou_no / p_issue_code 等）
+        """
+        server = self.server
+        params = urllib.parse.parse_qs(query)
+        rows = params.get("p_gyou_no", [""])[0].split(",")
+        codes = params.get("p_issue_code", [""])[0].split(",")
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        generation = server.stream_generation
+        message_no = 0
+        last_values = {}
+        last_sent = time.monotonic()
+        try:
+            while generation == server.stream_generation:
+                message_no += 1
+                header = f"p_no\x02{message_no}\x01p_date\x02{format_p_date(datetime.datetime.now())}\x01"
+                if not server.is_session_valid(session_id):
+                    self._write_chunk(
+                        f"{header}p_errno\x02{SESSION_INVALID_ERRNO}\x01p_err\x02session is not valid\x01p_cmd\x02ST\n"
+                        .encode("utf-8")
+                    )
+                    break
+                fields = []
+                for row, code in zip(rows, codes):
+                    for column, value in server.market.quote(code, _STREAM_COLUMNS).items():
+                        if column != "sIssueCode" and last_values.get((row, column)) != value:
+                            last_values[(row, column)] = value
+                            fields.append(f"p_{row}_{column[1:]}\x02{value}")
+                now = time.monotonic()
+                if fields:
+                    server.count_request()
+                    self._write_chunk(f"{header}p_errno\x020\x01p_cmd\x02FD\x01{chr(1).join(fields)}\n".encode("utf-8"))
+                    last_sent = now
+                elif now - last_sent >= server.keepalive_interval:
+                    self._write_chunk(f"{header}p_errno\x020\x01p_cmd\x02KP\n".encode("utf-8"))
+                    last_sent = now
+                time.sleep(server.stream_interval)
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def do_GET(self):
+        server = self.server
+        path, _, query = self.path.partition("?")
+        if path.endswith("/event/"):
+            self._stream_events(path[len(_BASE_PATH):].split("/", 1)[0], query)
+            return
+        try:
+            path, request = self._parse_request()
+        except ValueError:
+            self._send_json(400, {"p_errno": "-1", "p_err": "invalid request"})
+            return
+
+        delay = server.latency + server.random.uniform(-server.jitter, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        server.count_request()
+        if server.random.random() < server.error_rate:
+            self._send_json(503, {"p_errno": "-62", "p_err": "service unavailable"})
+            return
+
+        response = {
+            "p_no": request.get("p_no", ""),
+            "p_sd_date": request.get("p_sd_date", ""),
+            "p_rv_date": format_p_date(datetime.datetime.now()),
+            "p_errno": "0",
+            "p_err": "",
+            "sCLMID": request.get("sCLMID", ""),
+        }
+        if request.get("sCLMID") == "CLMAuthLoginRequest":
+            base_url = f"http://{self.headers.get('Host')}{_BASE_PATH}{server.create_session()}/"
+            response.update({
+                "sResultCode": "0",
+                "sZyoutoekiKazeiC": "1",
+                "sUrlRequest": f"{base_url}request/",
+                "sUrlMaster": f"{base_url}master/",
+                "sUrlPrice": f"{base_url}price/",
+                "sUrlEvent": f"{base_url}event/",
+            })
+        elif not server.is_session_valid(path[len(_BASE_PATH):].split("/", 1)[0]):
+            response.update({"p_errno": SESSION_INVALID_ERRNO, "p_err": "session is not valid"})
+        elif request.get("sCLMID") == "CLMMfdsGetMarketPrice":
+            codes = [code for code in request.get("sTargetIssueCode", "").split(",") if code]
+            columns = [column for column in request.get("sTargetColumn", "").split(",") if column]
+            response["aCLMMfdsMarketPrice"] = [server.market.quote(code, columns) for code in codes]
+        else:
+            response.update({"p_errno": "-1", "p_err": f"unsupported sCLMID: {request.get('sCLMID')}"})
+        self._send_json(200, response)
+
+
+class FakeTachibanaServer(ThreadingHTTPServer):
+    """
+    立花証券APIの疑似サーバークラス
+
+    Attributes:
+        latency (float): 応答までの平均の待ち時間（秒）
+        jitter (float): 待ち時間の揺らぎ（秒、±の一様分布）
+        error_rate (float): HTTP 503を返す確率
+        market (FakeMarket): 疑似市場
+        requests (int): 受け付けたリクエスト数
+        session_ttl (float): セッションの有効期間（秒、Noneの場合は無期限）
+
+    Methods:
+        url_base(): ログイン先のURLを返すメソッド
+        create_session(): セッションを作成し、セッションIDを返すメソッド
+        is_session_valid(session_id): セッションが有効かどうかを返すメソッド
+        expire_sessions(): すべてのセッションを無効にするメソッド
+        drop_streams(): 配信中のプッシュ配信の接続をすべて切断するメソッド
+        start_background(): 別スレッドでサーバーを起動するメソッド
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=DEFAULT_LATENCY, jitter=DEFAULT_JITTER,
+                 error_rate=DEFAULT_ERROR_RATE, change_rate=DEFAULT_CHANGE_RATE, seed=None, session_ttl=None,
+                 stream_interval=DEFAULT_STREAM_INTERVAL, keepalive_interval=DEFAULT_KEEPALIVE_INTERVAL):
+        """
+        疑似サーバークラスのコンストラクタ
+
+        Args:
+            host (str): 待ち受けるホスト
+            port (int): 待ち受けるポート（0の場合は空いているポート）
+            latency (float): 応答までの平均の待ち時間（秒）
+            jitter (float): 待ち時間の揺らぎ（秒）
+            error_rate (float): HTTP 503を返す確率
+            change_rate (float): 1リクエストで板が変化する確率
+            seed (int): 乱数のシード（省略可能）
+            session_ttl (float): セッションの有効期間（秒、省略時は無期限）
+            stream_interval (float): プッシュ配信で変化を確認する間隔（秒）
+            keepalive_interval (float): プッシュ配信で変化がない間にKPを送る間隔（秒）
+        """
+        super().__init__((host, port), FakeTachibanaHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.market = FakeMarket(change_rate, seed)
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.session_ttl = session_ttl
+        self.stream_interval = stream_interval
+        self.keepalive_interval = keepalive_interval
+        self.stream_generation = 0
+        self._sessions = {}
+        self._count_lock = threading.Lock()
+
+    def count_request(self):
+        with self._count_lock:
+            self.requests += 1
+
+    def create_session(self):
+        """
+        セッションを作成し、セッションIDを返すメソッド
+
+        Returns:
+            str: セッションID
+        """
+        session_id = secrets.token_hex(8)
+        with self._count_lock:
+            self._sessions[session_id] = time.monotonic()
+        return session_id
+
+    def is_session_valid(self, session_id):
+        """
+        セッションが有効かどうかを返すメソッド
+
+        Args:
+            session_id (str): セッションID
+
+        Returns:
+            bool: 有効な場合はTrue
+        """
+        with self._count_lock:
+            created_at = self._sessions.get(session_id)
+        if created_at is None:
+            return False
+        return self.session_ttl is None or time.monotonic() - created_at < self.session_ttl
+
+    def expire_sessions(self):
+        """
+        すべてのセッションを無効にするメソッド
+        """
+        with self._count_lock:
+            self._sessions.clear()
+
+    def drop_streams(self):
+        """
+        配信中のプッシュ配信の接続をすべて切断するメソッド
+        """
+        self.stream_generation += 1
+
+    def server_close(self):
+        self.drop_streams()
+        super().server_close()
+
+    def url_base(self):
+        """
+        ログイン先のURL（TACHIBANA_URL_BASE に指定する値）を返すメソッド
+
+        Returns:
+            str: ログイン先のURL
+        """
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{_BASE_PATH}"
+
+    def start_background(self):
+        """
+        別スレッドでサーバーを起動するメソッド
+
+        Returns:
+            threading.Thread: サーバーのスレッド
+        """
+        thread = threading.Thread(target=self.serve_forever, name="fake-tachibana", daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    """
+    メイン関数：疑似サーバーを起動します。
+    """
+    parser = argparse.ArgumentParser(description="fake Tachibana e_api server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY, help="平均の待ち時間（秒）")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER, help="待ち時間の揺らぎ（秒）")
+    parser.add_argument("--error-rate", type=float, default=DEFAULT_ERROR_RATE, help="HTTP 503を返す確率")
+    parser.add_argument("--change-rate", type=float, default=DEFAULT_CHANGE_RATE, help="板が変化する確率")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--session-ttl", type=float, default=None, help="セッションの有効期間（秒）")
+    parser.add_argument("--stream-interval", type=float, default=DEFAULT_STREAM_INTERVAL,
+                        help="プッシュ配信で変化を確認する間隔（秒）")
+    parser.add_argument("--keepalive-interval", type=float, default=DEFAULT_KEEPALIVE_INTERVAL,
+                        help="プッシュ配信でKPを送る間隔（秒）")
+    args = parser.parse_args()
+
+    server = FakeTachibanaServer(
+        args.host, args.port, args.latency, args.jitter, args.error_rate, args.change_rate, args.seed,
+        args.session_ttl, args.stream_interval, args.keepalive_interval,
+    )
+    print(f"fake tachibana server: {server.url_base()}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
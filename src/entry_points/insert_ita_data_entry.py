@@ -9,10 +9,45 @@
 
 プログラムの流れ:
 1. 立花証券のAPIにログインし、アカウントのインスタンスを取得します。
+   当日のセッションが TACHIBANA_SESSION_FILE に保存されていればログインせずに再利用し、
+   取得中にセッションが切れた場合は自動で再ログインします（http_requests.session_manager）。
+   TACHIBANA_SESSION_FILE に空文字列を指定すると、セッションを保存・再利用しません。
 2. ログインが成功した場合、PostgreSQLデータベースに接続します。
 3. 祝日でない限り、定期的に株価データの取得とデータベースへの保存を行います。
 4. 取得したデータはThreadPoolExecutorを使用して並行して処理します。
-5. 毎日15時になると最後の1回だけ株価データを取得し、データベースに保存します。
+   環境変数 ITA_COLLECTOR_MODE に async を指定すると、in-flight数の上限とバックプレッシャーを持つ
+   asyncioコレクター（logic.async_collector_logic）で処理します。
+   環境変数 ITA_WRITE_BEHIND に 1 を指定すると、取得したデータはライトビハインドバッファ
+   （logic.write_behind_logic）に溜めて専用スレッドから一括で書き込みます。
+   環境変数 ITA_CHANGE_FILTER に 1 を指定すると、前回から板が変化していない銘柄の行を間引きます
+   （logic.change_detection_logic、ITA_HEARTBEAT_SECONDS 秒毎に生存確認の行を保存）。
+   環境変数 ITA_DECODER に columnar を指定すると、応答を列指向のNumPy配列に変換して書き込みます。
+   環境変数 ITA_ORDER_BOOK_CAPACITY に1以上を指定すると、銘柄毎に直近の板をリングバッファ
+   （logic.order_book_logic）に保持します。
+   環境変数 ITA_JOURNAL に 1 を指定すると、応答を解析前に ITA_JOURNAL_DIR のジャーナル
+   （logic.response_journal_logic）に追記します。ITA_JOURNAL_REPLAY_ON_START に 1 を指定すると、
+   起動時に前回までの未適用のレコードをita_tableに書き込んでから取得を始めます。
+   書き込みが確定したレコードには適用済みフラグを立て、全レコードが適用済みのセグメントは
+   ITA_JOURNAL_RETENTION_SECONDS 秒（既定は1日）を過ぎたら削除します（負の値を指定すると削除しません）。
+   環境変数 ITA_METRICS_PORT を指定すると、処理段階毎のレイテンシ等をPrometheusのテキスト形式で
+   http://<host>:<port>/metrics に公開します。ITA_METRICS_FILE を指定すると、同じ内容を
+   ITA_METRICS_DUMP_INTERVAL 秒毎にファイルに書き出します（utilities.metrics）。
+   タスクは壁時計の interval 秒毎の境界（logic.tick_scheduler_logic）に揃えて開始し、
+   境界の時刻（エポックミリ秒）をtick_idとして保存します。遅れたtickや飛ばした境界は件数を記録します。
+   環境変数 ITA_ADAPTIVE_RATE に 1 を指定すると、tickの間隔と同時実行数を応答時間とエラーから
+   AIMDで調整します（logic.adaptive_rate_logic、ITA_RATE_MIN / ITA_RATE_MAX / ITA_RATE_CAP /
+   ITA_CONCURRENCY_MIN / ITA_CONCURRENCY_MAX / ITA_TARGET_LATENCY）。
+   環境変数 ITA_COLLECTOR_MODE に stream を指定すると、ポーリングの代わりにログイン時の仮想URL（sUrlEvent）の
+   プッシュ配信を購読し、ITA_STREAM_FLUSH_INTERVAL 秒毎に板が変化した銘柄だけを保存します
+   （logic.event_stream_logic）。切断された場合は再接続して購読し直します。
+   環境変数 ITA_PARSE_WORKERS に1以上を指定すると、応答の解析とデータベースへの書き込みをその数の
+   ワーカープロセス（logic.parse_pool_logic）で行い、応答は共有メモリ経由で渡します（0の場合はCPUのコア数）。
+   この場合、ITA_WRITE_BEHIND / ITA_CHANGE_FILTER / ITA_ORDER_BOOK_CAPACITY は使用されません。
+   ワーカーが異常終了してプールが使用できなくなった場合は、終了コード1で終了します（監視プロセスが再起動します）。
+   寄付前と昼休み（utilities.trading_calendar の区分）はtickを発行せず、次の立会の ITA_SESSION_WAKE_LEAD 秒前まで
+   待機します（logic.trading_session_logic）。昼休みに起動した場合は1回だけ取得してから待機します。
+   ITA_SESSION_GATE に 0 を指定すると、従来どおり大引けまで取得を続けます。
+5. 大引け（既定は15時）になると最後の1回だけ株価データを取得し、データベースに保存します。
 6. プログラムの終了時にPostgreSQLの接続をクローズします。
 
 注意事項:
@@ -34,13 +69,33 @@ API利用の際は利用規約に従って適切にご利用ください。
 
 # %%
 import os
-import time
+import sys
+import asyncio
+import functools
 import logging
 import psycopg2
 import requests
 import concurrent.futures
-from logic.insert_ita_logic import get_target_code_list, login_and_get_account_instance, execute_task
+from logic.insert_ita_logic import get_target_code_list, execute_task, make_persist
+from logic.async_collector_logic import run_async_collector
+from logic.sharded_fetch_logic import get_shard_stats
+from logic.write_behind_logic import ItaWriteBehindBuffer
+from logic.change_detection_logic import SnapshotChangeFilter
+from logic.order_book_logic import OrderBookStore
+from logic.response_journal_logic import (
+    ResponseJournal, install_response_journal, replay_journal, DEFAULT_JOURNAL_DIR, DEFAULT_RETENTION_SECONDS,
+    DEFAULT_SEGMENT_BYTES
+)
+from logic.ita_partition_logic import ensure_partitions
+from logic.tick_scheduler_logic import TickScheduler
+from logic.adaptive_rate_logic import AdaptiveRateController, install_rate_controller
+from logic.event_stream_logic import EventStreamIngestor
+from logic.parse_pool_logic import ParsePersistPool
+from logic.trading_session_logic import SessionGate, DEFAULT_WAKE_LEAD
+from database.db_connector import get_pool_stats
+from http_requests.session_manager import open_tachibana_session, DEFAULT_STATE_PATH
 from log.logging_config import configure_logging
+from utilities.metrics import counter, gauge, heartbeat, start_metrics_file_dump, start_metrics_server
 from utilities.utility import handle_log, is_today_holiday
 from utilities.custom_exceptions import MissingAPIIdError, NoMatchingCodeError
 
@@ -53,7 +108,7 @@ def main():
         None
     """
     # ログ設定
-    log_filename = "/src/log/insert_ita.log"
+    log_filename = os.environ.get("ITA_LOG_FILE", "/src/log/insert_ita.log")
     logger = configure_logging(log_filename)
 
     # 開始のログを出力
@@ -64,6 +119,13 @@ def main():
         handle_log(logger, "completion: Closed due to a holiday.", logging.INFO)
         return
 
+    # 途中で例外が発生した場合も finally で解放するリソース
+    parse_pool = None
+    metrics_server = None
+    metrics_dump = None
+    journal = None
+    writer = None
+    controller = None
     try:
         # PostgreSQLの接続情報を環境変数から取得
         db_params = {
@@ -73,8 +135,52 @@ def main():
             "password": os.environ.get("POSTGRES_PASSWORD"),
         }
 
-        # ログインを行い、アカウントのインスタンスを作成
-        account_instance = login_and_get_account_instance()
+        # 解析と書き込みを行うワーカープロセス（ITA_PARSE_WORKERS を指定した場合のみ）
+        # ワーカーはforkで起動するため、他のスレッドを起動する前に作成する
+        parse_pool = None
+        if os.environ.get("ITA_PARSE_WORKERS", "") != "":
+            parse_pool = ParsePersistPool(
+                db_params,
+                workers=int(os.environ["ITA_PARSE_WORKERS"]) or None,
+                columnar=os.environ.get("ITA_DECODER", "dict") == "columnar",
+            )
+
+        # メトリクスの公開（ITA_METRICS_PORT / ITA_METRICS_FILE を指定した場合のみ）
+        metrics_server = None
+        if os.environ.get("ITA_METRICS_PORT"):
+            metrics_server = start_metrics_server(int(os.environ["ITA_METRICS_PORT"]))
+        metrics_dump = None
+        if os.environ.get("ITA_METRICS_FILE"):
+            metrics_dump = start_metrics_file_dump(
+                os.environ["ITA_METRICS_FILE"], float(os.environ.get("ITA_METRICS_DUMP_INTERVAL", 10))
+            )
+
+        # 本日以降のita_tableのパーティションを作成（失敗してもデフォルトパーティションに保存されるため続行）
+        try:
+            ensure_partitions(db_params, days_ahead=int(os.environ.get("ITA_PARTITION_DAYS_AHEAD", 1)))
+        except psycopg2.DatabaseError as db_error:
+            handle_log(logger, f"Failed to create ita_table partitions: {db_error}", logging.WARNING)
+
+        # 応答のジャーナル（ITA_JOURNAL=1 の場合のみ）
+        journal = None
+        if os.environ.get("ITA_JOURNAL", "0") == "1":
+            journal_dir = os.environ.get("ITA_JOURNAL_DIR", DEFAULT_JOURNAL_DIR)
+            retention_seconds = float(os.environ.get("ITA_JOURNAL_RETENTION_SECONDS", DEFAULT_RETENTION_SECONDS))
+            # 前回のプロセスが書き込んでいたセグメントはここで封印される
+            journal = ResponseJournal(
+                journal_dir,
+                segment_bytes=int(os.environ.get("ITA_JOURNAL_SEGMENT_BYTES", DEFAULT_SEGMENT_BYTES)),
+                sync=os.environ.get("ITA_JOURNAL_SYNC", "0") == "1",
+                retention_seconds=retention_seconds if retention_seconds >= 0 else None,
+            )
+            if os.environ.get("ITA_JOURNAL_REPLAY_ON_START", "0") == "1":
+                handle_log(logger, f"journal replay stats: {replay_journal(db_params, journal_dir)}", logging.INFO)
+            install_response_journal(journal, logger)
+
+        # ログインを行い（当日のセッションが保存されていれば再利用し）、アカウントのインスタンスを作成
+        account_instance = open_tachibana_session(
+            os.environ.get("TACHIBANA_SESSION_FILE", DEFAULT_STATE_PATH) or None, logger
+        )
 
         # コードリストを取得
         code_list = get_target_code_list(db_params, os.environ.get("TACHIBANA_USERID"))
@@ -83,28 +189,161 @@ def main():
         interval = 0.1
         # 最大の並行タスク数
         max_workers = 10
+        # 1リクエストあたりの銘柄数（未指定の場合は分割しない）
+        shard_size = int(os.environ.get("ITA_SHARD_SIZE", 0)) or None
+
+        # 変化のないスナップショットを間引くフィルタ（ITA_CHANGE_FILTER=1 の場合のみ）
+        change_filter = None
+        if os.environ.get("ITA_CHANGE_FILTER", "0") == "1":
+            change_filter = SnapshotChangeFilter(
+                heartbeat_seconds=float(os.environ.get("ITA_HEARTBEAT_SECONDS", 60))
+            )
+        # ライトビハインドバッファ（ITA_WRITE_BEHIND=1 の場合のみ）
+        writer = None
+        if os.environ.get("ITA_WRITE_BEHIND", "0") == "1":
+            # フィルタのフィンガープリントとジャーナルの適用済みフラグは、書き込みが確定した時点で記録する
+            def on_written(rows):
+                if change_filter is not None:
+                    change_filter.commit(rows)
+                if journal is not None:
+                    journal.mark_applied(rows)
+
+            def on_dropped(rows):
+                if change_filter is not None:
+                    change_filter.rollback(rows)
+                if journal is not None:
+                    journal.mark_dropped(rows)
+
+            writer = ItaWriteBehindBuffer(
+                db_params,
+                max_rows=int(os.environ.get("ITA_WRITE_BEHIND_MAX_ROWS", 2000)),
+                max_age=float(os.environ.get("ITA_WRITE_BEHIND_MAX_AGE", 1.0)),
+                logger=logger,
+                on_written=on_written,
+                on_dropped=on_dropped,
+            )
+        # 銘柄毎の板のリングバッファ（ITA_ORDER_BOOK_CAPACITY が1以上の場合のみ）
+        order_books = None
+        order_book_capacity = int(os.environ.get("ITA_ORDER_BOOK_CAPACITY", 0))
+        if order_book_capacity > 0:
+            order_books = OrderBookStore(order_book_capacity)
+        # tickの間隔と同時実行数を調整するコントローラー（ITA_ADAPTIVE_RATE=1 の場合のみ）
+        controller = None
+        if os.environ.get("ITA_ADAPTIVE_RATE", "0") == "1":
+            controller = AdaptiveRateController(
+                min_rate=float(os.environ.get("ITA_RATE_MIN", 1.0)),
+                max_rate=float(os.environ.get("ITA_RATE_MAX", 1 / interval)),
+                rate_cap=float(os.environ.get("ITA_RATE_CAP", 20.0)),
+                min_concurrency=int(os.environ.get("ITA_CONCURRENCY_MIN", 1)),
+                max_concurrency=int(os.environ.get("ITA_CONCURRENCY_MAX", max_workers)),
+                target_latency=float(os.environ.get("ITA_TARGET_LATENCY", 0.5)),
+                requests_per_tick=-(-len(code_list) // shard_size) if shard_size else 1,
+            )
+            install_rate_controller(controller)
+            max_workers = controller.max_concurrency
 
-        # ThreadPoolExecutorを作成
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # 15時までのループを開始
-            while time.localtime().tm_hour < 15:
+        # 大引けの判定と、立会時間外の待機（ITA_SESSION_GATE=0 の場合は待機しない）
+        session_gate = SessionGate(
+            lead=float(os.environ.get("ITA_SESSION_WAKE_LEAD", DEFAULT_WAKE_LEAD)), logger=logger
+        )
+        wait_gate = session_gate if os.environ.get("ITA_SESSION_GATE", "1") == "1" else None
 
-                start_time = time.time()
-                # execute_tasksを非同期に実行
-                executor.submit(execute_task, account_instance, code_list, db_params)
+        def keep_running():
+            # 解析のワーカーが異常終了した場合は、大引けを待たずにループを抜ける
+            return (parse_pool is None or not parse_pool.broken) and session_gate.before_close()
 
-                # 次のタスクがinterval秒後に開始されるように調整
-                elapsed_time = time.time() - start_time
-                time_to_wait = interval - elapsed_time
+        task = functools.partial(
+            execute_task, shard_size=shard_size, writer=writer, change_filter=change_filter,
+            columnar=os.environ.get("ITA_DECODER", "dict") == "columnar", order_books=order_books,
+            parse_pool=parse_pool, on_applied=journal.mark_applied if journal is not None else None,
+        )
+        if parse_pool is not None and (writer is not None or change_filter is not None or order_books is not None):
+            handle_log(
+                logger, "ITA_PARSE_WORKERS is set: write-behind, change filter and order books are not used",
+                logging.WARNING,
+            )
 
-                if time_to_wait > 0:
-                    time.sleep(time_to_wait)
+        if os.environ.get("ITA_COLLECTOR_MODE", "thread") == "stream":
+            # プッシュ配信を購読する場合
+            ingestor = EventStreamIngestor(
+                account_instance, code_list,
+                make_persist(db_params, writer, change_filter, order_books=order_books),
+                flush_interval=float(os.environ.get("ITA_STREAM_FLUSH_INTERVAL", interval)),
+                logger=logger,
+            )
+            stats = ingestor.run(keep_running)
+            # 大引けになったら最後の1回だけタスクを実行
+            task(account_instance, code_list, db_params)
+            handle_log(logger, f"event stream stats: {stats}", logging.INFO)
+        elif os.environ.get("ITA_COLLECTOR_MODE", "thread") == "async":
+            # asyncioコレクターで実行する場合
+            stats = asyncio.run(run_async_collector(
+                account_instance, code_list, db_params,
+                should_continue=keep_running,
+                interval=interval,
+                max_in_flight=int(os.environ.get("ITA_MAX_IN_FLIGHT", max_workers)),
+                overflow_policy=os.environ.get("ITA_OVERFLOW_POLICY", "skip"),
+                logger=logger,
+                task=task,
+                controller=controller,
+                session_gate=wait_gate,
+            ))
+            handle_log(logger, f"collector stats: {stats}", logging.INFO)
+        else:
+            # 実行中・待機中のタスク数と失敗件数を記録する
+            in_flight = gauge("ita_executor_in_flight", "Submitted ITA tasks that have not finished yet.")
+            task_failures = counter("ita_task_failures_total", "Failed ITA tasks.")
+            ticks_dropped = counter("ita_ticks_dropped_total", "Ticks dropped by the overflow policy.")
+            running = set()
 
-            # 15時になったら最後の1回だけタスクを実行
-            executor.submit(execute_task, account_instance, code_list, db_params)
-            # ログを表示
-            handle_log(logger, "completion: market closure.", logging.INFO)
-            return
+            def on_task_done(future):
+                running.discard(future)
+                in_flight.dec()
+                # 成功・失敗に関わらず、タスクが終わったことを監視プロセスに知らせる
+                heartbeat()
+                if future.exception() is not None:
+                    task_failures.inc()
+                    handle_log(logger, f"ita task failed: {future.exception()}")
+
+            def submit_task(executor, tick_id=None):
+                in_flight.inc()
+                future = executor.submit(task, account_instance, code_list, db_params, tick_id=tick_id)
+                running.add(future)
+                future.add_done_callback(on_task_done)
+
+            # 壁時計のinterval秒毎の境界でtickを発行するスケジューラ
+            # （寄付前と昼休みは次の立会の直前まで待機する）
+            scheduler = TickScheduler(
+                interval if controller is None else controller.interval(), session_gate=wait_gate
+            )
+
+            # ThreadPoolExecutorを作成
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # 大引けまでのループを開始
+                while keep_running():
+                    if controller is not None:
+                        scheduler.set_interval(controller.interval())
+                    # 次の境界まで待ち、execute_tasksを非同期に実行
+                    tick = scheduler.wait()
+                    # コントローラーの同時実行数の上限に達している場合はこのtickを捨てる
+                    if controller is not None and len(running) >= controller.concurrency:
+                        ticks_dropped.inc(reason="skipped")
+                        continue
+                    submit_task(executor, tick.tick_id)
+
+                # 大引けになったら最後の1回だけタスクを実行
+                submit_task(executor)
+            handle_log(logger, f"tick scheduler stats: {scheduler.stats}", logging.INFO)
+
+        # ログを表示
+        handle_log(logger, "completion: market closure.", logging.INFO)
+        handle_log(logger, f"session gate stats: {session_gate.stats}", logging.INFO)
+        handle_log(logger, f"shard stats: {get_shard_stats()}", logging.INFO)
+        handle_log(logger, f"db pool stats: {get_pool_stats()}", logging.INFO)
+        handle_log(logger, f"tachibana session stats: {account_instance.session.stats}", logging.INFO)
+        if change_filter is not None:
+            handle_log(logger, f"change filter stats: {change_filter.stats()}", logging.INFO)
+        return
     # エラーハンドリング
     except requests.exceptions.Timeout as e:
         # リクエストがタイムアウトした場合
@@ -130,6 +369,31 @@ def main():
     except Exception as general_exception:
         # 予期しないその他のエラーが発生した場合
         handle_log(logger, f"An unexpected error occurred: {general_exception}")
+    finally:
+        if controller is not None:
+            install_rate_controller(None)
+            handle_log(
+                logger,
+                f"rate controller: rate={controller.rate} concurrency={controller.concurrency} {controller.stats}",
+                logging.INFO,
+            )
+        # 実行中のタスクが終わった後に、ワーカーとバッファに残っているデータをすべて書き込む
+        if parse_pool is not None:
+            parse_pool.close()
+            handle_log(logger, f"parse pool stats: {parse_pool.stats}", logging.INFO)
+        if writer is not None:
+            writer.close(timeout=float(os.environ.get("ITA_WRITE_BEHIND_CLOSE_TIMEOUT", 60)))
+        if journal is not None:
+            install_response_journal(None)
+            handle_log(logger, f"journal stats: {journal.close()}", logging.INFO)
+        if metrics_dump is not None:
+            metrics_dump.set()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        # プールが使用できなくなった場合は、監視プロセスが再起動するように0以外の終了コードで終了する
+        if parse_pool is not None and parse_pool.broken:
+            handle_log(logger, "parse pool is broken: exit with status 1 to be restarted")
+            sys.exit(1)
     return
 
 
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、ita_tableのパーティションを保守するバッチプロセスを定義しています。
+
+ファイル内の主な処理ステップ:
+1. ログの設定: ログファイルへの情報の記録を行います。
+2. データベース接続情報の取得: 環境変数からPostgreSQLデータベースへの接続情報を取得します。
+3. パーティションの事前作成: 今日から ITA_PARTITION_DAYS_AHEAD 日先までの日毎のパーティションを作成します。
+4. 古いパーティションの削除: ITA_RETENTION_DAYS 日より古いパーティションをDROPします（0の場合は削除しません）。
+
+注意事項:
+- コンテナ起動時（entrypoint.sh）に実行されます。日を跨いで動かす場合はcron等で毎日実行してください。
+- 予期せぬエラーが発生した場合、適切なログが記録されます。
+"""
+
+# %%
+import os
+import logging
+import psycopg2
+from logic.ita_partition_logic import maintain_partitions, DEFAULT_DAYS_AHEAD, DEFAULT_RETENTION_DAYS
+from log.logging_config import configure_logging
+from utilities.utility import handle_log
+
+
+def main():
+    """
+    メインの処理を実行する関数
+
+    Returns:
+        None
+    """
+    # ログ設定
+    log_filename = "/src/log/maintain_ita_partition.log"
+    logger = configure_logging(log_filename)
+
+    # 開始のログを出力
+    handle_log(logger, f"start: {__name__}", logging.INFO)
+
+    try:
+        # PostgreSQLの接続情報を環境変数から取得
+        db_params = {
+            "host": os.environ.get("POSTGRES_HOST"),
+            "database": os.environ.get("POSTGRES_DB"),
+            "user": os.environ.get("POSTGRES_USER"),
+            "password": os.environ.get("POSTGRES_PASSWORD"),
+        }
+
+        created, dropped = maintain_partitions(
+            db_params,
+            days_ahead=int(os.environ.get("ITA_PARTITION_DAYS_AHEAD", DEFAULT_DAYS_AHEAD)),
+            retention_days=int(os.environ.get("ITA_RETENTION_DAYS", DEFAULT_RETENTION_DAYS)),
+        )
+        handle_log(logger, f"created partitions: {created}", logging.INFO)
+        handle_log(logger, f"dropped partitions: {dropped}", logging.INFO)
+    except psycopg2.DatabaseError as db_error:
+        # データベース関連のエラーが発生した場合
+        handle_log(logger, f"An error occurred in the database: {db_error}")
+    except Exception as general_exception:
+        # 予期しないその他のエラーが発生した場合
+        handle_log(logger, f"An unexpected error occurred: {general_exception}")
+
+    # ログを表示
+    handle_log(logger, "completion: maintain_ita_partition", logging.INFO)
+    return
+
+
+if __name__ == '__main__':
+    main()
+
+# %%
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、時価情報の応答のジャーナルをita_tableに再投入（リプレイ）するバッチプロセスを定義しています。
+
+ファイル内の主な処理ステップ:
+1. ログの設定: ログファイルへの情報の記録を行います。
+2. データベース接続情報の取得: 環境変数からPostgreSQLデータベースへの接続情報を取得します。
+3. リプレイ: ITA_JOURNAL_DIR のジャーナルのうち、未適用のレコードをCOPYで一括してita_tableに書き込みます。
+
+環境変数:
+- ITA_JOURNAL_DIR: ジャーナルのディレクトリ（既定は /src/journal、.gitignore で除外しています）
+- ITA_REPLAY_SINCE / ITA_REPLAY_UNTIL: p_rv_dateの範囲（例: 2024-01-05 09:00:00、省略可能）
+  範囲を指定した場合は、チェックポイントを進めずにその範囲だけを書き込みます。
+- ITA_REPLAY_CHUNK_ROWS: 1トランザクションで書き込む行数の目安
+- ITA_REPLAY_INCLUDE_APPLIED: 1 を指定すると、適用済みフラグの立っているレコードも書き込みます
+  （データベースを復元した後の再投入など。ITA_REPLAY_SINCE / ITA_REPLAY_UNTIL と併せて指定してください）。
+- ITA_JOURNAL_RETENTION_SECONDS: リプレイの後、全レコードが適用済みでこの秒数を過ぎたセグメントを削除します
+  （既定は1日、負の値を指定すると削除しません）。
+
+注意事項:
+- データベースの障害やプロセスの再起動の後に実行してください。適用済みフラグの立っているレコードは除外され、
+  書き込んだレコードには適用済みフラグを立てます。
+- 予期せぬエラーが発生した場合、適切なログが記録されます。
+"""
+
+# %%
+import os
+import datetime
+import logging
+import psycopg2
+from logic.response_journal_logic import (
+    replay_journal, DEFAULT_JOURNAL_DIR, DEFAULT_REPLAY_CHUNK_ROWS, DEFAULT_RETENTION_SECONDS
+)
+from log.logging_config import configure_logging
+from utilities.utility import handle_log
+
+
+def _parse_datetime_env(name):
+    """
+    環境変数の日時（例: 2024-01-05 09:00:00）をdatetimeに変換する関数
+
+    Args:
+        name (str): 環境変数名
+
+    Returns:
+        datetime.datetime: 変換した日時（未設定の場合はNone）
+    """
+    value = os.environ.get(name)
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+def main():
+    """
+    メインの処理を実行する関数
+
+    Returns:
+        None
+    """
+    # ログ設定
+    log_filename = "/src/log/replay_ita_journal.log"
+    logger = configure_logging(log_filename)
+
+    # 開始のログを出力
+    handle_log(logger, f"start: {__name__}", logging.INFO)
+
+    try:
+        # PostgreSQLの接続情報を環境変数から取得
+        db_params = {
+            "host": os.environ.get("POSTGRES_HOST"),
+            "database": os.environ.get("POSTGRES_DB"),
+            "user": os.environ.get("POSTGRES_USER"),
+            "password": os.environ.get("POSTGRES_PASSWORD"),
+        }
+
+        retention_seconds = float(os.environ.get("ITA_JOURNAL_RETENTION_SECONDS", DEFAULT_RETENTION_SECONDS))
+        stats = replay_journal(
+            db_params,
+            os.environ.get("ITA_JOURNAL_DIR", DEFAULT_JOURNAL_DIR),
+            since=_parse_datetime_env("ITA_REPLAY_SINCE"),
+            until=_parse_datetime_env("ITA_REPLAY_UNTIL"),
+            chunk_rows=int(os.environ.get("ITA_REPLAY_CHUNK_ROWS", DEFAULT_REPLAY_CHUNK_ROWS)),
+            logger=logger,
+            include_applied=os.environ.get("ITA_REPLAY_INCLUDE_APPLIED", "0") == "1",
+            retention_seconds=retention_seconds if retention_seconds >= 0 else None,
+        )
+        handle_log(logger, f"replay stats: {stats}", logging.INFO)
+    except psycopg2.DatabaseError as db_error:
+        # データベース関連のエラーが発生した場合
+        handle_log(logger, f"An error occurred in the database: {db_error}")
+    except Exception as general_exception:
+        # 予期しないその他のエラーが発生した場合
+        handle_log(logger, f"An unexpected error occurred: {general_exception}")
+
+    # ログを表示
+    handle_log(logger, "completion: replay_ita_journal", logging.INFO)
+    return
+
+
+if __name__ == '__main__':
+    main()
+
+# %%
@@ -14,9 +14,13 @@ JPX（日本取引所グループ）関連のデータを取得し、処理し
 2. ログの設定や操作を行う関数をインポートします。
 3. メイン関数 `main()` を定義します。この関数が処理の中心です。
 4. ログ設定を行い、処理の開始をログに記録します。
-5. JPXデータの取得と処理を行います。
-6. PostgreSQLの接続情報を環境変数から取得し、データベースに挿入します。
-7. IPOデータを取得してデータベースに挿入します。
+5. PostgreSQLの接続情報を環境変数から取得します。
+6. JPXデータとIPOデータを並行してダウンロードします。ETag / Last-Modified による条件付きリクエストと内容のハッシュで、
+   前回から変わっていないものは解析とデータベースへの反映を行いません（MASTER_DOWNLOAD_CACHE_FILE に保存）。
+   環境変数 MASTER_FORCE_REFRESH に 1 を指定すると、キャッシュを使わずにすべて反映します。
+   master_stock_tableが空の場合（データベースのボリュームを作り直した場合等）も、キャッシュを使わずにすべて反映します。
+7. JPXデータはデータベースに一括で反映し（値が変わった行だけ更新）、IPOデータはデータベースにない銘柄だけを挿入します。
+   それぞれの件数と所要時間をログに記録します。
 8. 処理の正常終了をログに記録します。
 9. エラーハンドリングを行い、例外が発生した場合にログにエラー内容を記録します。
 
@@ -29,10 +33,13 @@ import logging
 import requests
 import pandas as pd
 import psycopg2
-from logic.set_code_logic import make_jpx_df, update_jpx_to_db, make_ipo_df, insert_ipo_to_db
+from logic.set_code_logic import refresh_master_data
 from log.logging_config import configure_logging
 from utilities.utility import handle_log
 
+# ダウンロードしたファイルのETag・Last-Modified・ハッシュを保存するファイルの既定値
+DEFAULT_CACHE_PATH = "/src/cache/master_download_cache.json"
+
 
 def main():
     """
@@ -47,9 +54,6 @@ def main():
     handle_log(logger, f"start: {__name__}", logging.INFO)
 
     try:
-        # JPXデータの取得と処理
-        df_jpx = make_jpx_df()
-
         # PostgreSQLの接続情報を環境変数から取得
         db_params = {
             "host": os.environ.get("POSTGRES_HOST"),
@@ -58,13 +62,13 @@ def main():
             "password": os.environ.get("POSTGRES_PASSWORD"),
         }
 
-        # データをデータベースに挿入
-        update_jpx_to_db(db_params, df_jpx)
-
-        # IPOデータを取得してデータベースに挿入
-        df_ipo = make_ipo_df()
-
-        insert_ipo_to_db(db_params, df_ipo)
+        # JPXデータとIPOデータを並行してダウンロードし、前回から変わっているものだけをデータベースに反映
+        stats = refresh_master_data(
+            db_params,
+            cache_path=os.environ.get("MASTER_DOWNLOAD_CACHE_FILE", DEFAULT_CACHE_PATH) or None,
+            force=os.environ.get("MASTER_FORCE_REFRESH", "0") == "1",
+        )
+        handle_log(logger, f"master refresh: {stats}", logging.INFO)
 
         # 正常終了ログを出力
         handle_log(logger, "completion: All processes have terminated successfully.", logging.INFO)
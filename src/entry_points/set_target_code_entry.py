@@ -84,7 +84,8 @@ def main():
         # code_list = get_target_code_list(db_params, os.environ.get("TACHIBANA_USERID"))
 
         api_id_value = os.environ.get('TACHIBANA_USERID')
-        update_target_codes(db_params, CODE_LIST, api_id_value)
+        updated = update_target_codes(db_params, CODE_LIST, api_id_value)
+        handle_log(logger, f"api_id updated: {updated}/{len(CODE_LIST)} codes", logging.INFO)
     except psycopg2.DatabaseError as db_error:
         # データベース関連のエラーが発生した場合
         handle_log(logger, f"An error occurred in the database: {db_error}")
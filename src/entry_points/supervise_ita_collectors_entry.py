@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、master_stock_tableのapi_id毎に株価データの取得プロセスを起動し、監視するプロセスを定義しています。
+
+ファイル内の主な処理ステップ:
+1. ログの設定: ログファイルへの情報の記録を行います。
+2. データベース接続情報の取得: 環境変数からPostgreSQLデータベースへの接続情報を取得します。
+3. api_idの取得: master_stock_tableに設定されているapi_idを重複なく取得します。
+4. 取得プロセスの起動と監視: api_id毎に、その口座の認証情報・セッション・銘柄で insert_ita_data_entry を
+   別プロセスとして起動します（logic.collector_supervisor_logic）。大引け（utilities.trading_calendar）より前に
+   終了したプロセスは再起動し、大引け以降は各プロセスが最後の取得を終えて終了するのを待ちます。
+   ITA_SUPERVISOR_HEARTBEAT_TIMEOUT 秒（既定は180秒）以上処理が進んでいないプロセスは、終了していなくても
+   強制終了して再起動します（0以下を指定すると確認しません）。
+5. ITA_SUPERVISOR_REPORT_INTERVAL 秒毎に、口座毎と合計の書き込み行数・行数/秒等をログに出力します。
+   ITA_METRICS_PORT を指定すると、口座毎の値をPrometheusのテキスト形式で公開します。
+
+注意事項:
+- 口座の認証情報は環境変数 TACHIBANA_PASSWORD_<API_ID> / TACHIBANA_PASSWORD2_<API_ID> で指定します。
+- 各プロセスのログ・セッション・メトリクスのファイルは ITA_SUPERVISOR_DIR に口座毎に作成されます。
+- 取得方法の設定（ITA_COLLECTOR_MODE 等）はすべての取得プロセスに共通で引き継がれます。
+"""
+
+# %%
+import os
+import time
+import signal
+import sys
+import logging
+import psycopg2
+from logic.insert_ita_logic import get_api_id_list
+from logic.collector_supervisor_logic import (
+    CollectorSupervisor, DEFAULT_RUN_DIR, DEFAULT_REPORT_INTERVAL, DEFAULT_MAX_RESTARTS, DEFAULT_HEARTBEAT_TIMEOUT
+)
+from log.logging_config import configure_logging
+from utilities.metrics import start_metrics_server
+from utilities.trading_calendar import get_trading_calendar
+from utilities.utility import handle_log, is_today_holiday
+from utilities.custom_exceptions import MissingAPIIdError
+
+
+def main():
+    """
+    メインの処理を実行する関数
+
+    Returns:
+        None
+    """
+    # ログ設定
+    log_filename = "/src/log/supervise_ita_collectors.log"
+    logger = configure_logging(log_filename)
+
+    # 開始のログを出力
+    handle_log(logger, f"start: {__name__}", logging.INFO)
+
+    # 本日休日なら終了
+    if is_today_holiday() is True:
+        handle_log(logger, "completion: Closed due to a holiday.", logging.INFO)
+        return
+
+    # docker stop 等のSIGTERMでも取得プロセスを停止してから終了する
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    metrics_server = None
+    try:
+        # PostgreSQLの接続情報を環境変数から取得
+        db_params = {
+            "host": os.environ.get("POSTGRES_HOST"),
+            "database": os.environ.get("POSTGRES_DB"),
+            "user": os.environ.get("POSTGRES_USER"),
+            "password": os.environ.get("POSTGRES_PASSWORD"),
+        }
+
+        # 口座毎の値の公開（ITA_METRICS_PORT を指定した場合のみ）
+        if os.environ.get("ITA_METRICS_PORT"):
+            metrics_server = start_metrics_server(int(os.environ["ITA_METRICS_PORT"]))
+
+        # api_idを取得
+        api_ids = get_api_id_list(db_params)
+        handle_log(logger, f"api_ids: {api_ids}", logging.INFO)
+
+        heartbeat_timeout = float(os.environ.get("ITA_SUPERVISOR_HEARTBEAT_TIMEOUT", DEFAULT_HEARTBEAT_TIMEOUT))
+        supervisor = CollectorSupervisor(
+            api_ids,
+            run_dir=os.environ.get("ITA_SUPERVISOR_DIR", DEFAULT_RUN_DIR),
+            report_interval=float(os.environ.get("ITA_SUPERVISOR_REPORT_INTERVAL", DEFAULT_REPORT_INTERVAL)),
+            max_restarts=int(os.environ.get("ITA_SUPERVISOR_MAX_RESTARTS", DEFAULT_MAX_RESTARTS)),
+            heartbeat_timeout=heartbeat_timeout if heartbeat_timeout > 0 else None,
+            logger=logger,
+        )
+        calendar = get_trading_calendar()
+        report = supervisor.run(lambda: calendar.is_before_close(time.time()))
+        handle_log(logger, f"collector report: {report}", logging.INFO)
+    except psycopg2.DatabaseError as db_error:
+        # データベース関連のエラーが発生した場合
+        handle_log(logger, f"An error occurred in the database: {db_error}")
+    except MissingAPIIdError as missing_api_id_error:
+        # API IDが設定されていない場合
+        handle_log(logger, f"Missing API ID: {missing_api_id_error}")
+    except Exception as general_exception:
+        # 予期しないその他のエラーが発生した場合
+        handle_log(logger, f"An unexpected error occurred: {general_exception}")
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+    # ログを表示
+    handle_log(logger, "completion: supervise_ita_collectors", logging.INFO)
+    return
+
+
+if __name__ == '__main__':
+    main()
+
+# %%
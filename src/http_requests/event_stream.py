@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、ログイン時に取得した仮想URL（sUrlEvent）からプッシュ配信される時価情報を受信するモジュールです。
+
+ファイルの概要:
+- make_event_url(event_url, code_list, market_code): 銘柄を購読するEVENT I/FのURLを作成する関数
+- EventMessageParser: 受信したバイト列を少しずつ受け取り、完結したメッセージから順に辞書に変換するクラス
+- stream_events(event_url, code_list, ...): 購読を開始し、受信したメッセージを順に返すジェネレータ
+
+配信の形式:
+- メッセージは改行（\\n）で区切られ、項目は ^A（\\x01）、項目名と値は ^B（\\x02）で区切られます。
+- p_cmd が FD のメッセージは時価情報で、p_<行番号>_<項目名>（例: p_1_DPP、p_3_GAP1）に値が入ります。
+  行番号は購読時の p_gyou_no（code_list の順に1から）に対応し、値が変化した項目だけが配信されます。
+- p_cmd が KP のメッセージは接続維持用、ST は状態の通知です。
+- 購読の開始時（再接続時を含む）には、購読した銘柄のすべての項目が配信されます。
+
+注意事項:
+- 1つの購読で指定できる銘柄数には上限（MAX_CODES_PER_STREAM）があります。超える場合は購読を分けてください。
+- プッシュ配信の接続は長時間続くため、時価情報の要求とは別の接続（専用のHttpTransport）を使用します。
+"""
+import urllib.parse
+from http_requests.http_transport import HttpTransport
+
+# 1つの購読で指定できる銘柄数の上限
+MAX_CODES_PER_STREAM = 120
+# 既定値（秒）: 接続維持のメッセージ（KP）が届かない場合に切断とみなすまでの時間
+DEFAULT_STREAM_READ_TIMEOUT = 30.0
+
+FIELD_SEPARATOR = b"\x01"
+VALUE_SEPARATOR = b"\x02"
+MESSAGE_SEPARATOR = b"\n"
+
+EVENT_COMMANDS = "ST,KP,FD"
+
+
+def make_event_url(event_url, code_list, market_code="00"):
+    """
+    銘柄を購読するEVENT I/FのURLを作成する関数
+
+    Args:
+        event_url (str): ログイン時に取得した仮想URL（sUrlEvent）
+        code_list (list): 購読する銘柄コードのリスト（行番号は1から順に割り当てます）
+        market_code (str): 市場コード（00: 東証）
+
+    Returns:
+        str: 購読のURL
+    """
+    if not 0 < len(code_list) <= MAX_CODES_PER_STREAM:
+        raise ValueError(f"code_list must have 1 to {MAX_CODES_PER_STREAM} codes: {len(code_list)}")
+    params = (
+        ("p_rid", "22"),
+        ("p_board_no", "1000"),
+        ("p_gyou_no", ",".join(str(row) for row in range(1, len(code_list) + 1))),
+        ("p_issue_code", ",".join(map(str, code_list))),
+        ("p_mkt_code", ",".join(market_code for _ in code_list)),
+        ("p_eno", "0"),
+        ("p_evt_cmd", EVENT_COMMANDS),
+    )
+    return f"{event_url}?{urllib.parse.urlencode(params, safe=',')}"
+
+
+def parse_event_message(line, encoding="utf-8"):
+    """
+    1件のメッセージ（改行を除くバイト列）を辞書に変換する関数
+
+    Args:
+        line (bytes): メッセージのバイト列
+        encoding (str): 文字コード
+
+    Returns:
+        dict: 項目名 -> 値（文字列）
+    """
+    message = {}
+    for field in line.split(FIELD_SEPARATOR):
+        key, separator, value = field.partition(VALUE_SEPARATOR)
+        if separator:
+            message[key.decode(encoding, "replace")] = value.decode(encoding, "replace")
+    return message
+
+
+class EventMessageParser:
+    """
+    受信したバイト列を少しずつ受け取り、完結したメッセージから順に辞書に変換するクラス
+
+    Methods:
+        feed(chunk): 受信したバイト列を追加し、完結したメッセージのリストを返すメソッド
+    """
+
+    def __init__(self, encoding="utf-8"):
+        self.encoding = encoding
+        self._buffer = b""
+
+    def feed(self, chunk):
+        """
+        受信したバイト列を追加し、完結したメッセージのリストを返すメソッド
+
+        Args:
+            chunk (bytes): 受信したバイト列
+
+        Returns:
+            list: メッセージの辞書のリスト（途中までのメッセージは次の呼び出しまで保持します）
+        """
+        lines = (self._buffer + chunk).split(MESSAGE_SEPARATOR)
+        self._buffer = lines.pop()
+        return [parse_event_message(line, self.encoding) for line in lines if line.strip(b"\r")]
+
+
+def stream_events(event_url, code_list, market_code="00", read_timeout=DEFAULT_STREAM_READ_TIMEOUT, transport=None):
+    """
+    銘柄の購読を開始し、受信したメッセージを順に返すジェネレータ
+
+    Args:
+        event_url (str): ログイン時に取得した仮想URL（sUrlEvent）
+        code_list (list): 購読する銘柄コードのリスト
+        market_code (str): 市場コード
+        read_timeout (float): この秒数メッセージが届かない場合は切断とみなす
+        transport (HttpTransport): 使用するトランスポート（省略時は専用のものを作成）
+
+    Yields:
+        dict: メッセージの辞書
+
+    Raises:
+        requests.exceptions.RequestException: 通信エラー、HTTPエラー、タイムアウトが発生した場合
+    """
+    own_transport = transport is None
+    if own_transport:
+        transport = HttpTransport(pool_connections=1, pool_maxsize=1, read_timeout=read_timeout)
+    parser = EventMessageParser(transport.encoding)
+    try:
+        url = make_event_url(event_url, code_list, market_code)
+        for chunk in transport.iter_content(url, encode=False, streaming=True):
+            yield from parser.feed(chunk)
+    finally:
+        if own_transport:
+            transport.close()
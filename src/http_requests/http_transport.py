@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、立花証券APIへのHTTP通信を行うトランスポート層を提供するモジュールです。
+
+ファイルの概要:
+- HttpTransport: keep-aliveの接続プールを持つプロセス内HTTPトランスポートクラス
+- get_transport(): プロセス共通のトランスポートを返す関数
+- set_transport(transport): プロセス共通のトランスポートを差し替える関数
+- execute_request(url): URLにリクエストを送り、応答の文字列を返す関数
+- encode_request_url(url) / decode_request_url(url): パラメータ部分をURLエンコード・デコードする関数
+
+注意事項:
+- 従来はリクエスト毎にcurlのサブプロセスを起動し、毎回TCP/TLSのハンドシェイクを行っていました。
+  本モジュールはrequests.Sessionの接続プールを使い回すため、同じホストへの接続とTLSセッションが再利用されます。
+- 環境変数 `ITA_HTTP_TRANSPORT` に `curl` を指定すると、従来のcurlコマンドによる通信に切り替わります。
+- curl -k と同様に、サーバー証明書の検証は行いません。
+"""
+import os
+import threading
+import urllib.parse
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from utilities.utility import execute_curl_command
+
+# 接続プールの既定値
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 16
+# タイムアウトの既定値（秒）: (接続, 読み込み)
+DEFAULT_CONNECT_TIMEOUT = 3.0
+DEFAULT_READ_TIMEOUT = 10.0
+# 応答本文を読み込む際のチャンクサイズ（バイト）
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def encode_request_url(url):
+    """
+    "?"以降のJSON形式のパラメータをURLエンコードしたURLを返す関数
+
+    Args:
+        url (str): make_url_requestで作成したURL
+
+    Returns:
+        str: パラメータ部分をURLエンコードしたURL（エンコード済みの場合はそのまま）
+    """
+    params_start = url.find('?')
+    # request_builder で作成したURLはエンコード済み
+    if params_start < 0 or url.startswith("%7B", params_start + 1):
+        return url
+    base_url = url[:params_start]
+    params = url[params_start + 1:]
+    return f'{base_url}?{urllib.parse.quote(params, safe="")}'
+
+
+def decode_request_url(url):
+    """
+    URLエンコード済みのURLを、make_url_requestで作成した形式（エンコード前）に戻す関数
+
+    Args:
+        url (str): URL
+
+    Returns:
+        str: パラメータ部分をデコードしたURL（エンコードされていない場合はそのまま）
+    """
+    params_start = url.find('?')
+    if params_start < 0 or not url.startswith("%7B", params_start + 1):
+        return url
+    return f'{url[:params_start]}?{urllib.parse.unquote(url[params_start + 1:])}'
+
+
+class HttpTransport:
+    """
+    keep-aliveの接続プールを持つHTTPトランスポートクラス
+
+    Attributes:
+        connect_timeout (float): 接続タイムアウト（秒）
+        read_timeout (float): 読み込みタイムアウト（秒）
+        chunk_size (int): 応答本文を読み込む際のチャンクサイズ
+        encoding (str): 応答本文の文字コード
+
+    Methods:
+        iter_content(url, timeout): 応答本文をチャンク毎に返すジェネレータ
+        get_bytes(url, timeout): 応答本文をバイト列で返すメソッド
+        get_text(url, timeout): 応答本文を文字列で返すメソッド
+        close(): 接続プールを閉じるメソッド
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 chunk_size=DEFAULT_CHUNK_SIZE, encoding="utf-8"):
+        """
+        HTTPトランスポートクラスのコンストラクタ
+
+        Args:
+            pool_connections (int): 接続プールを保持するホスト数
+            pool_maxsize (int): 1ホストあたりに保持する接続数の上限
+            connect_timeout (float): 接続タイムアウト（秒）
+            read_timeout (float): 読み込みタイムアウト（秒）
+            chunk_size (int): 応答本文を読み込む際のチャンクサイズ
+            encoding (str): 応答本文の文字コード
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+
+        # curl -k と同様に証明書の検証を行わないため、警告を抑止
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+        self._session = requests.Session()
+        self._session.verify = False
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def _timeout(self, timeout):
+        """
+        リクエストに渡すタイムアウトを返すメソッド
+
+        Args:
+            timeout (float or tuple): 個別に指定されたタイムアウト（省略時は既定値）
+
+        Returns:
+            tuple: (接続タイムアウト, 読み込みタイムアウト)
+        """
+        if timeout is None:
+            return (self.connect_timeout, self.read_timeout)
+        return timeout
+
+    def iter_content(self, url, timeout=None, encode=True, streaming=False):
+        """
+        応答本文をチャンク毎に返すジェネレータ
+
+        Args:
+            url (str): make_url_requestで作成したURL
+            timeout (float or tuple): タイムアウト（省略可能）
+            encode (bool): Falseの場合はURLをエンコードせずにそのまま送る（通常のクエリ文字列のURL用）
+            streaming (bool): Trueの場合はチャンクサイズに達するまで待たずに、受信した単位で返す（プッシュ配信用）
+
+        Yields:
+            bytes: 応答本文のチャンク
+
+        Raises:
+            requests.exceptions.RequestException: 通信エラーまたはHTTPエラーが発生した場合
+        """
+        request_url = encode_request_url(url) if encode else url
+        with self._session.get(request_url, timeout=self._timeout(timeout), stream=True) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=None if streaming else self.chunk_size):
+                if chunk:
+                    yield chunk
+
+    def get_bytes(self, url, timeout=None):
+        """
+        応答本文をバイト列で返すメソッド
+
+        Args:
+            url (str): make_url_requestで作成したURL
+            timeout (float or tuple): タイムアウト（省略可能）
+
+        Returns:
+            bytes: 応答本文
+        """
+        body = bytearray()
+        for chunk in self.iter_content(url, timeout):
+            body += chunk
+        return bytes(body)
+
+    def get_text(self, url, timeout=None):
+        """
+        応答本文を文字列で返すメソッド
+
+        Args:
+            url (str): make_url_requestで作成したURL
+            timeout (float or tuple): タイムアウト（省略可能）
+
+        Returns:
+            str: 応答本文
+        """
+        return self.get_bytes(url, timeout).decode(self.encoding)
+
+    def close(self):
+        """
+        接続プールを閉じるメソッド
+        """
+        self._session.close()
+
+
+class CurlTransport:
+    """
+    従来のcurlコマンドによるトランスポートクラス（切り戻し用）
+    """
+
+    def get_text(self, url, timeout=None):
+        """
+        curlコマンドを実行し、応答本文を文字列で返すメソッド
+
+        Args:
+            url (str): make_url_requestで作成したURL
+            timeout (float or tuple): 未使用（HttpTransportとの互換のため）
+
+        Returns:
+            str: 応答本文
+        """
+        return execute_curl_command(decode_request_url(url))
+
+    def get_bytes(self, url, timeout=None):
+        """
+        curlコマンドを実行し、応答本文をバイト列で返すメソッド
+
+        Args:
+            url (str): make_url_requestで作成したURL
+            timeout (float or tuple): 未使用（HttpTransportとの互換のため）
+
+        Returns:
+            bytes: 応答本文
+        """
+        return execute_curl_command(decode_request_url(url)).encode("utf-8")
+
+    def close(self):
+        """
+        何もしない（HttpTransportとの互換のため）
+        """
+        return
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def _create_transport_from_env():
+    """
+    環境変数の設定に従ってトランスポートを作成する関数
+
+    Returns:
+        HttpTransport or CurlTransport: 作成したトランスポート
+    """
+    if os.environ.get("ITA_HTTP_TRANSPORT", "pooled") == "curl":
+        return CurlTransport()
+    return HttpTransport(
+        pool_maxsize=int(os.environ.get("ITA_HTTP_POOL_MAXSIZE", DEFAULT_POOL_MAXSIZE)),
+        connect_timeout=float(os.environ.get("ITA_HTTP_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)),
+        read_timeout=float(os.environ.get("ITA_HTTP_READ_TIMEOUT", DEFAULT_READ_TIMEOUT)),
+    )
+
+
+def get_transport():
+    """
+    プロセス共通のトランスポートを返す関数（初回呼び出し時に作成）
+
+    Returns:
+        HttpTransport or CurlTransport: プロセス共通のトランスポート
+    """
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = _create_transport_from_env()
+    return _transport
+
+
+def set_transport(transport):
+    """
+    プロセス共通のトランスポートを差し替える関数
+
+    Args:
+        transport (object): get_text(url, timeout)を持つトランスポート
+
+    Returns:
+        object: 差し替え前のトランスポート
+    """
+    global _transport
+    with _transport_lock:
+        previous = _transport
+        _transport = transport
+    return previous
+
+
+def execute_request(url, timeout=None):
+    """
+    プロセス共通のトランスポートでリクエストを送り、応答の文字列を返す関数
+
+    Args:
+        url (str): make_url_requestで作成したURL
+        timeout (float or tuple): タイムアウト（省略可能）
+
+    Returns:
+        str: 応答本文
+    """
+    return get_transport().get_text(url, timeout)
@@ -14,9 +14,23 @@
 - p_sd_date(int_systime): "p_sd_date"の書式の文字列としてシステム時刻を返す関数
 - make_url_request(auth_flg, url_target, tachibana_account, req_item_list): requestの文字列を作成して返す関数
 - login(tachibana_account): ログインを行い、応答データを返す関数
+- set_response_hook(hook): 時価情報の応答を解析前に受け取る関数（ジャーナル等）を設定する関数
+- pop_journal_position(): 呼び出し元のスレッドで最後に受け取った応答のジャーナル上の位置を取り出す関数
+- set_request_observer(observer): 時価情報のリクエスト毎に所要時間とエラーの有無を受け取る関数を設定する関数
+- request_market_price(tachibana_account, code_list): 時価情報を要求し、応答の文字列を返す関数
 - get_stock_data(tachibana_account, code_list): リアルタイムの株価データを取得する関数
+- decode_stock_data(response): 時価情報の応答の文字列を株価データの辞書のリストに変換する関数
+- get_stock_data_columnar(tachibana_account, code_list): リアルタイムの株価データを列指向のバッチで取得する関数
+- create_account_from_env(): 環境変数から立花証券口座クラスのインスタンスを作成する関数（ログインはしません）
+- login_account(tachibana_account): ログインを行い、応答の仮想URL等をインスタンスに設定する関数
 - login_and_get_account_instance(): ログインを行い、立花証券口座クラスのインスタンスを返す関数
 
+通信は http_requests.http_transport の接続プール付きトランスポートを経由して行います。
+インスタンスに session（http_requests.session_manager）が設定されている場合、時価情報の要求で
+セッション切れの応答を受け取ると1回だけ再ログインしてから要求し直します。
+時価情報のリクエストURLは、固定部分をエンコード済みのテンプレート（http_requests.request_builder）から作成します。
+request通番は ClassTachibanaAccount.next_p_no() で採番するため、複数のスレッドから呼び出しても重複しません。
+
 ファイルの使い方:
 1. 環境変数に立花証券のユーザーID(`TACHIBANA_USERID`)とパスワード(`TACHIBANA_PASSWORD`, `TACHIBANA_PASSWORD2`)を設定します。
 2. 立花証券口座クラスのインスタンスを作成します(`login_and_get_account_instance()`を使用)。
@@ -28,7 +42,23 @@ import datetime
 import json
 import pytz
 import os
-from utilities.utility import execute_curl_command, convert_empty_string_to_none
+import re
+import threading
+import time
+from http_requests.http_transport import execute_request
+from http_requests.request_builder import REQUEST_FIELD, RequestTemplate
+from http_requests.market_price_decoder import TARGET_COLUMN, parse_p_rv_date, decode_market_price
+from utilities.metrics import stage_timer
+from utilities.utility import convert_empty_string_to_none
+
+# 時価情報の応答を解析前に受け取る関数（set_response_hook で設定）
+_response_hook = None
+# スレッド毎の、最後に受け取った応答のジャーナル上の位置（_response_hook の戻り値）
+_response_context = threading.local()
+# 時価情報のリクエスト毎に (所要時間, エラーの有無) を受け取る関数（set_request_observer で設定）
+_request_observer = None
+
+_P_ERRNO_PATTERN = re.compile(r'"p_errno"\s*:\s*"?(-?\d+)')
 
 
 class ClassTachibanaAccount:
@@ -48,6 +78,8 @@ class ClassTachibanaAccount:
     Methods:
         set_property(request_url, event_url, tax_category):
             プロパティを設定するメソッド
+        next_p_no(): request通番をカウントアップして返すメソッド（スレッドセーフ）
+        reset_p_no(p_no): request通番を設定するメソッド
     """
 
     def __init__(self, json_fmt, url_base, user_id, password, password_sec):
@@ -62,6 +94,9 @@ class ClassTachibanaAccount:
             password_sec (str): 第2パスワード
         """
         self.int_p_no = 0  # request通番
+        self._p_no_lock = threading.Lock()
+        self._market_price_template = None
+        self.session = None  # セッション管理（http_requests.session_manager、省略可能）
         self.json_fmt = json_fmt
         self.url_base = url_base
         self.user_id = user_id
@@ -88,6 +123,49 @@ class ClassTachibanaAccount:
         self.price_url = price_url
         self.tax_category = tax_category
 
+    def next_p_no(self):
+        """
+        request通番をカウントアップして返すメソッド（複数のスレッドから呼び出しても重複しません）
+
+        Returns:
+            int: request通番
+        """
+        with self._p_no_lock:
+            self.int_p_no += 1
+            p_no = self.int_p_no
+        # 保存済みの通番の予約を確認する（再起動時の通番の重複を防ぐ）。ファイルへの保存はロックの外で行う
+        if self.session is not None:
+            self.session.ensure_p_no_reserved(p_no)
+        return p_no
+
+    def reset_p_no(self, p_no):
+        """
+        request通番を指定した値に設定するメソッド（保存済みのセッションから再開する場合に使用）
+
+        Args:
+            p_no (int): 次に採番する通番の1つ前の値
+        """
+        with self._p_no_lock:
+            self.int_p_no = p_no
+
+    def market_price_template(self):
+        """
+        時価情報（CLMMfdsGetMarketPrice）のリクエストのテンプレートを返すメソッド（price_urlが変わった場合は作り直します）
+
+        Returns:
+            RequestTemplate: リクエストのテンプレート
+        """
+        template = self._market_price_template
+        if template is None or template.url_target != self.price_url:
+            template = RequestTemplate(self.price_url, [
+                ("sCLMID", "CLMMfdsGetMarketPrice"),
+                ("sTargetIssueCode", REQUEST_FIELD),
+                ("sTargetColumn", TARGET_COLUMN),
+                ("sJsonOfmt", self.json_fmt),
+            ])
+            self._market_price_template = template
+        return template
+
 
 def check_json_dquat(str_value):
     """
@@ -146,7 +224,7 @@ def make_url_request(auth_flg, url_target, tachibana_account, req_item_list):
     Returns:
         str: 作成されたrequestの文字列
     """
-    tachibana_account.int_p_no += 1  # request通番をカウントアップ
+    int_p_no = tachibana_account.next_p_no()  # request通番をカウントアップ
     str_p_sd_date = p_sd_date(
         datetime.datetime.now(pytz.timezone("Asia/Tokyo"))
     )  # システム時刻を所定の書式で取得
@@ -157,7 +235,7 @@ def make_url_request(auth_flg, url_target, tachibana_account, req_item_list):
     work_url = (
         work_url
         + '"p_no":'
-        + check_json_dquat(str(tachibana_account.int_p_no))
+        + check_json_dquat(str(int_p_no))
         + ","
     )
     work_url = work_url + '"p_sd_date":' + check_json_dquat(str_p_sd_date) + ","
@@ -190,7 +268,7 @@ def login(tachibana_account):
         work_url = make_url_request(
             True, tachibana_account.url_base, tachibana_account, req_item_list
         )
-        response = execute_curl_command(work_url)
+        response = execute_request(work_url)
         json_req = json.loads(response)
     except Exception as error:
         raise error
@@ -198,6 +276,120 @@ def login(tachibana_account):
     return json_req
 
 
+def set_response_hook(hook):
+    """
+    時価情報の応答を解析前に受け取る関数を設定する関数
+
+    Args:
+    hook (callable): 応答の文字列を受け取り、ジャーナル上の位置（追記しなかった場合はNone）を返す関数
+        （Noneの場合は解除）
+    """
+    global _response_hook
+    _response_hook = hook
+
+
+def pop_journal_position():
+    """
+    呼び出し元のスレッドで最後に受け取った応答のジャーナル上の位置を取り出す関数（取り出した位置は消去します）
+
+    Returns:
+        tuple: (セグメントのファイル名, オフセット)（ジャーナルに追記していない場合はNone）
+    """
+    position = getattr(_response_context, "journal_position", None)
+    _response_context.journal_position = None
+    return position
+
+
+def set_request_observer(observer):
+    """
+    時価情報のリクエスト毎に所要時間とエラーの有無を受け取る関数を設定する関数
+
+    Args:
+    observer (callable): (所要時間（秒）, エラーの有無) を受け取る関数（Noneの場合は解除）
+    """
+    global _request_observer
+    _request_observer = observer
+
+
+def response_errno(response):
+    """
+    応答のp_errnoを返す関数（応答全体は解析しません）
+
+    Args:
+    response (str): 応答の文字列
+
+    Returns:
+        int: p_errno（含まれていない場合はNone）
+    """
+    match = _P_ERRNO_PATTERN.search(response)
+    return None if match is None else int(match.group(1))
+
+
+def _is_error_response(response):
+    errno = response_errno(response)
+    return errno is not None and errno != 0
+
+
+def _send_market_price(tachibana_account, code_list):
+    """
+    時価情報（CLMMfdsGetMarketPrice）を1回要求し、応答の文字列を返す関数
+
+    Args:
+    tachibana_account (TachibanaAccount): 立花証券口座属性クラスのインスタンス
+    code_list (list): 株価データを取得する銘柄コードのリスト
+
+    Returns:
+        str: 応答の文字列
+    """
+    with stage_timer("build_request"):
+        # 固定部分はエンコード済みのテンプレートを使い回す
+        work_url = tachibana_account.market_price_template().build(
+            tachibana_account.next_p_no(), sTargetIssueCode=",".join(map(str, code_list))
+        )
+    observer = _request_observer
+    start_time = time.perf_counter()
+    try:
+        with stage_timer("http"):
+            response = execute_request(work_url)
+    except Exception:
+        # HTTPエラーやタイムアウト
+        if observer is not None:
+            observer(time.perf_counter() - start_time, True)
+        raise
+    if observer is not None:
+        observer(time.perf_counter() - start_time, _is_error_response(response))
+    return response
+
+
+def request_market_price(tachibana_account, code_list):
+    """
+    時価情報（CLMMfdsGetMarketPrice）を要求し、応答の文字列をそのまま返す関数
+
+    Args:
+    tachibana_account (TachibanaAccount): 立花証券口座属性クラスのインスタンス
+    code_list (list): 株価データを取得する銘柄コードのリスト
+
+    Returns:
+        str: 応答の文字列
+    """
+    session = tachibana_account.session
+    if session is None:
+        response = _send_market_price(tachibana_account, code_list)
+    else:
+        # 再ログイン中は完了まで待つ
+        generation = session.wait_ready()
+        response = _send_market_price(tachibana_account, code_list)
+        if session.is_session_invalid(response):
+            # セッション切れの場合は再ログインしてから1回だけ要求し直す（同時に検知した要求は再ログインの完了を待つ）
+            session.relogin(generation)
+            response = _send_market_price(tachibana_account, code_list)
+
+    # 解析する前に応答をそのまま渡す（ジャーナルへの追記など）
+    hook = _response_hook
+    _response_context.journal_position = hook(response) if hook is not None else None
+    return response
+
+
 def get_stock_data(tachibana_account, code_list):
     """
     リアルタイムの株価データを取得する関数
@@ -210,45 +402,9 @@ def get_stock_data(tachibana_account, code_list):
         json: 取得した株価データの辞書型
     """
     try:
-        req_item_list = [
-            {"key": '"sCLMID"', "value": '"CLMMfdsGetMarketPrice"'},
-            {"key": '"sTargetIssueCode"', "value": ",".join(map(str, code_list))},
-            {
-                "key": '"sTargetColumn"',
-                "value": (
-                    # 現値,出来高,前日終値,始値,高値,安値,VWAP
-                    "pDPP,pDV,pPRP,pDOP,pDHP,pDLP,pVWAP,"
-                    # 売気配値,売気配値種,買気配値,買気配値種
-                    "pQAP,pQAS,pQBP,pQBS,"
-                    # 成売,成買,OVER,UNDER"
-                    "pAAV,pABV,pQOV,pQUV,"
-                    # 売値10,売値9,売値8,売値7,売値6,売値5,売値4,売値3,売値2,売値1
-                    "pGAP10,pGAP9,pGAP8,pGAP7,pGAP6,pGAP5,pGAP4,pGAP3,pGAP2,pGAP1,"
-                    # 買値10,買値9,買値8,買値7,買値6,買値5,買値4,買値3,買値2,買値1
-                    "pGBP10,pGBP9,pGBP8,pGBP7,pGBP6,pGBP5,pGBP4,pGBP3,pGBP2,pGBP1,"
-                    # 売量10,売量9,売量8,売量7,売量6,売量5,売量4,売量3,売量2,売量1
-                    "pGAV10,pGAV9,pGAV8,pGAV7,pGAV6,pGAV5,pGAV4,pGAV3,pGAV2,pGAV1,"
-                    # 買量10,買量9,買量8,買量7,買量6,買量5,買量4,買量3,買量2,買量1
-                    "pGBV10,pGBV9,pGBV8,pGBV7,pGBV6,pGBV5,pGBV4,pGBV3,pGBV2,pGBV1"
-                ),
-            },
-            {"key": '"sJsonOfmt"', "value": tachibana_account.json_fmt},
-        ]
-
-        work_url = make_url_request(
-            False, tachibana_account.price_url, tachibana_account, req_item_list
-        )
-        response = execute_curl_command(work_url)
-        response_json = json.loads(response.encode('utf-8').decode('unicode-escape'))
-
-        # データを整形
-        return_data = []
-        for item in response_json["aCLMMfdsMarketPrice"]:
-            item = convert_empty_string_to_none(item)
-            datetime_str = response_json["p_rv_date"].replace(' ', '').replace('.', '-', 1).replace('.', '-', 1)
-            datetime_obj = datetime.datetime.strptime(datetime_str, '%Y-%m-%d-%H:%M:%S.%f')
-            item.update({'created_at': datetime_obj})
-            return_data.append(item)
+        response = request_market_price(tachibana_account, code_list)
+        with stage_timer("decode"):
+            return_data = decode_stock_data(response)
     except Exception as error:
         print(error)
         raise error
@@ -259,36 +415,102 @@ def get_stock_data(tachibana_account, code_list):
     return return_data
 
 
+def decode_stock_data(response):
+    """
+    時価情報の応答の文字列を、銘柄毎の株価データの辞書のリストに変換する関数
+
+    Args:
+    response (str): 応答の文字列
+
+    Returns:
+        list: 株価データの辞書のリスト（空文字列はNone、created_atにp_rv_dateを設定）
+    """
+    response_json = json.loads(response.encode('utf-8').decode('unicode-escape'))
+
+    # p_rv_dateは全銘柄で共通のため1回だけ解析
+    datetime_obj = parse_p_rv_date(response_json["p_rv_date"])
+
+    # データを整形
+    return_data = []
+    for item in response_json["aCLMMfdsMarketPrice"]:
+        item = convert_empty_string_to_none(item)
+        item['created_at'] = datetime_obj
+        return_data.append(item)
+    return return_data
+
+
+def get_stock_data_columnar(tachibana_account, code_list):
+    """
+    リアルタイムの株価データを取得し、列指向のバッチとして返す関数
+
+    Args:
+    tachibana_account (TachibanaAccount): 立花証券口座属性クラスのインスタンス
+    code_list (list): 株価データを取得する銘柄コードのリスト
+
+    Returns:
+        ItaColumnarBatch: 項目毎の型付き配列とNULLマスクを持つバッチ
+    """
+    # 例外はそのまま呼び出し元に送出し、呼び出し元でログに記録する
+    response = request_market_price(tachibana_account, code_list)
+    with stage_timer("decode"):
+        batch = decode_market_price(response)
+
+    if len(batch) == 0:
+        raise Exception("the response ita rows is empty")
+
+    return batch
+
+
+def create_account_from_env():
+    """
+    環境変数から立花証券口座クラスのインスタンスを作成する関数（ログインはしません）
+
+    Returns:
+        ClassTachibanaAccount: 立花証券口座クラスのインスタンス
+    """
+    # ローカルの疑似サーバー（dev_servers.fake_tachibana_server）を使う場合は TACHIBANA_URL_BASE で指定
+    URL_BASE = os.environ.get("TACHIBANA_URL_BASE", "https://demo-kabuka.e-shiten.jp/e_api_v4r3/")
+    MY_USERID = os.environ.get('TACHIBANA_USERID')
+    MY_PASSWORD = os.environ.get('TACHIBANA_PASSWORD')
+    MY_PASSWORD2 = os.environ.get('TACHIBANA_PASSWORD2')
+
+    return ClassTachibanaAccount(
+        json_fmt='"4"',
+        url_base=URL_BASE,
+        user_id=MY_USERID,
+        password=MY_PASSWORD,
+        password_sec=MY_PASSWORD2,
+    )  # 立花証券口座インスタンス
+
+
+def login_account(tachibana_account):
+    """
+    ログインを行い、応答の仮想URL等を立花証券口座クラスのインスタンスに設定する関数
+
+    Args:
+        tachibana_account (ClassTachibanaAccount): 立花証券口座クラスのインスタンス
+    """
+    json_response = login(tachibana_account)  # ログイン処理を実施
+
+    # ログインエラーの場合
+    if not (int(json_response.get("p_errno")) == 0 and len(json_response.get("sUrlEvent")) > 0):
+        raise Exception("login error")
+
+    # 取得した値を口座属性クラスに設定
+    tachibana_account.set_property(
+        request_url=json_response.get("sUrlRequest"),
+        event_url=json_response.get("sUrlEvent"),
+        tax_category=json_response.get("sZyoutoekiKazeiC"),
+        master_url=json_response.get("sUrlMaster"),
+        price_url=json_response.get("sUrlPrice"),
+    )
+    print("tachibana_login_sucsess")
+
+
 def login_and_get_account_instance():
     try:
-        URL_BASE = "https://demo-kabuka.e-shiten.jp/e_api_v4r3/"
-        MY_USERID = os.environ.get('TACHIBANA_USERID')
-        MY_PASSWORD = os.environ.get('TACHIBANA_PASSWORD')
-        MY_PASSWORD2 = os.environ.get('TACHIBANA_PASSWORD2')
-
-        tachibana_account = ClassTachibanaAccount(
-            json_fmt='"4"',
-            url_base=URL_BASE,
-            user_id=MY_USERID,
-            password=MY_PASSWORD,
-            password_sec=MY_PASSWORD2,
-        )  # 立花証券口座インスタンス
-
-        json_response = login(tachibana_account)  # ログイン処理を実施
-
-        # ログインエラーの場合
-        if not (int(json_response.get("p_errno")) == 0 and len(json_response.get("sUrlEvent")) > 0):
-            raise Exception("login error")
-
-        # 取得した値を口座属性クラスに設定
-        tachibana_account.set_property(
-            request_url=json_response.get("sUrlRequest"),
-            event_url=json_response.get("sUrlEvent"),
-            tax_category=json_response.get("sZyoutoekiKazeiC"),
-            master_url=json_response.get("sUrlMaster"),
-            price_url=json_response.get("sUrlPrice"),
-        )
-        print("tachibana_login_sucsess")
+        tachibana_account = create_account_from_env()
+        login_account(tachibana_account)
 
     except Exception as error:
         raise error
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、IPO一覧のHTMLから銘柄の表だけを1回の走査で取り出すパーサーを提供するモジュールです。
+
+ファイルの概要:
+- IPO_COLUMNS: 表の見出しと列名の対応
+- IpoTableParser: HTMLParserを使い、DOMを作らずに表の行を取り出すクラス
+- extract_ipo_rows(html_content): IPO一覧のHTMLから、東証の上場中止でない銘柄の行を取り出す関数
+
+注意事項:
+- 1行目（見出し）に ｺｰﾄﾞ / 銘柄 / 市場 がすべて含まれる最初の表を対象にします。
+  対象の表を読み終えた時点で残りのHTMLは解析しません。
+- セルの文字列は pd.read_html と同じ規則で空白を詰めます（<br>は改行、改行と2文字以上の空白は1文字の空白）。
+  colspan / rowspan は pd.read_html と同じく、後続のセルに同じ文字列を複製します。
+- 市場が「東」で始まらない行と、銘柄に「中止」を含む行は解析中に捨てます。
+- 行の番号は、見出しを除いた表の中での位置（pd.read_html で作成したDataFrameのindexと同じ値）です。
+  空の行も pd.read_html と同じく1行として数えます。
+- 表の中の表（入れ子の表）はセルの文字列として扱い、行としては扱いません。
+"""
+import re
+from html.parser import HTMLParser
+
+# 表の見出し -> 列名
+IPO_COLUMNS = {"ｺｰﾄﾞ": "code", "銘柄": "name", "市場": "market_product_category"}
+
+# pd.read_html と同じ空白の詰め方
+_RE_WHITESPACE = re.compile(r"[\r\n]+|\s{2,}")
+# pd.read_html で数値の列になるコード
+_RE_INTEGER = re.compile(r"[+-]?\d+")
+
+# 1回に解析するHTMLの文字数（対象の表を読み終えたら残りは解析しない）
+DEFAULT_CHUNK_SIZE = 16 * 1024
+
+
+class IpoTableParser(HTMLParser):
+    """
+    IPO一覧のHTMLから、見出しに IPO_COLUMNS を含む最初の表の行を取り出すクラス
+
+    Attributes:
+        rows (list): (行の番号, ｺｰﾄﾞ, 銘柄, 市場) のタプルのリスト（市場は「東」を除いた文字列）
+        found (bool): 対象の表の見出しを読み込んだかどうか
+        done (bool): 対象の表を読み終えたかどうか
+        code_dtype (str): 捨てた行も含めた表のコードを pd.read_html で読み込んだ場合の型
+            （すべて整数の場合は"int64"、空のコードがある場合は"float64"、整数でないコードがある場合はNone）
+
+    Methods:
+        feed(data): HTMLの一部を解析するメソッド（HTMLParserのメソッド）
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self.done = False
+        self.code_dtype = "int64"
+        # 開いている表の深さと、対象の表の深さ（対象の表がまだ見つかっていない場合はNone）
+        self._table_depth = 0
+        self._target_depth = None
+        # 見出しを読み終えた表の深さ（対象でない表は、閉じるまで読み飛ばす）
+        self._skip_depth = None
+        # 見出しの列の位置: 列名 -> 位置
+        self._positions = None
+        # 読み込み中の行のセル、セルの文字列、セルの colspan / rowspan
+        self._cells = None
+        self._text = None
+        self._span = (1, 1)
+        # rowspanで次の行に持ち越すセル: (位置, 文字列, 残りの行数)
+        self._remainder = []
+        self._row_number = 0
+
+    @property
+    def found(self):
+        return self._positions is not None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == "table":
+            self._table_depth += 1
+            if self._text is not None:
+                # 入れ子の表はセルの文字列として扱う
+                return
+            if self._target_depth is None and self._skip_depth is None:
+                self._target_depth = self._table_depth
+            return
+        if self._target_depth != self._table_depth:
+            return
+        if tag == "tr":
+            self._end_row()
+            self._cells = []
+        elif tag in ("td", "th"):
+            self._end_cell()
+            if self._cells is None:
+                self._cells = []
+            attributes = dict(attrs)
+            self._span = (_span(attributes.get("colspan")), _span(attributes.get("rowspan")))
+            self._text = []
+        elif tag == "br" and self._text is not None:
+            self._text.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag == "table":
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        if tag == "table":
+            if self._table_depth == self._target_depth:
+                self._end_row()
+                self._end_rowspan_rows()
+                if self._positions is not None:
+                    self.done = True
+                else:
+                    # 見出しのない（空の）表の場合は、次の表を対象にする
+                    self._target_depth = None
+                    self._remainder = []
+            if self._table_depth == self._skip_depth:
+                self._skip_depth = None
+            self._table_depth = max(self._table_depth - 1, 0)
+            return
+        if self._target_depth != self._table_depth:
+            return
+        if tag in ("td", "th"):
+            self._end_cell()
+        elif tag == "tr":
+            self._end_row()
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+    def _end_cell(self):
+        """
+        読み込み中のセルを閉じ、colspanの数だけ行に追加するメソッド
+        """
+        if self._text is None:
+            return
+        text = _RE_WHITESPACE.sub(" ", "".join(self._text).strip())
+        colspan, rowspan = self._span
+        self._cells.append((text, colspan, rowspan))
+        self._text = None
+
+    def _end_row(self):
+        """
+        読み込み中の行を閉じ、rowspanで持ち越したセルと合わせて1行にするメソッド
+        """
+        self._end_cell()
+        if self._cells is None:
+            return
+        cells, self._cells = self._cells, None
+        texts = []
+        remainder = self._remainder
+        next_remainder = []
+        for text, colspan, rowspan in cells:
+            # 前の行から持ち越したセルのうち、このセルより前に来るもの
+            while remainder and remainder[0][0] <= len(texts):
+                previous_position, previous_text, previous_rowspan = remainder.pop(0)
+                if previous_rowspan > 1:
+                    next_remainder.append((previous_position, previous_text, previous_rowspan - 1))
+                texts.append(previous_text)
+            for _ in range(colspan):
+                if rowspan > 1:
+                    next_remainder.append((len(texts), text, rowspan - 1))
+                texts.append(text)
+        for previous_position, previous_text, previous_rowspan in remainder:
+            if previous_rowspan > 1:
+                next_remainder.append((previous_position, previous_text, previous_rowspan - 1))
+            texts.append(previous_text)
+        self._remainder = next_remainder
+        self._add_row(texts)
+
+    def _end_rowspan_rows(self):
+        """
+        表の最後の行を越えるrowspanのセルを、行として追加するメソッド
+        """
+        while self._remainder:
+            remainder, self._remainder = self._remainder, []
+            texts = []
+            for position, text, rowspan in remainder:
+                if rowspan > 1:
+                    self._remainder.append((position, text, rowspan - 1))
+                texts.append(text)
+            self._add_row(texts)
+
+    def _add_row(self, texts):
+        """
+        1行分の文字列を見出しまたはデータの行として処理するメソッド
+
+        Args:
+            texts (list): 行のセルの文字列のリスト
+        """
+        if self._positions is None:
+            # 見出しの前の空の行は読み飛ばす
+            if not texts or (len(texts) == 1 and not texts[0].strip()):
+                return
+            positions = {}
+            for position, text in enumerate(texts):
+                if text in IPO_COLUMNS:
+                    positions.setdefault(IPO_COLUMNS[text], position)
+            if len(positions) == len(IPO_COLUMNS):
+                self._positions = positions
+            else:
+                # 対象の表ではないため、閉じるまで読み飛ばす
+                self._skip_depth = self._target_depth
+                self._target_depth = None
+                self._remainder = []
+            return
+
+        row_number = self._row_number
+        self._row_number += 1
+        code, name, market = (
+            texts[self._positions[column]] if self._positions[column] < len(texts) else ""
+            for column in IPO_COLUMNS.values()
+        )
+        # 空の行も pd.read_html と同じくデータの行（すべて欠損値）として数える
+        if self.code_dtype is not None:
+            if not code:
+                self.code_dtype = "float64"
+            elif _RE_INTEGER.fullmatch(code) is None:
+                self.code_dtype = None
+        if not market.startswith("東") or "中止" in name:
+            return
+        self.rows.append((row_number, code or None, name or None, market.replace("東", "")))
+
+
+def _span(value):
+    """
+    colspan / rowspan の属性の値を整数に変換する関数
+
+    Args:
+        value (str): 属性の値（属性がない場合はNone）
+
+    Returns:
+        int: 属性の値（属性がない場合は1）
+    """
+    return int(value or 1)
+
+
+def extract_ipo_rows(html_content, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    IPO一覧のHTMLから、東証の上場中止でない銘柄の行を取り出す関数
+
+    Args:
+        html_content (str): IPO一覧のHTML
+        chunk_size (int): 1回に解析する文字数
+
+    Returns:
+        IpoTableParser: 解析を終えたパーサー（行は rows、コードの型は code_dtype）
+
+    Raises:
+        ValueError: 見出しに ｺｰﾄﾞ / 銘柄 / 市場 を含む表がない場合
+    """
+    parser = IpoTableParser()
+    for start in range(0, len(html_content), chunk_size):
+        parser.feed(html_content[start:start + chunk_size])
+        if parser.done:
+            break
+    else:
+        parser.close()
+    if not parser.found:
+        raise ValueError("no table with the columns ｺｰﾄﾞ, 銘柄, 市場 was found")
+    return parser
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、CLMMfdsGetMarketPriceの応答を列指向のバッチに変換するデコーダを提供するモジュールです。
+
+ファイルの概要:
+- MARKET_PRICE_COLUMNS: sTargetColumnに指定する項目のタプル
+- parse_p_rv_date(value): p_rv_dateの文字列をdatetimeに変換する関数
+- ItaColumnarBatch: 1回の応答を列毎のNumPy配列とNULLマスクで保持するクラス
+- decode_market_price(response_text): 応答の文字列をItaColumnarBatchに変換する関数
+
+注意事項:
+- 行毎の辞書を作らずに、項目毎に型付きの配列（価格はfloat64、数量はint64）とNULLマスクを作成します。
+- p_rv_dateは応答全体で共通のため、1回だけ解析します。
+- to_rows() で従来の get_stock_data と同じ形式の辞書のリストに戻せます。
+"""
+import datetime
+import json
+import numpy as np
+
+# sTargetColumnに指定する項目
+MARKET_PRICE_COLUMNS = (
+    # 現値,出来高,前日終値,始値,高値,安値,VWAP
+    "pDPP", "pDV", "pPRP", "pDOP", "pDHP", "pDLP", "pVWAP",
+    # 売気配値,売気配値種,買気配値,買気配値種
+    "pQAP", "pQAS", "pQBP", "pQBS",
+    # 成売,成買,OVER,UNDER
+    "pAAV", "pABV", "pQOV", "pQUV",
+    # 売値10～売値1
+    "pGAP10", "pGAP9", "pGAP8", "pGAP7", "pGAP6", "pGAP5", "pGAP4", "pGAP3", "pGAP2", "pGAP1",
+    # 買値10～買値1
+    "pGBP10", "pGBP9", "pGBP8", "pGBP7", "pGBP6", "pGBP5", "pGBP4", "pGBP3", "pGBP2", "pGBP1",
+    # 売量10～売量1
+    "pGAV10", "pGAV9", "pGAV8", "pGAV7", "pGAV6", "pGAV5", "pGAV4", "pGAV3", "pGAV2", "pGAV1",
+    # 買量10～買量1
+    "pGBV10", "pGBV9", "pGBV8", "pGBV7", "pGBV6", "pGBV5", "pGBV4", "pGBV3", "pGBV2", "pGBV1",
+)
+TARGET_COLUMN = ",".join(MARKET_PRICE_COLUMNS)
+
+# ita_tableでinteger型の項目（それ以外はnumeric型のためfloat64で保持します）
+INTEGER_COLUMNS = frozenset(
+    ("pDV", "pAAV", "pQOV", "pQUV")
+    + tuple(f"pGAV{level}" for level in range(1, 11))
+    + tuple(f"pGBV{level}" for level in range(1, 11))
+)
+
+
+def parse_p_rv_date(value):
+    """
+    p_rv_date（例: "2024.01.05-09:00:00.123"）の文字列をdatetimeに変換する関数
+
+    Args:
+        value (str): p_rv_dateの文字列
+
+    Returns:
+        datetime.datetime: 変換したdatetime
+    """
+    datetime_str = value.replace(' ', '').replace('.', '-', 1).replace('.', '-', 1)
+    return datetime.datetime.strptime(datetime_str, '%Y-%m-%d-%H:%M:%S.%f')
+
+
+class ItaColumnarBatch:
+    """
+    1回の応答を列毎のNumPy配列とNULLマスクで保持するクラス
+
+    Attributes:
+        codes (np.ndarray): 銘柄コードの配列（int64）
+        columns (dict): 項目名 -> 値の配列（NULLの要素は0）
+        null_mask (dict): 項目名 -> NULLかどうかの配列（bool）
+        created_at (datetime.datetime): 応答のp_rv_date
+        tick_id (int): スナップショットのtick_id（未設定の場合はNone）
+        journal_position (tuple): 応答のジャーナル上の位置（セグメントのファイル名, オフセット）（未設定の場合はNone）
+
+    Methods:
+        to_rows(): get_stock_data と同じ形式の辞書のリストを返すメソッド
+        concat(batches): 複数のバッチを1つに結合するクラスメソッド
+    """
+
+    __slots__ = ("codes", "columns", "null_mask", "created_at", "tick_id", "journal_position")
+
+    def __init__(self, codes, columns, null_mask, created_at, tick_id=None, journal_position=None):
+        """
+        バッチクラスのコンストラクタ
+
+        Args:
+            codes (np.ndarray): 銘柄コードの配列
+            columns (dict): 項目名 -> 値の配列
+            null_mask (dict): 項目名 -> NULLかどうかの配列
+            created_at (datetime.datetime): 応答のp_rv_date
+            tick_id (int): スナップショットのtick_id
+            journal_position (tuple): 応答のジャーナル上の位置
+        """
+        self.codes = codes
+        self.columns = columns
+        self.null_mask = null_mask
+        self.created_at = created_at
+        self.tick_id = tick_id
+        self.journal_position = journal_position
+
+    def __len__(self):
+        return len(self.codes)
+
+    def to_rows(self):
+        """
+        get_stock_data と同じ形式（値は文字列、NULLはNone）の辞書のリストを返すメソッド
+
+        Returns:
+            list: 株価データの辞書のリスト
+        """
+        rows = [{"sIssueCode": str(code)} for code in self.codes.tolist()]
+        for name, values in self.columns.items():
+            mask = self.null_mask[name].tolist()
+            if name in INTEGER_COLUMNS:
+                strings = [str(value) for value in values.tolist()]
+            else:
+                strings = [repr(value) for value in values.tolist()]
+            for row, value, is_null in zip(rows, strings, mask):
+                row[name] = None if is_null else value
+        for row in rows:
+            row["created_at"] = self.created_at
+            if self.tick_id is not None:
+                row["tick_id"] = self.tick_id
+            if self.journal_position is not None:
+                row["journal_position"] = self.journal_position
+        return rows
+
+    @classmethod
+    def concat(cls, batches):
+        """
+        複数のバッチを1つに結合するクラスメソッド（created_atとtick_idは先頭のバッチの値を使用）
+
+        Args:
+            batches (list): ItaColumnarBatchのリスト
+
+        Returns:
+            ItaColumnarBatch: 結合したバッチ
+        """
+        first = batches[0]
+        return cls(
+            np.concatenate([batch.codes for batch in batches]),
+            {name: np.concatenate([batch.columns[name] for batch in batches]) for name in first.columns},
+            {name: np.concatenate([batch.null_mask[name] for batch in batches]) for name in first.null_mask},
+            first.created_at,
+            first.tick_id,
+        )
+
+
+def _to_array(strings, dtype):
+    """
+    文字列のリストを型付きの配列とNULLマスクに変換する関数
+
+    Args:
+        strings (list): 値の文字列のリスト（空文字列はNULL）
+        dtype (np.dtype): 変換後の型
+
+    Returns:
+        tuple: (値の配列, NULLマスク)
+    """
+    null_mask = np.fromiter((value == "" for value in strings), dtype=bool, count=len(strings))
+    if null_mask.any():
+        strings = ["0" if is_null else value for value, is_null in zip(strings, null_mask.tolist())]
+    values = np.array(strings, dtype=np.float64)
+    if dtype is not np.float64:
+        values = values.astype(dtype)
+    return values, null_mask
+
+
+def decode_market_price(response_text, columns=MARKET_PRICE_COLUMNS):
+    """
+    CLMMfdsGetMarketPriceの応答の文字列をItaColumnarBatchに変換する関数
+
+    Args:
+        response_text (str): 応答の文字列
+        columns (tuple): 取り出す項目名のタプル
+
+    Returns:
+        ItaColumnarBatch: 変換したバッチ
+    """
+    response_json = json.loads(response_text)
+    items = response_json["aCLMMfdsMarketPrice"]
+    created_at = parse_p_rv_date(response_json["p_rv_date"])
+
+    codes = np.array([item["sIssueCode"] for item in items], dtype=np.int64)
+    values = {}
+    null_mask = {}
+    for name in columns:
+        dtype = np.int64 if name in INTEGER_COLUMNS else np.float64
+        values[name], null_mask[name] = _to_array([item.get(name, "") for item in items], dtype)
+    return ItaColumnarBatch(codes, values, null_mask, created_at)
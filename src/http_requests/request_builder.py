@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、立花証券APIの「URL?{JSON}」形式のリクエストを高速に作成するビルダーを提供するモジュールです。
+
+ファイルの概要:
+- format_p_sd_date(timestamp): "p_sd_date"の書式（日本時間）の文字列を返す関数
+- REQUEST_FIELD: RequestTemplate の項目のうち、リクエスト毎に値を指定する項目を表す目印
+- RequestTemplate: リクエストの種類毎に固定部分を事前にURLエンコードしておくテンプレートクラス
+
+注意事項:
+- make_url_request と同じ内容のリクエストを、URLエンコード済みの状態で作成します。
+  http_transport はエンコード済みのURLを再度エンコードしません。
+- 値の前後にダブルクオーテーションがない場合は check_json_dquat と同様に付けます（JSONのエスケープは行いません）。
+- p_sd_date は秒までの部分を1秒毎に1回だけ作成し、ミリ秒の部分だけをリクエスト毎に付け足します。
+- request通番（p_no）はビルダーでは採番しません。ClassTachibanaAccount.next_p_no() で採番した値を渡します。
+"""
+import re
+import time
+import urllib.parse
+
+# 日本時間（UTC+9、夏時間なし）
+_JST_OFFSET_SECONDS = 9 * 3600
+
+# リクエスト毎に値を指定する項目を表す目印
+REQUEST_FIELD = object()
+
+# 英数字と「,」だけの値（銘柄コードのリストなど）は「,」を置き換えるだけでエンコードできる
+_CODE_LIST_PATTERN = re.compile(r"[0-9A-Za-z_.~,-]*")
+
+# (エポック秒, "YYYY.MM.DD-HH:MM:SS." の文字列) のキャッシュ（タプルの差し替えのみのためロックは不要）
+_sd_date_cache = (None, "")
+
+
+def _quote(value):
+    if _CODE_LIST_PATTERN.fullmatch(value):
+        return value.replace(",", "%2C")
+    return urllib.parse.quote(value, safe="")
+
+
+def _dquat(value):
+    """
+    check_json_dquat と同様に、値の前後にダブルクオーテーションを付ける関数
+
+    Args:
+        value (str): 値
+
+    Returns:
+        str: 前後にダブルクオーテーションが付いた値
+    """
+    value = str(value)
+    if not value.startswith('"'):
+        value = '"' + value
+    if len(value) == 1 or not value.endswith('"'):
+        value = value + '"'
+    return value
+
+
+def format_p_sd_date(timestamp=None):
+    """
+    "p_sd_date"の書式（例: 2024.01.05-09:00:00.123、日本時間）の文字列を返す関数
+
+    Args:
+        timestamp (float): エポック秒（省略時は現在時刻）
+
+    Returns:
+        str: "p_sd_date"の書式の文字列
+    """
+    global _sd_date_cache
+    if timestamp is None:
+        timestamp = time.time()
+    second = int(timestamp)
+    cached_second, prefix = _sd_date_cache
+    if cached_second != second:
+        prefix = time.strftime("%Y.%m.%d-%H:%M:%S.", time.gmtime(second + _JST_OFFSET_SECONDS))
+        _sd_date_cache = (second, prefix)
+    return f"{prefix}{int((timestamp - second) * 1000):03d}"
+
+
+class RequestTemplate:
+    """
+    リクエストの種類毎に固定部分を事前にURLエンコードしておくテンプレートクラス
+
+    Attributes:
+        url_target (str): リクエスト先のURL
+        fields (tuple): リクエスト毎に値を指定する項目名
+
+    Methods:
+        build(p_no, p_sd_date=None, **values): URLエンコード済みのリクエストのURLを返すメソッド
+    """
+
+    def __init__(self, url_target, items, auth=False):
+        """
+        テンプレートクラスのコンストラクタ
+
+        Args:
+            url_target (str): リクエスト先のURL
+            items (list): (項目名, 値) のリスト（値に REQUEST_FIELD を指定した項目はリクエスト毎に
+                ダブルクオーテーションなしの値を指定）
+            auth (bool): 認証用のURL（url_target + "auth/"）にするかどうか
+        """
+        self.url_target = url_target
+        base_url = url_target + "auth/" if auth else url_target
+
+        # 固定部分と、リクエスト毎に指定する項目名を交互に並べる
+        # [固定, "p_no", 固定, "p_sd_date", 固定, 項目名, 固定, ...]
+        parts = [base_url + "?" + _quote('{"p_no":"'), "p_no", _quote('","p_sd_date":"'), "p_sd_date"]
+        literal = '"'
+        fields = []
+        for key, value in items:
+            name = key.strip('"')
+            literal += f',"{name}":'
+            if value is REQUEST_FIELD:
+                parts.append(_quote(literal + '"'))
+                parts.append(name)
+                fields.append(name)
+                literal = '"'
+            else:
+                literal += _dquat(value)
+        parts.append(_quote(literal + "}"))
+        self.fields = tuple(fields)
+        self._literals = parts[0::2]
+        self._names = parts[1::2]
+
+    def build(self, p_no, p_sd_date=None, **values):
+        """
+        URLエンコード済みのリクエストのURLを返すメソッド
+
+        Args:
+            p_no (int): request通番
+            p_sd_date (str): 送信日時（省略時は現在時刻）
+            **values: リクエスト毎に指定する項目の値（str）
+
+        Returns:
+            str: URLエンコード済みのリクエストのURL
+        """
+        values["p_no"] = str(p_no)
+        values["p_sd_date"] = format_p_sd_date() if p_sd_date is None else p_sd_date
+        literals = self._literals
+        chunks = [literals[0]]
+        for index, name in enumerate(self._names, 1):
+            chunks.append(_quote(values[name]))
+            chunks.append(literals[index])
+        return "".join(chunks)
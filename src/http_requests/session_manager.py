@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、立花証券APIのセッション（仮想URLとrequest通番）を管理するモジュールです。
+
+ファイルの概要:
+- TachibanaSessionManager: セッション切れを検知して再ログインし、セッションをファイルに保存するクラス
+- open_tachibana_session(state_path, logger): 保存済みのセッションを再利用して（できない場合はログインして）
+  立花証券口座クラスのインスタンスを返す関数
+
+ファイル内の主な処理ステップ:
+1. 時価情報の応答のp_errnoが invalid_errnos に含まれる場合をセッション切れとみなします。
+2. セッション切れを検知すると1回だけ再ログインします。同時に検知した要求や、再ログイン中に始まった要求は
+   再ログインの完了を待ってから、新しい仮想URLで要求し直します。
+3. ログインの度に、仮想URLとrequest通番の予約（p_no_reserved）を state_path に保存します。
+   request通番は p_no_block 件毎に予約し直すため、ファイルへの書き込みは p_no_block 件に1回です。
+   予約の残りが半分を切った時点で、次の範囲の保存を別スレッドで始めます（要求のスレッドはfsyncを待ちません）。
+   保存が追いつかずに予約を使い切った場合だけ、要求のスレッドが保存の完了を待ちます。
+4. 起動時に当日（日本時間）のセッションが保存されていれば、ログインせずに予約済みの通番から再開します。
+   保存されたセッションが既に無効な場合は、最初の要求で 2. の再ログインが行われます。
+
+注意事項:
+- 保存するファイルには仮想URL（セッションの認証情報）が含まれるため、所有者のみ読み書きできる権限で作成します。
+  既定の保存先（/src/session）は .gitignore でリポジトリの管理から除外しています。
+- セッション切れを表すp_errnoは環境変数 TACHIBANA_SESSION_ERRNOS（カンマ区切り）で変更できます。
+"""
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from http_requests.insert_ita_requests import create_account_from_env, login_account, response_errno
+from utilities.metrics import counter
+from utilities.utility import handle_log
+
+SESSION_LOGINS = counter("ita_session_logins_total", "Logins to the Tachibana API by reason.")
+
+# 既定値
+DEFAULT_STATE_PATH = "/src/session/tachibana_session.json"
+DEFAULT_INVALID_ERRNOS = "2"
+DEFAULT_P_NO_BLOCK = 1000
+
+_JST = datetime.timezone(datetime.timedelta(hours=9))
+_STATE_KEYS = ("request_url", "event_url", "master_url", "price_url", "tax_category")
+
+
+def _today_jst():
+    return datetime.datetime.now(_JST).date().isoformat()
+
+
+class TachibanaSessionManager:
+    """
+    立花証券APIのセッションを管理するクラス
+
+    Attributes:
+        account (ClassTachibanaAccount): 管理する立花証券口座クラスのインスタンス
+        state_path (str): セッションを保存するファイルのパス（Noneの場合は保存しない）
+        generation (int): ログインする度に増える番号
+        p_no_reserved (int): 保存済みのrequest通番の予約の上限
+        stats (dict): ログイン、再ログイン、再開の回数
+
+    Methods:
+        login(reason): ログインしてセッションを保存するメソッド
+        resume(): 保存済みのセッションを読み込むメソッド
+        wait_ready(): 再ログイン中であれば完了まで待ち、現在の generation を返すメソッド
+        is_session_invalid(response): 応答がセッション切れかどうかを返すメソッド
+        relogin(generation): セッション切れを検知した要求から呼ばれ、1回だけ再ログインするメソッド
+        ensure_p_no_reserved(p_no): 採番したrequest通番が保存済みの予約の範囲内であることを確認するメソッド
+        reserve_p_no(p_no, force): request通番の次の範囲を予約して保存するメソッド
+    """
+
+    def __init__(self, account, state_path=None, invalid_errnos=None, p_no_block=DEFAULT_P_NO_BLOCK, logger=None):
+        """
+        セッション管理クラスのコンストラクタ
+
+        Args:
+            account (ClassTachibanaAccount): 立花証券口座クラスのインスタンス
+            state_path (str): セッションを保存するファイルのパス（省略可能）
+            invalid_errnos (iterable): セッション切れを表すp_errno（省略時は環境変数 TACHIBANA_SESSION_ERRNOS）
+            p_no_block (int): 1回に予約するrequest通番の件数
+            logger (logging.Logger): ロガーインスタンス（省略可能）
+        """
+        if invalid_errnos is None:
+            invalid_errnos = os.environ.get("TACHIBANA_SESSION_ERRNOS", DEFAULT_INVALID_ERRNOS).split(",")
+        self.account = account
+        self.state_path = state_path
+        self.invalid_errnos = frozenset(int(errno) for errno in invalid_errnos if str(errno).strip())
+        self.p_no_block = p_no_block
+        self.logger = logger
+        self.generation = 0
+        self.p_no_reserved = float("inf")  # 最初のログインまたは再開までは予約しない
+        self.stats = {"logins": 0, "relogins": 0, "resumed": 0, "login_failures": 0}
+
+        self._login_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._reserve_lock = threading.Lock()
+        self._reserving = False  # 次の範囲を別スレッドで保存中かどうか
+        self._ready = threading.Event()
+        self._ready.set()
+        account.session = self
+
+    def _log(self, message, log_level=logging.INFO):
+        if self.logger is not None:
+            handle_log(self.logger, message, log_level)
+
+    def _state(self, p_no_reserved):
+        """
+        保存する内容を返すメソッド
+
+        Args:
+            p_no_reserved (int): 保存するrequest通番の予約の上限
+
+        Returns:
+            dict: 仮想URL、request通番の予約等
+        """
+        state = {key: getattr(self.account, key) for key in _STATE_KEYS}
+        state.update(
+            url_base=self.account.url_base,
+            user_id=self.account.user_id,
+            p_no_reserved=p_no_reserved,
+            date=_today_jst(),
+            saved_at=time.time(),
+        )
+        return state
+
+    def _save(self, p_no_reserved):
+        """
+        セッションをファイルに保存するメソッド（一時ファイル経由で置き換えます、_save_lock を取得した状態で呼び出します）
+
+        Args:
+            p_no_reserved (int): 保存するrequest通番の予約の上限
+        """
+        if self.state_path is None:
+            return
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.state_path}.tmp"
+        descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "w") as file:
+            json.dump(self._state(p_no_reserved), file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.state_path)
+
+    def ensure_p_no_reserved(self, p_no):
+        """
+        採番したrequest通番が保存済みの予約の範囲内であることを確認するメソッド（ClassTachibanaAccount.next_p_no から呼ばれます）
+
+        予約の残りが半分を切った場合は次の範囲の保存を別スレッドで始め、予約を使い切った場合だけ保存の完了を待ちます。
+
+        Args:
+            p_no (int): 採番したrequest通番
+        """
+        reserved = self.p_no_reserved
+        if p_no < reserved - self.p_no_block // 2:
+            return
+        if p_no < reserved:
+            with self._reserve_lock:
+                if self._reserving:
+                    return
+                self._reserving = True
+            threading.Thread(
+                target=self._reserve_in_background, args=(p_no,), name="tachibana-p-no-reserve", daemon=True
+            ).start()
+            return
+        self.reserve_p_no(p_no)
+
+    def _reserve_in_background(self, p_no):
+        try:
+            self.reserve_p_no(p_no)
+        finally:
+            with self._reserve_lock:
+                self._reserving = False
+
+    def reserve_p_no(self, p_no, force=False):
+        """
+        request通番の次の範囲を予約して保存するメソッド
+
+        予約の上限は保存が終わってから更新します（他のスレッドは保存前の範囲を超えて採番しません）。
+
+        Args:
+            p_no (int): 現在のrequest通番
+            force (bool): 予約の残りに関わらず予約し直すかどうか（ログインと再開の時）
+        """
+        with self._save_lock:
+            if not force and p_no < self.p_no_reserved - self.p_no_block // 2:
+                # 他のスレッドが既に次の範囲を予約した
+                return
+            reserved = p_no + self.p_no_block if force else max(p_no, self.p_no_reserved) + self.p_no_block
+            try:
+                self._save(reserved)
+            except OSError as error:
+                # 保存できなくても要求は続ける（再起動時はログインし直す）
+                self._log(f"failed to save tachibana session: {error}", logging.WARNING)
+            self.p_no_reserved = reserved
+
+    def login(self, reason="login"):
+        """
+        ログインしてセッションを保存するメソッド
+
+        Args:
+            reason (str): ログインする理由（メトリクスのラベル）
+        """
+        try:
+            login_account(self.account)
+        except Exception:
+            self.stats["login_failures"] += 1
+            SESSION_LOGINS.inc(reason=f"{reason}_failed")
+            raise
+        self.generation += 1
+        self.stats["logins"] += 1
+        SESSION_LOGINS.inc(reason=reason)
+        self.reserve_p_no(self.account.int_p_no, force=True)
+
+    def resume(self):
+        """
+        保存済みのセッションを読み込むメソッド
+
+        同じ利用者・同じログイン先で、当日（日本時間）に保存されたセッションだけを再利用します。
+
+        Returns:
+            bool: 再利用できた場合はTrue
+        """
+        if self.state_path is None or not os.path.exists(self.state_path):
+            return False
+        try:
+            with open(self.state_path) as file:
+                state = json.load(file)
+        except (OSError, ValueError) as error:
+            self._log(f"failed to load tachibana session: {error}", logging.WARNING)
+            return False
+        if (
+            state.get("date") != _today_jst()
+            or state.get("user_id") != self.account.user_id
+            or state.get("url_base") != self.account.url_base
+            or not state.get("price_url")
+        ):
+            return False
+
+        self.account.set_property(**{key: state.get(key, "") for key in _STATE_KEYS})
+        # 前のプロセスが予約した範囲の続きから採番する（前のプロセスが使った通番とは重複しない）
+        self.account.reset_p_no(int(state.get("p_no_reserved", 0)))
+        self.generation += 1
+        self.stats["resumed"] += 1
+        SESSION_LOGINS.inc(reason="resumed")
+        self.reserve_p_no(self.account.int_p_no, force=True)
+        return True
+
+    def wait_ready(self):
+        """
+        再ログイン中であれば完了まで待ち、現在の generation を返すメソッド
+
+        Returns:
+            int: 現在の generation
+        """
+        self._ready.wait()
+        return self.generation
+
+    def is_session_invalid(self, response):
+        """
+        応答がセッション切れかどうかを返すメソッド
+
+        Args:
+            response (str): 時価情報の応答の文字列
+
+        Returns:
+            bool: セッション切れの場合はTrue
+        """
+        return response_errno(response) in self.invalid_errnos
+
+    def relogin(self, generation):
+        """
+        セッション切れを検知した要求から呼ばれ、1回だけ再ログインするメソッド
+
+        既に他の要求が再ログインを済ませている場合（generation が変わっている場合）は何もしません。
+
+        Args:
+            generation (int): 要求を送った時点の generation
+        """
+        with self._login_lock:
+            if self.generation != generation:
+                return
+            self._ready.clear()
+            try:
+                self._log("tachibana session expired, logging in again", logging.WARNING)
+                self.login(reason="relogin")
+                self.stats["relogins"] += 1
+            finally:
+                self._ready.set()
+
+
+def open_tachibana_session(state_path=None, logger=None):
+    """
+    保存済みのセッションを再利用して（できない場合はログインして）立花証券口座クラスのインスタンスを返す関数
+
+    Args:
+        state_path (str): セッションを保存するファイルのパス（Noneの場合は保存・再利用しない）
+        logger (logging.Logger): ロガーインスタンス（省略可能）
+
+    Returns:
+        ClassTachibanaAccount: セッション管理が設定された立花証券口座クラスのインスタンス
+    """
+    account = create_account_from_env()
+    session = TachibanaSessionManager(account, state_path=state_path, logger=logger)
+    if session.resume():
+        session._log(f"resumed tachibana session from {state_path}")
+    else:
+        session.login()
+    return account
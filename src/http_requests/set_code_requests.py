@@ -5,9 +5,32 @@
 ファイルの概要:
 - get_jpx_data(): 東証から株価データをダウンロードして取得する関数
 - get_ipo_data(): 指定されたURLからHTMLコードを取得する関数
+- DownloadCache: URL毎のETag・Last-Modified・内容のハッシュを保存するクラス
+- download_if_changed(url, cache): 前回から変わっている場合だけ内容を返す条件付きダウンロードの関数
+
+注意事項:
+- download_if_changed は If-None-Match / If-Modified-Since を付けて要求し、304の場合は本文を受け取りません。
+  200の場合も内容のSHA-256が前回と同じであれば unchanged とします（ETagを返さないサーバー向け）。
+- キャッシュは DownloadCache.update() を呼ぶまで更新されません。データベースへの反映が成功してから呼ぶことで、
+  失敗した場合は次回に同じファイルを処理し直せます。
+- ダウンロード先のURLは環境変数 JPX_DATA_URL / IPO_LIST_URL で変更できます（ローカルの疑似サーバー用）。
 """
+import hashlib
+import json
+import os
 import requests
 
+JPX_DATA_URL = os.environ.get(
+    "JPX_DATA_URL", "https://www.jpx.co.jp/markets/statistics-equities/misc/tvdivq0000001vg2-att/data_j.xls"
+)
+IPO_LIST_URL = os.environ.get("IPO_LIST_URL", "https://c-eye.co.jp/ipo-list")
+DEFAULT_TIMEOUT = 10
+
+# download_if_changed の結果
+DOWNLOAD_NOT_MODIFIED = "not_modified"
+DOWNLOAD_UNCHANGED = "unchanged"
+DOWNLOAD_CHANGED = "changed"
+
 
 def get_jpx_data():
     """
@@ -20,11 +43,8 @@ def get_jpx_data():
         requests.RequestException: リクエストエラーが発生した場合
     """
 
-    # ダウンロードするファイルのURL
-    url = "https://www.jpx.co.jp/markets/statistics-equities/misc/tvdivq0000001vg2-att/data_j.xls"
-
     try:
-        response = requests.get(url, timeout=10)
+        response = requests.get(JPX_DATA_URL, timeout=DEFAULT_TIMEOUT)
         response.raise_for_status()  # HTTPステータスコードがエラーの場合に例外を発生させる
 
     except requests.exceptions.HTTPError as http_error:
@@ -45,12 +65,145 @@ def get_ipo_data():
     Returns:
     str: 取得したHTMLコード
     """
-    url = "https://c-eye.co.jp/ipo-list"
-
     try:
-        response = requests.get(url, timeout=10)
+        response = requests.get(IPO_LIST_URL, timeout=DEFAULT_TIMEOUT)
         response.raise_for_status()  # エラーレスポンスを検出
     except requests.exceptions.RequestException as e:
         raise e
 
     return response
+
+
+class DownloadCache:
+    """
+    URL毎のETag・Last-Modified・内容のハッシュをJSONファイルに保存するクラス
+
+    Attributes:
+        path (str): 保存するファイルのパス（Noneの場合は保存しない）
+
+    Methods:
+        get(url): URLの保存済みの情報を返すメソッド
+        update(download): ダウンロードの結果を保存するメソッド
+    """
+
+    def __init__(self, path=None):
+        """
+        キャッシュクラスのコンストラクタ
+
+        Args:
+            path (str): 保存するファイルのパス（省略可能）
+        """
+        self.path = path
+        self._entries = {}
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path) as file:
+                    self._entries = json.load(file)
+            except (OSError, ValueError):
+                # 読めないキャッシュは使わない（全件ダウンロードし直す）
+                self._entries = {}
+
+    def get(self, url):
+        """
+        URLの保存済みの情報を返すメソッド
+
+        Args:
+            url (str): URL
+
+        Returns:
+            dict: etag / last_modified / sha256（保存されていない場合は空の辞書）
+        """
+        return self._entries.get(url, {})
+
+    def update(self, download):
+        """
+        ダウンロードの結果を保存するメソッド（一時ファイル経由で置き換えます）
+
+        Args:
+            download (Download): download_if_changed の結果
+        """
+        if download.status == DOWNLOAD_NOT_MODIFIED:
+            return
+        self._entries[download.url] = {
+            "etag": download.etag, "last_modified": download.last_modified, "sha256": download.sha256,
+        }
+        if self.path is None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(self._entries, file)
+        os.replace(temp_path, self.path)
+
+
+class Download:
+    """
+    download_if_changed の結果を保持するクラス
+
+    Attributes:
+        url (str): URL
+        status (str): not_modified（304）/ unchanged（内容のハッシュが同じ）/ changed
+        content (bytes): 応答の本文（not_modified の場合はNone）
+        etag (str): 応答のETag
+        last_modified (str): 応答のLast-Modified
+        sha256 (str): 本文のSHA-256
+        encoding (str): 本文の文字コード（requests.Response.text と同じ方法で決めたもの）
+    """
+    __slots__ = ("url", "status", "content", "etag", "last_modified", "sha256", "encoding")
+
+    def __init__(self, url, status, content=None, etag=None, last_modified=None, sha256=None, encoding=None):
+        self.url = url
+        self.status = status
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.sha256 = sha256
+        self.encoding = encoding
+
+    @property
+    def changed(self):
+        return self.status == DOWNLOAD_CHANGED
+
+    @property
+    def text(self):
+        return None if self.content is None else str(self.content, self.encoding or "utf-8", errors="replace")
+
+
+def download_if_changed(url, cache=None, timeout=DEFAULT_TIMEOUT):
+    """
+    前回から変わっている場合だけ内容を返す条件付きダウンロードの関数
+
+    Args:
+        url (str): ダウンロードするURL
+        cache (DownloadCache): 前回の情報を持つキャッシュ（省略時は常にダウンロード）
+        timeout (float): タイムアウト（秒）
+
+    Returns:
+        Download: ダウンロードの結果
+
+    Raises:
+        requests.exceptions.HTTPError: HTTPエラーが発生した場合
+        requests.RequestException: リクエストエラーが発生した場合
+    """
+    entry = cache.get(url) if cache is not None else {}
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = requests.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        return Download(url, DOWNLOAD_NOT_MODIFIED, etag=entry.get("etag"),
+                        last_modified=entry.get("last_modified"), sha256=entry.get("sha256"))
+    response.raise_for_status()
+
+    content = response.content
+    sha256 = hashlib.sha256(content).hexdigest()
+    status = DOWNLOAD_UNCHANGED if sha256 == entry.get("sha256") else DOWNLOAD_CHANGED
+    return Download(
+        url, status, content, response.headers.get("ETag"), response.headers.get("Last-Modified"), sha256,
+        response.encoding or response.apparent_encoding,
+    )
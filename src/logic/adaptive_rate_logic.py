@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、時価情報APIの応答時間とエラーからポーリングの頻度と同時実行数を調整するコントローラーを提供するモジュールです。
+
+ファイル内の主な処理ステップ:
+1. request_market_price の各リクエストの所要時間とエラー（HTTPエラー、タイムアウト、p_errnoが0以外）を記録します。
+2. window 秒毎に、その間の記録を評価します（エラーがなくリクエスト数が min_samples 未満の場合は評価期間を延ばします）。
+   - エラーがあった場合、または応答時間のp90が target_latency を超えた場合は、
+     ポーリングの頻度と同時実行数に decrease_factor を掛けて減らします（乗算的減少）。
+   - 問題がなかった場合は、頻度を increase_step、同時実行数を1だけ増やします（加算的増加）。
+3. 頻度と同時実行数は下限（min_*）と上限（max_*）の範囲に収めます。
+   さらに「頻度 × 1tickあたりのリクエスト数」が rate_cap（リクエスト/秒）を超えないように頻度を制限します。
+
+注意事項:
+- 頻度はtick/秒です。銘柄をシャードに分割している場合、1tickで requests_per_tick 回のリクエストを送ります。
+- tickの間隔はミリ秒単位に丸めます（tick_idを壁時計の境界に揃えるため）。
+- 現在の頻度と同時実行数はメトリクス（ita_effective_rate / ita_request_rate / ita_concurrency_limit）として公開します。
+"""
+import math
+import threading
+import time
+from http_requests.insert_ita_requests import set_request_observer
+from utilities.metrics import counter, gauge
+
+EFFECTIVE_RATE = gauge("ita_effective_rate", "Current polling rate chosen by the adaptive controller (ticks/sec).")
+REQUEST_RATE = gauge(
+    "ita_request_rate", "Current market-price request rate chosen by the adaptive controller (requests/sec)."
+)
+CONCURRENCY_LIMIT = gauge("ita_concurrency_limit", "Current in-flight task limit chosen by the adaptive controller.")
+RATE_ADJUSTMENTS = counter("ita_rate_adjustments_total", "Adjustments made by the adaptive controller.")
+
+# 既定値
+DEFAULT_MIN_RATE = 1.0
+DEFAULT_MAX_RATE = 10.0
+DEFAULT_RATE_CAP = 20.0
+DEFAULT_MIN_CONCURRENCY = 1
+DEFAULT_MAX_CONCURRENCY = 10
+DEFAULT_TARGET_LATENCY = 0.5
+DEFAULT_INCREASE_STEP = 0.5
+DEFAULT_DECREASE_FACTOR = 0.5
+DEFAULT_WINDOW = 2.0
+DEFAULT_MIN_SAMPLES = 5
+
+
+class AdaptiveRateController:
+    """
+    AIMDでポーリングの頻度と同時実行数を調整するコントローラークラス
+
+    Attributes:
+        rate (float): 現在のポーリングの頻度（tick/秒）
+        concurrency (int): 現在の同時実行数の上限
+        stats (dict): リクエスト数、エラー数、増減した回数
+
+    Methods:
+        observe(latency, error): リクエストの結果を記録するメソッド
+        interval(): 現在のtickの間隔（秒）を返すメソッド
+        rate_limit(): 頻度の上限（max_rate と rate_cap の小さい方）を返すメソッド
+    """
+
+    def __init__(self, min_rate=DEFAULT_MIN_RATE, max_rate=DEFAULT_MAX_RATE, rate_cap=DEFAULT_RATE_CAP,
+                 min_concurrency=DEFAULT_MIN_CONCURRENCY, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 target_latency=DEFAULT_TARGET_LATENCY, increase_step=DEFAULT_INCREASE_STEP,
+                 decrease_factor=DEFAULT_DECREASE_FACTOR, window=DEFAULT_WINDOW,
+                 min_samples=DEFAULT_MIN_SAMPLES, requests_per_tick=1, initial_rate=None, initial_concurrency=None):
+        """
+        コントローラークラスのコンストラクタ
+
+        Args:
+            min_rate (float): 頻度の下限（tick/秒）
+            max_rate (float): 頻度の上限（tick/秒）
+            rate_cap (float): リクエスト数の絶対的な上限（リクエスト/秒、証券会社の利用制限）
+            min_concurrency (int): 同時実行数の下限
+            max_concurrency (int): 同時実行数の上限
+            target_latency (float): 応答時間のp90の目標（秒）
+            increase_step (float): 問題がなかった場合に増やす頻度（tick/秒）
+            decrease_factor (float): 問題があった場合に掛ける係数（0より大きく1より小さい値）
+            window (float): 評価する間隔（秒）
+            min_samples (int): 増加の判断に必要な最低限のリクエスト数
+            requests_per_tick (int): 1tickあたりのリクエスト数（シャード数）
+            initial_rate (float): 頻度の初期値（省略時は上限）
+            initial_concurrency (int): 同時実行数の初期値（省略時は上限）
+        """
+        if not 0 < min_rate <= max_rate:
+            raise ValueError("0 < min_rate <= max_rate is required")
+        if not 1 <= min_concurrency <= max_concurrency:
+            raise ValueError("1 <= min_concurrency <= max_concurrency is required")
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factor must be between 0 and 1")
+        if rate_cap <= 0 or requests_per_tick < 1:
+            raise ValueError("rate_cap and requests_per_tick must be positive")
+
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate_cap = rate_cap
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.window = window
+        self.min_samples = min_samples
+        self.requests_per_tick = requests_per_tick
+
+        self._lock = threading.Lock()
+        self._latencies = []
+        self._errors = 0
+        self._window_start = time.monotonic()
+        self.stats = {"requests": 0, "errors": 0, "increases": 0, "decreases": 0}
+
+        self.rate = self._clamp_rate(self.rate_limit() if initial_rate is None else initial_rate)
+        self.concurrency = self._clamp_concurrency(
+            max_concurrency if initial_concurrency is None else initial_concurrency
+        )
+        self._publish()
+
+    def rate_limit(self):
+        """
+        頻度の上限（max_rate と rate_cap から求めた値の小さい方）を返すメソッド
+
+        Returns:
+            float: 頻度の上限（tick/秒）
+        """
+        return min(self.max_rate, self.rate_cap / self.requests_per_tick)
+
+    def _clamp_rate(self, rate):
+        # rate_cap は min_rate より優先する
+        return min(max(rate, self.min_rate), self.rate_limit())
+
+    def _clamp_concurrency(self, concurrency):
+        return min(max(int(concurrency), self.min_concurrency), self.max_concurrency)
+
+    def _publish(self):
+        EFFECTIVE_RATE.set(self.rate)
+        REQUEST_RATE.set(self.rate * self.requests_per_tick)
+        CONCURRENCY_LIMIT.set(self.concurrency)
+
+    def interval(self):
+        """
+        現在のtickの間隔（秒、ミリ秒単位に丸めた値）を返すメソッド
+
+        Returns:
+            float: tickの間隔（秒）
+        """
+        # 丸めによって rate_cap を超えないように切り上げる
+        return math.ceil(1000 / self.rate) / 1000
+
+    def observe(self, latency, error=False):
+        """
+        リクエストの結果を記録し、評価の間隔が過ぎていれば頻度と同時実行数を調整するメソッド
+
+        Args:
+            latency (float): リクエストの所要時間（秒）
+            error (bool): エラーだったかどうか
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.stats["requests"] += 1
+            self._latencies.append(latency)
+            if error:
+                self.stats["errors"] += 1
+                self._errors += 1
+            # 増加の判断に必要なリクエスト数が集まるまでは評価期間を延ばす
+            enough = self._errors or len(self._latencies) >= self.min_samples
+            if enough and now - self._window_start >= self.window:
+                self._evaluate()
+                self._latencies = []
+                self._errors = 0
+                self._window_start = now
+
+    def _evaluate(self):
+        """
+        直近の評価期間の記録から頻度と同時実行数を調整するメソッド（ロックを取得した状態で呼び出す）
+        """
+        latencies = sorted(self._latencies)
+        p90 = latencies[min(int(len(latencies) * 0.9), len(latencies) - 1)] if latencies else 0.0
+
+        if self._errors or p90 > self.target_latency:
+            rate = self._clamp_rate(self.rate * self.decrease_factor)
+            concurrency = self._clamp_concurrency(math.floor(self.concurrency * self.decrease_factor))
+            direction = "decrease"
+        else:
+            rate = self._clamp_rate(self.rate + self.increase_step)
+            concurrency = self._clamp_concurrency(self.concurrency + 1)
+            direction = "increase"
+
+        if rate != self.rate or concurrency != self.concurrency:
+            self.rate = rate
+            self.concurrency = concurrency
+            self.stats[f"{direction}s"] += 1
+            RATE_ADJUSTMENTS.inc(direction=direction)
+            self._publish()
+
+
+def install_rate_controller(controller):
+    """
+    コントローラーが時価情報のリクエストの結果を受け取るように設定する関数
+
+    Args:
+        controller (AdaptiveRateController): コントローラー（Noneの場合は解除）
+    """
+    set_request_observer(None if controller is None else controller.observe)
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、asyncioを使用して株価データの取得とデータベースへの保存を定期実行するコレクターを提供するモジュールです。
+
+ファイル内の主な処理ステップ:
+1. 壁時計の境界に揃えたtick（logic.tick_scheduler_logic）毎に execute_task をスレッドで実行します。
+   各tickの予定時刻（エポックミリ秒）をtick_idとしてタスクに渡します。
+2. 同時に実行中のタスク数（in-flight）が上限に達した場合は、指定されたポリシーに従ってバックプレッシャーをかけます。
+3. キューの深さや実行結果の件数を定期的にログに出力します。
+4. controller（logic.adaptive_rate_logic）を指定した場合は、tickの間隔と同時実行数の上限をtick毎にコントローラーから取得します。
+5. session_gate（logic.trading_session_logic）を指定した場合は、寄付前と昼休みはtickを発行せずに次の立会の直前まで待機します。
+
+バックプレッシャーのポリシー:
+- skip: 上限に達している間のtickは実行せずに捨てます。
+- coalesce: 上限に達している間のtickを1件にまとめ、空きができ次第すぐに1回だけ実行します。
+- wait: 空きができるまでtickの発行を待ちます（待っている間に過ぎた境界は missed として数えます）。
+
+注意事項:
+- タスクの中身は従来のスレッドプール方式と同じ execute_task（get_stock_data → insert_rows）です。
+- 実行中のタスク数は常に max_in_flight 以下に保たれるため、API やデータベースが遅くなってもメモリは増え続けません。
+"""
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import time
+from logic.insert_ita_logic import execute_task
+from logic.tick_scheduler_logic import TickScheduler
+from utilities.metrics import counter, gauge, heartbeat
+from utilities.utility import handle_log
+
+TICKS = counter("ita_ticks_total", "Collector ticks.")
+TICKS_DROPPED = counter("ita_ticks_dropped_total", "Ticks dropped by the overflow policy.")
+TASK_FAILURES = counter("ita_task_failures_total", "Failed ITA tasks.")
+QUEUE_DEPTH = gauge("ita_collector_queue_depth", "In-flight plus pending ITA tasks.")
+
+OVERFLOW_SKIP = "skip"
+OVERFLOW_COALESCE = "coalesce"
+OVERFLOW_WAIT = "wait"
+OVERFLOW_POLICIES = (OVERFLOW_SKIP, OVERFLOW_COALESCE, OVERFLOW_WAIT)
+
+
+class AsyncItaCollector:
+    """
+    in-flight数の上限とバックプレッシャーを持つasyncioコレクタークラス
+
+    Attributes:
+        interval (float): タスク実行の間隔（秒）
+        max_in_flight (int): 同時に実行するタスク数の上限
+        overflow_policy (str): 上限に達した場合のポリシー（skip / coalesce / wait）
+        stats (dict): 実行結果の件数やキューの深さの統計
+
+    Methods:
+        run(should_continue): should_continue()がFalseになるまでtick毎にタスクを実行するメソッド
+        run_once(): タスクを1回実行し、完了まで待つメソッド
+        queue_depth(): 実行中と保留中のタスク数の合計を返すメソッド
+    """
+
+    def __init__(self, account_instance, code_list, db_params, interval=0.1, max_in_flight=10,
+                 overflow_policy=OVERFLOW_SKIP, logger=None, report_interval=60.0, task=execute_task,
+                 controller=None, session_gate=None):
+        """
+        asyncioコレクタークラスのコンストラクタ
+
+        Args:
+            account_instance (object): 立花証券口座クラスのインスタンス
+            code_list (list): 取得する銘柄コードのリスト
+            db_params (dict): データベースへの接続情報が格納された辞書
+            interval (float): タスク実行の間隔（秒）
+            max_in_flight (int): 同時に実行するタスク数の上限
+            overflow_policy (str): 上限に達した場合のポリシー（skip / coalesce / wait）
+            logger (logging.Logger): ロガーインスタンス（省略可能）
+            report_interval (float): 統計をログに出力する間隔（秒）
+            task (callable): 実行するタスク（既定は execute_task）
+            controller (AdaptiveRateController): tickの間隔と同時実行数を調整するコントローラー（省略可能）
+                指定した場合、interval と max_in_flight の代わりにコントローラーの値を使用します。
+            session_gate (SessionGate): 立会時間外に待機するゲート（省略可能、logic.trading_session_logic）
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {OVERFLOW_POLICIES}: {overflow_policy}")
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be 1 or more")
+
+        self.account_instance = account_instance
+        self.code_list = code_list
+        self.db_params = db_params
+        self.interval = interval
+        self.max_in_flight = max_in_flight
+        self.overflow_policy = overflow_policy
+        self.logger = logger
+        self.report_interval = report_interval
+        self.task = task
+        self.controller = controller
+        self.session_gate = session_gate
+
+        self.stats = {
+            "ticks": 0,
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "skipped": 0,
+            "coalesced": 0,
+            "waited_seconds": 0.0,
+            "max_queue_depth": 0,
+        }
+        self._in_flight = set()
+        self._pending = None  # coalesceで保留中のtick
+        self._slot_freed = None
+        self._executor = None
+        self._scheduler = None
+        QUEUE_DEPTH.set_function(self.queue_depth)
+
+    def queue_depth(self):
+        """
+        実行中と保留中のタスク数の合計を返すメソッド
+
+        Returns:
+            int: キューの深さ
+        """
+        return len(self._in_flight) + (1 if self._pending is not None else 0)
+
+    def _limit(self):
+        """
+        現在の同時実行数の上限を返すメソッド
+
+        Returns:
+            int: 同時実行数の上限
+        """
+        return self.max_in_flight if self.controller is None else self.controller.concurrency
+
+    def _submit(self, tick):
+        """
+        タスクをスレッドで実行開始するメソッド
+
+        Args:
+            tick (Tick): 実行するtick
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._executor,
+            functools.partial(self.task, self.account_instance, self.code_list, self.db_params, tick_id=tick.tick_id),
+        )
+        self._in_flight.add(future)
+        future.add_done_callback(self._on_done)
+        self.stats["submitted"] += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.queue_depth())
+
+    def _on_done(self, future):
+        """
+        タスク完了時に呼ばれるコールバック
+
+        Args:
+            future (asyncio.Future): 完了したタスク
+        """
+        self._in_flight.discard(future)
+        # 成功・失敗に関わらず、タスクが終わったことを監視プロセスに知らせる
+        heartbeat()
+        if future.cancelled():
+            self.stats["failed"] += 1
+            TASK_FAILURES.inc()
+        elif future.exception() is not None:
+            self.stats["failed"] += 1
+            TASK_FAILURES.inc()
+            self._log(f"ita task failed: {future.exception()}")
+        else:
+            self.stats["completed"] += 1
+
+        # coalesceで保留中のtickがあれば空いたスロットですぐに実行
+        if self._pending is not None and len(self._in_flight) < self._limit():
+            tick, self._pending = self._pending, None
+            self._submit(tick)
+
+        self._slot_freed.set()
+
+    async def _on_tick(self, tick):
+        """
+        tick毎に呼ばれ、ポリシーに従ってタスクを実行するメソッド
+
+        Args:
+            tick (Tick): 発行されたtick
+        """
+        self.stats["ticks"] += 1
+        TICKS.inc()
+        if len(self._in_flight) < self._limit():
+            self._submit(tick)
+            return
+
+        if self.overflow_policy == OVERFLOW_SKIP:
+            self.stats["skipped"] += 1
+            TICKS_DROPPED.inc(reason="skipped")
+        elif self.overflow_policy == OVERFLOW_COALESCE:
+            if self._pending is not None:
+                self.stats["coalesced"] += 1
+                TICKS_DROPPED.inc(reason="coalesced")
+            # 保留中のtickは最新のtickに置き換える
+            self._pending = tick
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.queue_depth())
+        else:
+            wait_start = time.monotonic()
+            while len(self._in_flight) >= self._limit():
+                self._slot_freed.clear()
+                await self._slot_freed.wait()
+            self.stats["waited_seconds"] += time.monotonic() - wait_start
+            self._submit(tick)
+
+    def _log(self, message, log_level=logging.ERROR):
+        """
+        ロガーが指定されている場合にログを出力するメソッド
+
+        Args:
+            message (str): メッセージ
+            log_level (int): ログレベル
+        """
+        if self.logger is not None:
+            handle_log(self.logger, message, log_level)
+
+    def report(self):
+        """
+        現在の統計をログに出力するメソッド
+        """
+        if self._scheduler is not None:
+            self.stats.update(
+                late_ticks=self._scheduler.stats["late"],
+                missed_ticks=self._scheduler.stats["missed"],
+                max_tick_lateness=round(self._scheduler.stats["max_lateness"], 6),
+            )
+        if self.controller is not None:
+            self.stats.update(rate=self.controller.rate, concurrency_limit=self.controller.concurrency)
+        self._log(f"ita collector stats: queue_depth={self.queue_depth()} {self.stats}", logging.INFO)
+
+    async def _drain(self):
+        """
+        保留中と実行中のタスクがすべて完了するまで待つメソッド
+        """
+        while self._in_flight or self._pending is not None:
+            await asyncio.gather(*list(self._in_flight), return_exceptions=True)
+
+    async def run(self, should_continue):
+        """
+        should_continue()がFalseになるまでtick毎にタスクを実行するメソッド
+
+        Args:
+            should_continue (callable): ループを継続するかどうかを返す関数
+
+        Returns:
+            dict: 実行結果の統計
+        """
+        self._slot_freed = asyncio.Event()
+        max_workers = self.max_in_flight if self.controller is None else self.controller.max_concurrency
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._scheduler = TickScheduler(
+            self.interval if self.controller is None else self.controller.interval(), session_gate=self.session_gate
+        )
+        try:
+            next_report = time.monotonic() + self.report_interval
+            while should_continue():
+                if self.controller is not None:
+                    self._scheduler.set_interval(self.controller.interval())
+                # 次の境界まで待機（waitポリシーで遅れた場合、過ぎた境界は飛ばして missed として数える）
+                tick = await self._scheduler.wait_async()
+                await self._on_tick(tick)
+
+                now = time.monotonic()
+                if now >= next_report:
+                    self.report()
+                    next_report = now + self.report_interval
+
+            await self._drain()
+            self.report()
+        finally:
+            self._executor.shutdown(wait=True)
+        return self.stats
+
+    async def run_once(self):
+        """
+        タスクを1回実行し、完了まで待つメソッド（15時の最終取得用）
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.task, self.account_instance, self.code_list, self.db_params)
+            self.stats["completed"] += 1
+        except Exception as error:
+            self.stats["failed"] += 1
+            self._log(f"ita task failed: {error}")
+
+
+async def run_async_collector(account_instance, code_list, db_params, should_continue, interval=0.1,
+                              max_in_flight=10, overflow_policy=OVERFLOW_SKIP, logger=None, task=execute_task,
+                              controller=None, session_gate=None):
+    """
+    asyncioコレクターを市場終了まで実行し、最後に1回だけタスクを実行する関数
+
+    Args:
+        account_instance (object): 立花証券口座クラスのインスタンス
+        code_list (list): 取得する銘柄コードのリスト
+        db_params (dict): データベースへの接続情報が格納された辞書
+        should_continue (callable): ループを継続するかどうかを返す関数
+        interval (float): タスク実行の間隔（秒）
+        max_in_flight (int): 同時に実行するタスク数の上限
+        overflow_policy (str): 上限に達した場合のポリシー（skip / coalesce / wait）
+        logger (logging.Logger): ロガーインスタンス（省略可能）
+        task (callable): 実行するタスク（既定は execute_task）
+        controller (AdaptiveRateController): tickの間隔と同時実行数を調整するコントローラー（省略可能）
+        session_gate (SessionGate): 立会時間外に待機するゲート（省略可能）
+
+    Returns:
+        dict: 実行結果の統計
+    """
+    collector = AsyncItaCollector(
+        account_instance, code_list, db_params,
+        interval=interval, max_in_flight=max_in_flight, overflow_policy=overflow_policy, logger=logger, task=task,
+        controller=controller, session_gate=session_gate,
+    )
+    await collector.run(should_continue)
+    await collector.run_once()
+    return collector.stats
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、前回保存した板から変化のない銘柄のスナップショットを間引くフィルタを提供するモジュールです。
+
+ファイル内の主な処理ステップ:
+1. 銘柄毎に、前回保存した行の全カラム（現値・出来高・気配・10本の板）のフィンガープリントを保持します。
+2. フィンガープリントが前回と同じ行は保存せずに捨てます。
+3. 変化がなくても、前回の保存から heartbeat_seconds 秒が経過した銘柄は生存確認として保存します。
+4. 並行タスクが同じ p_rv_date（created_at）の応答を返した場合や、古い応答が遅れて届いた場合は重複として捨てます。
+5. 保存する行のフィンガープリントは、書き込みが確定するまで「書き込み中」として保持し、同じ内容の行が
+   重ねて書き込まれないようにします。書き込みが確定したら commit(rows) で前回保存した行として記録し、
+   失敗した場合（ライトビハインドバッファで捨てられた場合を含む）は rollback(rows) で取り消します。
+
+注意事項:
+- フィルタはプロセス内で共有され、スレッドセーフです。
+- 書き込みに失敗した行のフィンガープリントは記録されないため、次に届いた同じ内容の行は保存されます。
+- stats() で、間引いた件数と保存した件数を確認できます。
+"""
+import threading
+import time
+from database.insert_ita_database import ITA_ITEM_KEYS
+from utilities.metrics import counter
+
+ROWS_SUPPRESSED = counter("ita_rows_suppressed_total", "Rows skipped by the change filter.")
+
+# フィンガープリントの対象とするキー（tick_id以外の全カラム）
+FINGERPRINT_KEYS = tuple(key for key in ITA_ITEM_KEYS if key not in ("sIssueCode", "tick_id"))
+
+# 既定値
+DEFAULT_HEARTBEAT_SECONDS = 60.0
+
+
+class SnapshotChangeFilter:
+    """
+    銘柄毎のフィンガープリントで変化のないスナップショットを間引くフィルタクラス
+
+    Attributes:
+        heartbeat_seconds (float): 変化がなくてもこの秒数毎に1行保存する（0以下の場合は保存しない）
+
+    Methods:
+        filter(rows): 保存すべき行だけを返すメソッド
+        commit(rows): 書き込みが確定した行を前回保存した行として記録するメソッド
+        rollback(rows): 書き込みに失敗した行の「書き込み中」の記録を取り消すメソッド
+        stats(): 間引いた件数などの統計を返すメソッド
+    """
+
+    def __init__(self, heartbeat_seconds=DEFAULT_HEARTBEAT_SECONDS):
+        """
+        フィルタクラスのコンストラクタ
+
+        Args:
+            heartbeat_seconds (float): 変化がなくてもこの秒数毎に1行保存する
+        """
+        self.heartbeat_seconds = heartbeat_seconds
+        self._lock = threading.Lock()
+        # 銘柄コード -> (書き込みが確定したフィンガープリント, 確定した時刻, その行のcreated_at)
+        self._last = {}
+        # 銘柄コード -> 書き込み中のフィンガープリント
+        self._pending = {}
+        # 銘柄コード -> 最新のcreated_at（重複の判定用）
+        self._latest = {}
+        self._stats = {
+            "seen": 0,
+            "stored": 0,
+            "heartbeats": 0,
+            "suppressed_unchanged": 0,
+            "suppressed_duplicate": 0,
+            "rolled_back": 0,
+        }
+
+    @staticmethod
+    def fingerprint(row):
+        """
+        行のフィンガープリントを返す関数
+
+        Args:
+            row (dict): 株価データの辞書
+
+        Returns:
+            tuple: フィンガープリント
+        """
+        return tuple(row.get(key) for key in FINGERPRINT_KEYS)
+
+    def filter(self, rows):
+        """
+        保存すべき行だけを返すメソッド（返した行は書き込み後に commit / rollback を呼び出します）
+
+        Args:
+            rows (list): 株価データの辞書のリスト
+
+        Returns:
+            list: 保存すべき行のリスト
+        """
+        now = time.monotonic()
+        stored = []
+        with self._lock:
+            for row in rows:
+                self._stats["seen"] += 1
+                code = row.get("sIssueCode")
+                created_at = row.get("created_at")
+
+                # 同じ時刻または古い時刻の応答は重複として捨てる
+                latest = self._latest.get(code)
+                if created_at is not None and latest is not None and created_at <= latest:
+                    self._stats["suppressed_duplicate"] += 1
+                    continue
+                if created_at is not None:
+                    self._latest[code] = created_at
+
+                fingerprint = self.fingerprint(row)
+                # 同じ内容の行を書き込み中の場合は捨てる
+                if self._pending.get(code) == fingerprint:
+                    self._stats["suppressed_unchanged"] += 1
+                    continue
+                last = self._last.get(code)
+                if last is not None and fingerprint == last[0]:
+                    if self.heartbeat_seconds <= 0 or now - last[1] < self.heartbeat_seconds:
+                        self._stats["suppressed_unchanged"] += 1
+                        continue
+                    self._stats["heartbeats"] += 1
+
+                self._pending[code] = fingerprint
+                self._stats["stored"] += 1
+                stored.append(row)
+        ROWS_SUPPRESSED.inc(len(rows) - len(stored))
+        return stored
+
+    def commit(self, rows):
+        """
+        書き込みが確定した行を前回保存した行として記録するメソッド
+
+        Args:
+            rows (list): 書き込みが確定した株価データの辞書のリスト
+        """
+        now = time.monotonic()
+        with self._lock:
+            for row in rows:
+                code = row.get("sIssueCode")
+                created_at = row.get("created_at")
+                fingerprint = self.fingerprint(row)
+                if self._pending.get(code) == fingerprint:
+                    del self._pending[code]
+                last = self._last.get(code)
+                # 遅れて確定した古い行で、新しい行の記録を上書きしない
+                if last is not None and created_at is not None and last[2] is not None and created_at < last[2]:
+                    continue
+                self._last[code] = (fingerprint, now, created_at)
+
+    def rollback(self, rows):
+        """
+        書き込みに失敗した行の「書き込み中」の記録を取り消すメソッド
+
+        Args:
+            rows (list): 書き込みに失敗した株価データの辞書のリスト
+        """
+        with self._lock:
+            for row in rows:
+                code = row.get("sIssueCode")
+                if self._pending.get(code) == self.fingerprint(row):
+                    del self._pending[code]
+                self._stats["rolled_back"] += 1
+
+    def stats(self):
+        """
+        間引いた件数などの統計を返すメソッド
+
+        Returns:
+            dict: 統計（suppressed_ratio は間引いた行の割合）
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        suppressed = stats["suppressed_unchanged"] + stats["suppressed_duplicate"]
+        stats["suppressed_ratio"] = suppressed / stats["seen"] if stats["seen"] else 0.0
+        return stats
@@ -0,0 +1,448 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、master_stock_tableのapi_id毎に株価データの取得プロセスを起動し、監視・再起動するモジュールです。
+
+ファイル内の主な処理ステップ:
+1. api_id毎に、その口座の認証情報・セッションファイル・ログファイル・メトリクスファイルを設定した環境変数で
+   取得プロセス（entry_points.insert_ita_data_entry）を起動します。各プロセスは自分のapi_idの銘柄だけを取得します。
+2. 取得を続ける時間内（should_continue()がTrueの間）にプロセスが終了した場合は、待ち時間を倍にしながら
+   （上限 max_backoff 秒）再起動します。stable_seconds 秒以上動いていたプロセスは待ち時間を戻します。
+   短時間で終了することが max_restarts 回続いた口座は、設定の誤り等とみなして再起動をやめます。
+3. 終了していなくても、メトリクスファイルの ita_heartbeat_timestamp_seconds（タスクの完了時や立会時間外の
+   待機中に更新されます）が heartbeat_timeout 秒以上更新されないプロセスは、応答のない状態とみなして
+   強制終了し、2. と同じく再起動します。起動直後はプロセスの起動時刻から数えます。
+4. report_interval 秒毎に、各プロセスが書き出したメトリクスファイルを読み込み、口座毎と合計の書き込み行数・
+   行数/秒・失敗件数等を1つのレポートにまとめます。
+
+注意事項:
+- 口座の認証情報は環境変数 TACHIBANA_PASSWORD_<API_ID> / TACHIBANA_PASSWORD2_<API_ID> で指定します
+  （API_IDは英数字以外を _ に置き換えた大文字）。TACHIBANA_USERID と同じapi_idは TACHIBANA_PASSWORD /
+  TACHIBANA_PASSWORD2 も使用できます。認証情報のない口座は起動しません。
+- 各プロセスには自分の口座の認証情報だけを渡し、他の口座の認証情報は環境変数から取り除きます。
+- ITA_METRICS_PORT は取得プロセスには渡しません（ポートが重複するため）。監視側で合計を公開してください。
+"""
+import logging
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+from utilities.metrics import HEARTBEAT, counter, gauge, parse_prometheus
+from utilities.utility import handle_log
+
+COLLECTORS_RUNNING = gauge("ita_supervisor_collectors_running", "Collector processes that are currently running.")
+COLLECTOR_RESTARTS = counter("ita_supervisor_restarts_total", "Collector process restarts by account.")
+ACCOUNT_ROWS = gauge("ita_account_rows_written", "Rows written to ita_table by the collector of each account.")
+ACCOUNT_ROWS_PER_SECOND = gauge(
+    "ita_account_rows_per_second", "Rows written per second by the collector of each account."
+)
+COLLECTOR_STALE_KILLS = counter(
+    "ita_supervisor_stale_kills_total", "Collector processes killed because their heartbeat stopped."
+)
+
+# 既定値
+DEFAULT_COMMAND = (sys.executable, "-m", "entry_points.insert_ita_data_entry")
+DEFAULT_RUN_DIR = "/src/supervisor"
+DEFAULT_RESTART_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 60.0
+DEFAULT_STABLE_SECONDS = 60.0
+DEFAULT_MAX_RESTARTS = 5
+DEFAULT_REPORT_INTERVAL = 10.0
+DEFAULT_STOP_TIMEOUT = 30.0
+DEFAULT_HEARTBEAT_TIMEOUT = 180.0
+
+# レポートに集計するメトリクス: レポートの項目名 -> メトリクス名
+REPORT_METRICS = {
+    "rows_written": "ita_rows_written_total",
+    "db_write_failures": "ita_db_write_failures_total",
+    "task_failures": "ita_task_failures_total",
+    "shard_failures": "ita_shard_failures_total",
+    "ticks_missed": "ita_ticks_missed_total",
+    "rows_dropped": "ita_rows_dropped_total",
+    "logins": "ita_session_logins_total",
+    "stream_reconnects": "ita_stream_reconnects_total",
+}
+
+
+def _env_suffix(api_id):
+    return re.sub(r"[^0-9A-Za-z]", "_", str(api_id)).upper()
+
+
+def account_credentials(api_id, environ=None):
+    """
+    api_idの口座のパスワードを環境変数から取得する関数
+
+    Args:
+        api_id (str): 口座のapi_id（立花証券のユーザーID）
+        environ (dict): 環境変数（省略時は os.environ）
+
+    Returns:
+        tuple: (パスワード, 第2パスワード)。認証情報がない場合はNone
+    """
+    environ = os.environ if environ is None else environ
+    suffix = _env_suffix(api_id)
+    password = environ.get(f"TACHIBANA_PASSWORD_{suffix}")
+    password2 = environ.get(f"TACHIBANA_PASSWORD2_{suffix}")
+    if password is None and environ.get("TACHIBANA_USERID") == str(api_id):
+        password = environ.get("TACHIBANA_PASSWORD")
+        password2 = environ.get("TACHIBANA_PASSWORD2")
+    if not password or not password2:
+        return None
+    return password, password2
+
+
+def collector_environment(api_id, credentials, run_dir, environ=None):
+    """
+    api_idの取得プロセスに渡す環境変数を作成する関数
+
+    Args:
+        api_id (str): 口座のapi_id
+        credentials (tuple): (パスワード, 第2パスワード)
+        run_dir (str): ログ・セッション・メトリクスのファイルを置くディレクトリ
+        environ (dict): 元にする環境変数（省略時は os.environ）
+
+    Returns:
+        dict: 取得プロセスの環境変数
+    """
+    environ = os.environ if environ is None else environ
+    suffix = _env_suffix(api_id)
+    # 他の口座の認証情報は渡さない
+    env = {
+        key: value for key, value in environ.items()
+        if not key.startswith(("TACHIBANA_PASSWORD_", "TACHIBANA_PASSWORD2_")) and key != "ITA_METRICS_PORT"
+    }
+    env.update(
+        TACHIBANA_USERID=str(api_id),
+        TACHIBANA_PASSWORD=credentials[0],
+        TACHIBANA_PASSWORD2=credentials[1],
+        ITA_LOG_FILE=os.path.join(run_dir, f"insert_ita_{suffix}.log"),
+        ITA_METRICS_FILE=os.path.join(run_dir, f"metrics_{suffix}.prom"),
+    )
+    env.setdefault("ITA_METRICS_DUMP_INTERVAL", str(DEFAULT_REPORT_INTERVAL))
+    # セッションの保存を無効にしている場合（空文字列）以外は口座毎のファイルに保存する
+    if environ.get("TACHIBANA_SESSION_FILE", None) != "":
+        env["TACHIBANA_SESSION_FILE"] = os.path.join(run_dir, f"tachibana_session_{suffix}.json")
+    if environ.get("ITA_JOURNAL_DIR"):
+        env["ITA_JOURNAL_DIR"] = os.path.join(environ["ITA_JOURNAL_DIR"], suffix)
+    return env
+
+
+class CollectorProcess:
+    """
+    1つの口座の取得プロセスの状態を保持するクラス
+
+    Attributes:
+        api_id (str): 口座のapi_id
+        env (dict): プロセスの環境変数
+        process (subprocess.Popen): 実行中のプロセス（未起動・終了後はNone）
+        restarts (int): 再起動した回数
+        failures (int): 短時間での終了が続いた回数
+        backoff (float): 次に再起動するまでの待ち時間（秒）
+        restart_at (float): 再起動する時刻（time.monotonic()、予定がない場合はNone）
+        exit_codes (list): 終了したプロセスの終了コード
+        gave_up (bool): 再起動をやめた場合はTrue
+        stale_kills (int): 応答がないため強制終了した回数
+    """
+
+    def __init__(self, api_id, env, backoff):
+        self.api_id = api_id
+        self.env = env
+        self.process = None
+        self.started_at = None
+        self.started_wall = None
+        self.next_liveness_check = None
+        self.restarts = 0
+        self.failures = 0
+        self.backoff = backoff
+        self.restart_at = None
+        self.exit_codes = []
+        self.gave_up = False
+        self.stale_kills = 0
+        self.last_report = None
+
+    @property
+    def running(self):
+        return self.process is not None
+
+
+class CollectorSupervisor:
+    """
+    api_id毎の取得プロセスを起動し、監視・再起動するクラス
+
+    Attributes:
+        collectors (dict): api_id -> CollectorProcess
+        skipped (list): 認証情報がないため起動しなかったapi_id
+
+    Methods:
+        run(should_continue): 取得プロセスを起動し、すべて終了するまで監視するメソッド
+        poll(should_continue): 終了したプロセスを検出し、必要であれば再起動するメソッド
+        report(): 口座毎と合計の取得状況を返すメソッド
+        stop(): すべてのプロセスを停止するメソッド
+    """
+
+    def __init__(self, api_ids, run_dir=DEFAULT_RUN_DIR, command=DEFAULT_COMMAND, environ=None,
+                 restart_backoff=DEFAULT_RESTART_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF,
+                 stable_seconds=DEFAULT_STABLE_SECONDS, max_restarts=DEFAULT_MAX_RESTARTS,
+                 report_interval=DEFAULT_REPORT_INTERVAL, stop_timeout=DEFAULT_STOP_TIMEOUT,
+                 heartbeat_timeout=DEFAULT_HEARTBEAT_TIMEOUT, logger=None):
+        """
+        取得プロセスの監視クラスのコンストラクタ
+
+        Args:
+            api_ids (list): 取得プロセスを起動するapi_idのリスト
+            run_dir (str): ログ・セッション・メトリクスのファイルを置くディレクトリ
+            command (tuple): 取得プロセスのコマンド
+            environ (dict): 元にする環境変数（省略時は os.environ）
+            restart_backoff (float): 再起動までの最初の待ち時間（秒）
+            max_backoff (float): 再起動までの待ち時間の上限（秒）
+            stable_seconds (float): この秒数以上動いたプロセスの終了は、待ち時間と失敗回数を戻す
+            max_restarts (int): 短時間での終了がこの回数続いた口座は再起動をやめる
+            report_interval (float): レポートを作成する間隔（秒）
+            stop_timeout (float): 停止を指示してから強制終了するまでの待ち時間（秒）
+            heartbeat_timeout (float): 生存確認の時刻がこの秒数以上更新されないプロセスを強制終了する（Noneの場合は確認しない）
+            logger (logging.Logger): ロガーインスタンス（省略可能）
+        """
+        environ = os.environ if environ is None else environ
+        self.run_dir = run_dir
+        self.command = list(command)
+        self.restart_backoff = restart_backoff
+        self.max_backoff = max_backoff
+        self.stable_seconds = stable_seconds
+        self.max_restarts = max_restarts
+        self.report_interval = report_interval
+        self.stop_timeout = stop_timeout
+        self.heartbeat_timeout = heartbeat_timeout
+        self.logger = logger
+
+        os.makedirs(run_dir, exist_ok=True)
+        self.collectors = {}
+        self.skipped = []
+        for api_id in api_ids:
+            credentials = account_credentials(api_id, environ)
+            if credentials is None:
+                self.skipped.append(api_id)
+                self._log(f"no credentials for api_id {api_id}, collector is not started", logging.WARNING)
+                continue
+            env = collector_environment(api_id, credentials, run_dir, environ)
+            self.collectors[api_id] = CollectorProcess(api_id, env, restart_backoff)
+        self._started_at = time.monotonic()
+
+    def _log(self, message, log_level=logging.INFO):
+        if self.logger is not None:
+            handle_log(self.logger, message, log_level)
+
+    def _start(self, collector):
+        """
+        取得プロセスを起動するメソッド
+
+        Args:
+            collector (CollectorProcess): 起動するプロセスの状態
+        """
+        collector.process = subprocess.Popen(self.command, env=collector.env)
+        collector.started_at = time.monotonic()
+        collector.started_wall = time.time()
+        collector.next_liveness_check = collector.started_at + self.report_interval
+        collector.restart_at = None
+        self._log(f"collector for api_id {collector.api_id} started (pid {collector.process.pid})")
+
+    def _running_count(self):
+        return sum(1 for collector in self.collectors.values() if collector.running)
+
+    def _check_liveness(self, collector, now):
+        """
+        生存確認の時刻が heartbeat_timeout 秒以上更新されていないプロセスを強制終了するメソッド
+
+        Args:
+            collector (CollectorProcess): 実行中のプロセスの状態
+            now (float): 現在時刻（time.monotonic()）
+        """
+        if self.heartbeat_timeout is None or now < collector.next_liveness_check:
+            return
+        collector.next_liveness_check = now + self.report_interval
+        last_seen = max(collector.started_wall, self._read_samples(collector).get((HEARTBEAT.name, ()), 0.0))
+        silence = time.time() - last_seen
+        if silence < self.heartbeat_timeout:
+            return
+        collector.stale_kills += 1
+        COLLECTOR_STALE_KILLS.inc(account=collector.api_id)
+        self._log(
+            f"collector for api_id {collector.api_id} has not reported progress for {silence:.0f}s, killing it",
+            logging.WARNING,
+        )
+        collector.process.kill()
+        collector.process.wait()
+
+    def poll(self, should_continue):
+        """
+        終了したプロセスと応答のないプロセスを検出し、必要であれば再起動するメソッド
+
+        Args:
+            should_continue (callable): 取得を続ける時間内かどうかを返す関数（Falseの場合は再起動しない）
+        """
+        now = time.monotonic()
+        for collector in self.collectors.values():
+            if collector.running:
+                if collector.process.poll() is None:
+                    self._check_liveness(collector, now)
+                exit_code = collector.process.poll()
+                if exit_code is None:
+                    continue
+                collector.process = None
+                collector.exit_codes.append(exit_code)
+                if not should_continue():
+                    self._log(f"collector for api_id {collector.api_id} finished (exit code {exit_code})")
+                    continue
+                # 取得を続ける時間内の終了は失敗とみなして再起動する
+                if now - collector.started_at >= self.stable_seconds:
+                    collector.failures = 0
+                    collector.backoff = self.restart_backoff
+                collector.failures += 1
+                if collector.failures > self.max_restarts:
+                    collector.gave_up = True
+                    self._log(
+                        f"collector for api_id {collector.api_id} exited {collector.failures} times in a row, "
+                        "giving up"
+                    )
+                    continue
+                collector.restart_at = now + collector.backoff
+                self._log(
+                    f"collector for api_id {collector.api_id} exited (exit code {exit_code}), "
+                    f"restarting in {collector.backoff:.1f}s",
+                    logging.WARNING,
+                )
+                collector.backoff = min(collector.backoff * 2, self.max_backoff)
+            elif collector.restart_at is not None and now >= collector.restart_at:
+                if not should_continue():
+                    collector.restart_at = None
+                    continue
+                collector.restarts += 1
+                COLLECTOR_RESTARTS.inc(account=collector.api_id)
+                self._start(collector)
+        COLLECTORS_RUNNING.set(self._running_count())
+
+    def _read_samples(self, collector):
+        """
+        取得プロセスが書き出したメトリクスファイルを読み込むメソッド
+
+        Args:
+            collector (CollectorProcess): プロセスの状態
+
+        Returns:
+            dict: (メトリクス名, ラベルのタプル) -> 値（ファイルがない場合は空の辞書）
+        """
+        try:
+            with open(collector.env["ITA_METRICS_FILE"]) as file:
+                return parse_prometheus(file.read())
+        except OSError:
+            return {}
+
+    def _read_metrics(self, collector):
+        """
+        取得プロセスが書き出したメトリクスファイルから、レポートの項目を集計するメソッド
+
+        Args:
+            collector (CollectorProcess): プロセスの状態
+
+        Returns:
+            dict: レポートの項目名 -> 値（ラベルは合計）
+        """
+        values = dict.fromkeys(REPORT_METRICS, 0.0)
+        samples = self._read_samples(collector)
+        names = {name: key for key, name in REPORT_METRICS.items()}
+        for (name, _), value in samples.items():
+            if name in names:
+                values[names[name]] += value
+        return values
+
+    def report(self):
+        """
+        口座毎と合計の取得状況を返すメソッド
+
+        行数/秒は前回のレポートからの差分で計算します（プロセスが再起動して値が戻った場合は0とします）。
+
+        Returns:
+            dict: accounts（api_id毎の状況）と total（合計）
+        """
+        now = time.monotonic()
+        accounts = {}
+        total = dict.fromkeys(REPORT_METRICS, 0.0)
+        total.update(rows_per_second=0.0, running=0, restarts=0)
+        for api_id, collector in self.collectors.items():
+            values = self._read_metrics(collector)
+            previous = collector.last_report
+            rows_per_second = 0.0
+            if previous is not None and now > previous[0] and values["rows_written"] >= previous[1]:
+                rows_per_second = (values["rows_written"] - previous[1]) / (now - previous[0])
+            collector.last_report = (now, values["rows_written"])
+            values.update(
+                rows_per_second=round(rows_per_second, 2),
+                running=int(collector.running),
+                restarts=collector.restarts,
+                stale_kills=collector.stale_kills,
+                gave_up=collector.gave_up,
+                exit_codes=list(collector.exit_codes),
+            )
+            accounts[api_id] = values
+            ACCOUNT_ROWS.set(values["rows_written"], account=api_id)
+            ACCOUNT_ROWS_PER_SECOND.set(values["rows_per_second"], account=api_id)
+            for key in total:
+                total[key] += values[key]
+        total["rows_per_second"] = round(total["rows_per_second"], 2)
+        return {
+            "accounts": accounts,
+            "total": total,
+            "skipped": list(self.skipped),
+            "uptime": round(now - self._started_at, 1),
+        }
+
+    def stop(self):
+        """
+        すべてのプロセスを停止するメソッド（SIGINTで終了処理を促し、stop_timeout 秒後に強制終了します）
+        """
+        for collector in self.collectors.values():
+            collector.restart_at = None
+            if collector.running:
+                collector.process.send_signal(signal.SIGINT)
+        deadline = time.monotonic() + self.stop_timeout
+        for collector in self.collectors.values():
+            if not collector.running:
+                continue
+            try:
+                collector.process.wait(timeout=max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                self._log(f"collector for api_id {collector.api_id} did not stop, killing it", logging.WARNING)
+                collector.process.kill()
+                collector.process.wait()
+            collector.exit_codes.append(collector.process.returncode)
+            collector.process = None
+        COLLECTORS_RUNNING.set(0)
+
+    def run(self, should_continue, poll_interval=0.5):
+        """
+        取得プロセスを起動し、すべて終了するまで監視するメソッド
+
+        取得を続ける時間を過ぎた後は再起動せず、各プロセスが最後の取得を終えて終了するのを待ちます。
+
+        Args:
+            should_continue (callable): 取得を続ける時間内かどうかを返す関数
+            poll_interval (float): プロセスの状態を確認する間隔（秒）
+
+        Returns:
+            dict: 最後のレポート
+        """
+        for collector in self.collectors.values():
+            self._start(collector)
+        next_report = time.monotonic() + self.report_interval
+        try:
+            while any(
+                collector.running or collector.restart_at is not None for collector in self.collectors.values()
+            ):
+                time.sleep(poll_interval)
+                self.poll(should_continue)
+                if time.monotonic() >= next_report:
+                    next_report += self.report_interval
+                    self._log(f"collector report: {self.report()}")
+        finally:
+            self.stop()
+        return self.report()
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、プッシュ配信（sUrlEvent）で受信した時価情報から銘柄毎の最新の板を保持し、変化した銘柄だけを書き込むモジュールです。
+
+ファイル内の主な処理ステップ:
+1. 銘柄を MAX_CODES_PER_STREAM 件毎に分け、購読毎に受信スレッドを起動します。
+2. 受信したFDメッセージの項目（p_<行番号>_<項目名>）を、銘柄毎の最新の板（get_stock_data と同じ形式の辞書）に反映します。
+3. flush_interval 秒毎に、前回から変化した銘柄の板だけを1つのtick_idで persist（make_persist）に渡します。
+4. 切断やエラーの場合は、待ち時間を倍にしながら（上限 max_backoff 秒）再接続し、同じ銘柄を購読し直します。
+   購読の開始時にはすべての項目が配信されるため、切断中の変化も再接続後の最初の書き込みに反映されます。
+   セッション切れの場合は、セッション管理（http_requests.session_manager）があれば再ログインしてから購読し直します。
+
+注意事項:
+- 板が変化しない銘柄は要求も書き込みも行わないため、全銘柄を一定間隔で取得するポーリングよりAPIの負荷が小さくなります。
+- created_at には、その銘柄の最後のメッセージの p_date を設定します。
+"""
+import logging
+import threading
+import time
+import requests
+from http_requests.event_stream import MAX_CODES_PER_STREAM, DEFAULT_STREAM_READ_TIMEOUT, stream_events
+from http_requests.market_price_decoder import parse_p_rv_date
+from logic.sharded_fetch_logic import next_tick_id
+from utilities.metrics import counter, gauge, heartbeat
+from utilities.utility import handle_log
+
+STREAM_MESSAGES = counter("ita_stream_messages_total", "Messages received from the event stream by p_cmd.")
+STREAM_RECONNECTS = counter("ita_stream_reconnects_total", "Event stream reconnects.")
+STREAM_CONNECTED = gauge("ita_stream_connected", "Event stream subscriptions that are currently connected.")
+
+# 既定値（秒）
+DEFAULT_FLUSH_INTERVAL = 0.1
+DEFAULT_INITIAL_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 30.0
+
+
+class EventStreamIngestor:
+    """
+    プッシュ配信で受信した時価情報から銘柄毎の最新の板を保持し、変化した銘柄を書き込むクラス
+
+    Attributes:
+        code_list (list): 購読する銘柄コードのリスト
+        flush_interval (float): 変化した銘柄を書き込む間隔（秒）
+        stats (dict): 受信したメッセージ数、書き込んだ行数、再接続の回数等（_lock を取得して更新します）
+
+    Methods:
+        run(should_continue): should_continue()がFalseになるまで購読と書き込みを続けるメソッド
+        latest(code): 銘柄の最新の板を返すメソッド
+        flush(): 前回から変化した銘柄の板を書き込むメソッド
+    """
+
+    def __init__(self, account_instance, code_list, persist, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 max_codes_per_stream=MAX_CODES_PER_STREAM, read_timeout=DEFAULT_STREAM_READ_TIMEOUT,
+                 initial_backoff=DEFAULT_INITIAL_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF, logger=None):
+        """
+        プッシュ配信の取り込みクラスのコンストラクタ
+
+        Args:
+            account_instance (ClassTachibanaAccount): 立花証券口座クラスのインスタンス（event_url を使用）
+            code_list (list): 購読する銘柄コードのリスト
+            persist (callable): 行のリストを書き込む関数（logic.insert_ita_logic.make_persist）
+            flush_interval (float): 変化した銘柄を書き込む間隔（秒）
+            max_codes_per_stream (int): 1つの購読の銘柄数
+            read_timeout (float): この秒数メッセージが届かない場合は切断とみなす
+            initial_backoff (float): 再接続までの最初の待ち時間（秒）
+            max_backoff (float): 再接続までの待ち時間の上限（秒）
+            logger (logging.Logger): ロガーインスタンス（省略可能）
+        """
+        self.account_instance = account_instance
+        self.code_list = [str(code) for code in code_list]
+        self.persist = persist
+        self.flush_interval = flush_interval
+        self.max_codes_per_stream = min(max_codes_per_stream, MAX_CODES_PER_STREAM)
+        self.read_timeout = read_timeout
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.logger = logger
+
+        self.stats = {"messages": 0, "updates": 0, "rows": 0, "flushes": 0, "reconnects": 0, "flush_failures": 0}
+        self._boards = {code: {"sIssueCode": code, "created_at": None} for code in self.code_list}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _log(self, message, log_level=logging.ERROR):
+        if self.logger is not None:
+            handle_log(self.logger, message, log_level)
+
+    def latest(self, code):
+        """
+        銘柄の最新の板を返すメソッド
+
+        Args:
+            code (str): 銘柄コード
+
+        Returns:
+            dict: get_stock_data と同じ形式の辞書のコピー（未受信の場合はNone）
+        """
+        with self._lock:
+            board = self._boards.get(str(code))
+            return None if board is None or board["created_at"] is None else dict(board)
+
+    def _apply(self, message, row_codes):
+        """
+        FDメッセージの項目を銘柄毎の最新の板に反映するメソッド
+
+        Args:
+            message (dict): メッセージの辞書
+            row_codes (dict): 行番号（文字列） -> 銘柄コード
+        """
+        created_at = parse_p_rv_date(message["p_date"]) if message.get("p_date") else None
+        updates = 0
+        with self._lock:
+            for key, value in message.items():
+                # p_<行番号>_<項目名> 以外（p_no / p_date / p_cmd 等）は読み飛ばす
+                row, separator, column = key[2:].partition("_")
+                code = row_codes.get(row) if separator else None
+                if code is None:
+                    continue
+                board = self._boards[code]
+                board["p" + column] = value if value != "" else None
+                if created_at is not None:
+                    board["created_at"] = created_at
+                self._dirty.add(code)
+                updates += 1
+            self.stats["updates"] += updates
+
+    def flush(self):
+        """
+        前回から変化した銘柄の板を1つのtick_idで書き込むメソッド
+
+        Returns:
+            int: 書き込みに渡した行数
+        """
+        with self._lock:
+            codes = [code for code in self._dirty if self._boards[code]["created_at"] is not None]
+            self._dirty.difference_update(codes)
+            if not codes:
+                return 0
+            tick_id = next_tick_id()
+            rows = [dict(self._boards[code], tick_id=tick_id) for code in codes]
+        try:
+            self.persist(rows)
+        except Exception as error:
+            # 書き込めなかった銘柄は次回の書き込み対象に戻す
+            with self._lock:
+                self._dirty.update(codes)
+                self.stats["flush_failures"] += 1
+            self._log(f"failed to persist streamed rows: {error}")
+            return 0
+        with self._lock:
+            self.stats["flushes"] += 1
+            self.stats["rows"] += len(rows)
+        return len(rows)
+
+    def _check_errno(self, message, generation):
+        """
+        メッセージのp_errnoが0以外の場合に、必要であれば再ログインして例外を発生させるメソッド
+
+        Args:
+            message (dict): メッセージの辞書
+            generation (int): 購読を開始した時点のセッションの generation
+        """
+        errno = message.get("p_errno", "0") or "0"
+        if errno == "0":
+            return
+        session = getattr(self.account_instance, "session", None)
+        if session is not None and int(errno) in session.invalid_errnos:
+            session.relogin(generation)
+        raise ValueError(f"event stream error: p_errno={errno} p_err={message.get('p_err')}")
+
+    def _subscribe(self, codes):
+        """
+        銘柄を購読し、切断やエラーの場合は再接続して購読し直すメソッド（受信スレッドで実行）
+
+        Args:
+            codes (list): 購読する銘柄コードのリスト
+        """
+        row_codes = {str(row): code for row, code in enumerate(codes, 1)}
+        backoff = self.initial_backoff
+        while not self._stop.is_set():
+            # 再ログイン中であれば完了を待ってから購読する
+            session = getattr(self.account_instance, "session", None)
+            generation = None if session is None else session.wait_ready()
+            connected = False
+            try:
+                for message in stream_events(self.account_instance.event_url, codes, read_timeout=self.read_timeout):
+                    if not connected:
+                        connected = True
+                        STREAM_CONNECTED.inc()
+                    command = message.get("p_cmd", "")
+                    with self._lock:
+                        self.stats["messages"] += 1
+                    STREAM_MESSAGES.inc(cmd=command)
+                    self._check_errno(message, generation)
+                    if command == "FD":
+                        self._apply(message, row_codes)
+                    # メッセージを受信できたら待ち時間を戻す
+                    backoff = self.initial_backoff
+                    if self._stop.is_set():
+                        break
+                else:
+                    if not self._stop.is_set():
+                        raise ConnectionError("event stream closed by the server")
+            except (requests.exceptions.RequestException, OSError, ValueError) as error:
+                if self._stop.is_set():
+                    break
+                with self._lock:
+                    self.stats["reconnects"] += 1
+                STREAM_RECONNECTS.inc()
+                self._log(f"event stream disconnected ({error}), reconnecting in {backoff:.1f}s", logging.WARNING)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            finally:
+                if connected:
+                    STREAM_CONNECTED.dec()
+
+    def run(self, should_continue):
+        """
+        should_continue()がFalseになるまで購読と書き込みを続けるメソッド
+
+        Args:
+            should_continue (callable): 継続するかどうかを返す関数
+
+        Returns:
+            dict: 統計
+        """
+        size = self.max_codes_per_stream
+        threads = [
+            threading.Thread(
+                target=self._subscribe, args=(self.code_list[start:start + size],),
+                name=f"ita-stream-{start // size}", daemon=True,
+            )
+            for start in range(0, len(self.code_list), size)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            next_flush = time.monotonic()
+            while should_continue():
+                # 書き込みが間隔より遅れた場合は遅れた時点から数え直す
+                next_flush = max(next_flush + self.flush_interval, time.monotonic())
+                self._stop.wait(max(next_flush - time.monotonic(), 0))
+                self.flush()
+                heartbeat()
+        finally:
+            # 受信スレッドは次のメッセージ（KPを含む）を受信した時点で終了する
+            self._stop.set()
+            for thread in threads:
+                thread.join(timeout=self.read_timeout)
+            self.flush()
+        with self._lock:
+            return dict(self.stats)
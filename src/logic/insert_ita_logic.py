@@ -13,8 +13,10 @@
 - タスクの実行中にエラーが発生した場合、適切な例外が発生し、エラーがログに記録されます。
 
 提供される関数:
+- make_persist: 取得した株価データの書き込み先（リングバッファ → 変化のフィルタ → バッファまたはデータベース）を返す関数
 - execute_task: 指定されたアカウントインスタンスやコードリスト、接続情報を使用してタスクを実行する関数
 - get_target_code_list: 指定したapi_id_valueを持つmaster_stock_tableのcodeを取得する関数
+- get_api_id_list: master_stock_tableに設定されているapi_idを重複なく取得する関数
 - login: ログインを行い、立花証券口座クラスのインスタンスを返す関数
 
 関数の引数や戻り値についての詳細な説明が記述されています。
@@ -25,12 +27,68 @@
 - utilities.custom_exceptions: カスタム例外クラスを提供するモジュール
 """
 
-from database.insert_ita_database import insert_rows, search_codes_by_api_id
-from http_requests.insert_ita_requests import get_stock_data, login_and_get_account_instance
+from database.insert_ita_database import insert_batch, insert_rows, search_api_ids, search_codes_by_api_id
+from http_requests.insert_ita_requests import get_stock_data, get_stock_data_columnar, login_and_get_account_instance
+from logic.sharded_fetch_logic import fetch_sharded_snapshot
 from utilities.custom_exceptions import MissingAPIIdError, NoMatchingCodeError
+from utilities.metrics import stage_timer
 
 
-def execute_task(account_instance, code_list, db_params):
+def make_persist(db_params, writer=None, change_filter=None, columnar=False, order_books=None, on_applied=None):
+    """
+    取得した株価データの書き込み先となる関数を返す関数（ポーリングとプッシュ配信で共通）
+
+    Args:
+        db_params (dict): データベースへの接続情報が格納された辞書
+        writer (ItaWriteBehindBuffer): ライトビハインドバッファ（省略可能）
+        change_filter (SnapshotChangeFilter): 変化のないスナップショットを間引くフィルタ（省略可能）
+        columnar (bool): 列指向のバッチ（ItaColumnarBatch）を受け取るかどうか
+        order_books (OrderBookStore): 銘柄毎の板のリングバッファ（省略可能）
+        on_applied (callable): 書き込みが確定した株価データを受け取る関数（ResponseJournal.mark_applied、省略可能）
+            変化のフィルタですべて間引いた場合も呼び出します。writer を指定した場合は、
+            writer の on_written から呼び出してください。
+
+    Returns:
+        callable: 行のリスト（columnarの場合はItaColumnarBatch）を受け取って書き込む関数
+    """
+    def persist(rows):
+        if columnar:
+            if writer is None and change_filter is None and order_books is None:
+                insert_batch(db_params, rows)
+                if on_applied is not None:
+                    on_applied(rows)
+                return
+            rows = rows.to_rows()
+        if order_books is not None:
+            order_books.append_rows(rows)
+        if change_filter is not None:
+            received = rows
+            rows = change_filter.filter(rows)
+            if not rows:
+                # 書き込む行がない応答も適用済みとする
+                if on_applied is not None:
+                    on_applied(received)
+                return
+        if writer is not None:
+            # フィルタへの確定・取り消しは、バッファの書き込み時に行う（ItaWriteBehindBuffer の on_written / on_dropped）
+            writer.put(rows)
+            return
+        try:
+            insert_rows(db_params, rows)
+        except BaseException:
+            if change_filter is not None:
+                change_filter.rollback(rows)
+            raise
+        if change_filter is not None:
+            change_filter.commit(rows)
+        if on_applied is not None:
+            on_applied(rows)
+
+    return persist
+
+
+def execute_task(account_instance, code_list, db_params, shard_size=None, writer=None, change_filter=None,
+                 columnar=False, order_books=None, tick_id=None, parse_pool=None, on_applied=None):
     """
     タスクを実行する関数
 
@@ -41,14 +99,40 @@ def execute_task(account_instance, code_list, db_params):
             取得したい証券コードのリストです。APIからこれらの証券コードに対応する株価データを取得します。
         connection (psycopg2.Connection): PostgreSQLへの接続情報
             データをデータベースに保存するためのPostgreSQLの接続情報です。
+        shard_size (int): 1リクエストあたりの銘柄数（省略時は分割しない）
+            指定した場合はシャード毎に並行取得し、取得できたシャードから順にデータベースに挿入します。
+        writer (ItaWriteBehindBuffer): ライトビハインドバッファ（省略可能）
+            指定した場合はデータベースに直接挿入せず、バッファに追加して書き込みスレッドに任せます。
+        change_filter (SnapshotChangeFilter): 変化のないスナップショットを間引くフィルタ（省略可能）
+        columnar (bool): Trueの場合は応答を列指向のバッチ（ItaColumnarBatch）に変換し、行毎の辞書を作らずに書き込みます
+            writer または change_filter を指定した場合は、それらに渡す前に辞書のリストに変換します。
+        order_books (OrderBookStore): 銘柄毎の板のリングバッファ（省略可能）
+            指定した場合は、変化の有無に関わらず取得した全行をリングバッファに追加します。
+        tick_id (int): tickの予定時刻（エポックミリ秒）。指定した場合は全行のtick_idにこの値を付与します
+        parse_pool (ParsePersistPool): 解析と書き込みを行うワーカープロセスのプール（省略可能）
+            指定した場合は応答の解析と書き込みをワーカープロセスで行います（writer / change_filter / order_books は使用しません）。
+        on_applied (callable): 書き込みが確定した株価データを受け取る関数（ResponseJournal.mark_applied、省略可能）
 
     Returns:
         None
     """
-    # 証券コードに対応する株価データを取得
-    return_json = get_stock_data(account_instance, code_list)
-    # 取得した株価データをデータベースに挿入
-    insert_rows(db_params, return_json)
+    # 解析と書き込みをワーカープロセスで行う場合
+    if parse_pool is not None:
+        with stage_timer("tick"):
+            fetch_sharded_snapshot(
+                account_instance, code_list, shard_size, on_shard=on_applied, fetch=parse_pool.fetch, tick_id=tick_id
+            )
+        return
+
+    # 取得した株価データの書き込み先（ライトビハインドバッファまたはデータベース）
+    persist = make_persist(db_params, writer, change_filter, columnar, order_books, on_applied)
+
+    # 証券コードに対応する株価データをシャード毎に取得し、取得できたシャードから書き込む
+    fetch = get_stock_data_columnar if columnar else get_stock_data
+    with stage_timer("tick"):
+        fetch_sharded_snapshot(
+            account_instance, code_list, shard_size, on_shard=persist, fetch=fetch, tick_id=tick_id
+        )
 
 
 def get_target_code_list(db_params, api_id_value):
@@ -77,6 +161,25 @@ def get_target_code_list(db_params, api_id_value):
     return codes
 
 
+def get_api_id_list(db_params):
+    """
+    master_stock_tableに設定されているapi_idを重複なく取得する関数
+
+    Args:
+    db_params (dict): データベースへの接続情報が格納された辞書
+
+    Returns:
+    list: api_idのリスト
+
+    Raises:
+    MissingAPIIdError: api_idが1件も設定されていない場合
+    """
+    api_ids = [str(row[0]) for row in search_api_ids(db_params)]
+    if len(api_ids) == 0:
+        raise MissingAPIIdError("master_stock_table has no api_id.")
+    return api_ids
+
+
 def login():
     """
     ログインを行い、立花証券口座クラスのインスタンスを返す関数
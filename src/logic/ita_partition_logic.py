@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、ita_tableのパーティションの事前作成と保持期間を過ぎたパーティションの削除を行うロジックを提供します。
+
+ファイルの概要:
+- ensure_partitions(db_params, start_day, days_ahead): start_dayからdays_ahead日先までのパーティションを作成する関数
+- drop_expired_partitions(db_params, retention_days, today): 保持期間を過ぎたパーティションを削除する関数
+- maintain_partitions(db_params, days_ahead, retention_days): 上記2つをまとめて実行する関数
+
+注意事項:
+- 古いデータの削除はDELETEではなくパーティション単位のDROPで行うため、VACUUMは不要です。
+- retention_daysに0以下を指定した場合は削除を行いません。
+"""
+import datetime
+from database.ita_partition_database import create_partition, drop_partition, list_partitions
+
+# 既定値
+DEFAULT_DAYS_AHEAD = 7
+DEFAULT_RETENTION_DAYS = 0
+
+
+def ensure_partitions(db_params, start_day=None, days_ahead=DEFAULT_DAYS_AHEAD):
+    """
+    start_dayからdays_ahead日先までのパーティションを作成する関数
+
+    Args:
+        db_params (dict): データベースへの接続情報が格納された辞書
+        start_day (datetime.date): 作成を開始する日（省略時は今日）
+        days_ahead (int): 何日先まで作成するか
+
+    Returns:
+        list: 新しく作成したパーティションの取引日のリスト
+    """
+    if start_day is None:
+        start_day = datetime.date.today()
+
+    created = []
+    for offset in range(days_ahead + 1):
+        day = start_day + datetime.timedelta(days=offset)
+        if create_partition(db_params, day):
+            created.append(day)
+    return created
+
+
+def drop_expired_partitions(db_params, retention_days, today=None):
+    """
+    保持期間を過ぎたパーティションを削除する関数
+
+    Args:
+        db_params (dict): データベースへの接続情報が格納された辞書
+        retention_days (int): 保持する日数（0以下の場合は削除しない）
+        today (datetime.date): 基準日（省略時は今日）
+
+    Returns:
+        list: 削除したパーティションの取引日のリスト
+    """
+    if retention_days <= 0:
+        return []
+    if today is None:
+        today = datetime.date.today()
+
+    cutoff = today - datetime.timedelta(days=retention_days)
+    dropped = []
+    for day, _ in list_partitions(db_params):
+        if day < cutoff:
+            drop_partition(db_params, day)
+            dropped.append(day)
+    return dropped
+
+
+def maintain_partitions(db_params, days_ahead=DEFAULT_DAYS_AHEAD, retention_days=DEFAULT_RETENTION_DAYS):
+    """
+    パーティションの事前作成と保持期間を過ぎたパーティションの削除をまとめて実行する関数
+
+    Args:
+        db_params (dict): データベースへの接続情報が格納された辞書
+        days_ahead (int): 何日先まで作成するか
+        retention_days (int): 保持する日数（0以下の場合は削除しない）
+
+    Returns:
+        tuple: (作成した取引日のリスト, 削除した取引日のリスト)
+    """
+    created = ensure_partitions(db_params, days_ahead=days_ahead)
+    dropped = drop_expired_partitions(db_params, retention_days)
+    return created, dropped
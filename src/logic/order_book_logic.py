@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、板のスナップショットをコンパクトに保持する型と、銘柄毎のリングバッファを提供するモジュールです。
+
+ファイルの概要:
+- OrderBookSnapshot: __slots__ と固定長の配列（10本の売買の気配値と数量）で1銘柄の板を保持するクラス
+- OrderBookRingBuffer: 1銘柄の直近N件のスナップショットをNumPy配列で保持するリングバッファクラス
+- OrderBookStore: 銘柄コード毎のリングバッファをまとめて管理するクラス
+
+注意事項:
+- 気配値・数量の配列のインデックス0が最良気配（pGAP1 / pGBP1）、9が10本目です。
+- 価格がNULLの場合はNaN、数量がNULLの場合は0を格納します。
+- リングバッファは同じ内容を2か所（i と i + capacity）に書き込むことで、直近n件を常に連続した領域として
+  参照できるようにしています。window(n) はコピーを作らずにNumPyのビューを返します。
+"""
+import math
+import threading
+from array import array
+import numpy as np
+
+# 板の本数
+LEVELS = 10
+
+_ASK_PRICE_KEYS = tuple(f"pGAP{level}" for level in range(1, LEVELS + 1))
+_BID_PRICE_KEYS = tuple(f"pGBP{level}" for level in range(1, LEVELS + 1))
+_ASK_SIZE_KEYS = tuple(f"pGAV{level}" for level in range(1, LEVELS + 1))
+_BID_SIZE_KEYS = tuple(f"pGBV{level}" for level in range(1, LEVELS + 1))
+
+# 既定値
+DEFAULT_CAPACITY = 600
+
+
+def _to_float(value):
+    """
+    値をfloatに変換する関数（NULLの場合はNaN）
+
+    Args:
+        value (str or None): 変換する値
+
+    Returns:
+        float: 変換した値
+    """
+    return math.nan if value is None or value == "" else float(value)
+
+
+def _to_int(value):
+    """
+    値をintに変換する関数（NULLの場合は0）
+
+    Args:
+        value (str or None): 変換する値
+
+    Returns:
+        int: 変換した値
+    """
+    return 0 if value is None or value == "" else int(float(value))
+
+
+class OrderBookSnapshot:
+    """
+    1銘柄の板のスナップショットを保持するクラス
+
+    Attributes:
+        code (int): 銘柄コード
+        created_at (datetime.datetime): 応答のp_rv_date
+        tick_id (int): スナップショットのtick_id
+        last_price (float): 現値
+        volume (int): 出来高
+        ask_prices (array): 売気配値（1本目～10本目）
+        bid_prices (array): 買気配値（1本目～10本目）
+        ask_sizes (array): 売気配数量（1本目～10本目）
+        bid_sizes (array): 買気配数量（1本目～10本目）
+    """
+
+    __slots__ = (
+        "code", "created_at", "tick_id", "last_price", "volume",
+        "ask_prices", "bid_prices", "ask_sizes", "bid_sizes",
+    )
+
+    def __init__(self, code, created_at, tick_id, last_price, volume, ask_prices, bid_prices, ask_sizes, bid_sizes):
+        """
+        スナップショットクラスのコンストラクタ
+
+        Args:
+            code (int): 銘柄コード
+            created_at (datetime.datetime): 応答のp_rv_date
+            tick_id (int): スナップショットのtick_id
+            last_price (float): 現値
+            volume (int): 出来高
+            ask_prices (array): 売気配値
+            bid_prices (array): 買気配値
+            ask_sizes (array): 売気配数量
+            bid_sizes (array): 買気配数量
+        """
+        self.code = code
+        self.created_at = created_at
+        self.tick_id = tick_id
+        self.last_price = last_price
+        self.volume = volume
+        self.ask_prices = ask_prices
+        self.bid_prices = bid_prices
+        self.ask_sizes = ask_sizes
+        self.bid_sizes = bid_sizes
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        get_stock_data が返す辞書からスナップショットを作成するクラスメソッド
+
+        Args:
+            row (dict): 株価データの辞書
+
+        Returns:
+            OrderBookSnapshot: 作成したスナップショット
+        """
+        return cls(
+            int(row["sIssueCode"]),
+            row.get("created_at"),
+            row.get("tick_id"),
+            _to_float(row.get("pDPP")),
+            _to_int(row.get("pDV")),
+            array("d", [_to_float(row.get(key)) for key in _ASK_PRICE_KEYS]),
+            array("d", [_to_float(row.get(key)) for key in _BID_PRICE_KEYS]),
+            array("q", [_to_int(row.get(key)) for key in _ASK_SIZE_KEYS]),
+            array("q", [_to_int(row.get(key)) for key in _BID_SIZE_KEYS]),
+        )
+
+    def best_ask(self):
+        """
+        最良売気配値を返すメソッド
+
+        Returns:
+            float: 最良売気配値（NULLの場合はNaN）
+        """
+        return self.ask_prices[0]
+
+    def best_bid(self):
+        """
+        最良買気配値を返すメソッド
+
+        Returns:
+            float: 最良買気配値（NULLの場合はNaN）
+        """
+        return self.bid_prices[0]
+
+
+class OrderBookRingBuffer:
+    """
+    1銘柄の直近N件のスナップショットを保持するリングバッファクラス
+
+    Attributes:
+        capacity (int): 保持する件数
+        created_at (np.ndarray): p_rv_date（datetime64[us]）
+        tick_id (np.ndarray): tick_id（int64、未設定は-1）
+        last_price (np.ndarray): 現値（float64）
+        volume (np.ndarray): 出来高（int64）
+        ask_prices / bid_prices (np.ndarray): 気配値（float64、形状は (2 * capacity, 10)）
+        ask_sizes / bid_sizes (np.ndarray): 気配数量（int64、形状は (2 * capacity, 10)）
+
+    Methods:
+        append(snapshot): スナップショットを追加するメソッド（O(1)）
+        window(n): 直近n件の各配列のビューを返すメソッド（コピーなし）
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """
+        リングバッファクラスのコンストラクタ
+
+        Args:
+            capacity (int): 保持する件数
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be 1 or more")
+        self.capacity = capacity
+        size = 2 * capacity
+        self.created_at = np.zeros(size, dtype="datetime64[us]")
+        self.tick_id = np.full(size, -1, dtype=np.int64)
+        self.last_price = np.full(size, np.nan, dtype=np.float64)
+        self.volume = np.zeros(size, dtype=np.int64)
+        self.ask_prices = np.full((size, LEVELS), np.nan, dtype=np.float64)
+        self.bid_prices = np.full((size, LEVELS), np.nan, dtype=np.float64)
+        self.ask_sizes = np.zeros((size, LEVELS), dtype=np.int64)
+        self.bid_sizes = np.zeros((size, LEVELS), dtype=np.int64)
+        self._next = 0  # 次に書き込む位置（0 <= _next < capacity）
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, snapshot):
+        """
+        スナップショットを追加するメソッド（容量を超えた場合は最も古いものを上書き）
+
+        Args:
+            snapshot (OrderBookSnapshot): 追加するスナップショット
+        """
+        created_at = np.datetime64("NaT")
+        if snapshot.created_at is not None:
+            created_at = np.datetime64(snapshot.created_at, "us")
+        tick_id = -1 if snapshot.tick_id is None else snapshot.tick_id
+        for index in (self._next, self._next + self.capacity):
+            self.created_at[index] = created_at
+            self.tick_id[index] = tick_id
+            self.last_price[index] = snapshot.last_price
+            self.volume[index] = snapshot.volume
+            self.ask_prices[index] = snapshot.ask_prices
+            self.bid_prices[index] = snapshot.bid_prices
+            self.ask_sizes[index] = snapshot.ask_sizes
+            self.bid_sizes[index] = snapshot.bid_sizes
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def window(self, n=None):
+        """
+        直近n件（古い順）の各配列のビューを返すメソッド（コピーは作りません）
+
+        Args:
+            n (int): 件数（省略時は保持している全件）
+
+        Returns:
+            dict: 項目名 -> NumPy配列のビュー
+        """
+        if n is None or n > self._count:
+            n = self._count
+        end = self._next + self.capacity
+        start = end - n
+        return {
+            "created_at": self.created_at[start:end],
+            "tick_id": self.tick_id[start:end],
+            "last_price": self.last_price[start:end],
+            "volume": self.volume[start:end],
+            "ask_prices": self.ask_prices[start:end],
+            "bid_prices": self.bid_prices[start:end],
+            "ask_sizes": self.ask_sizes[start:end],
+            "bid_sizes": self.bid_sizes[start:end],
+        }
+
+    def nbytes(self):
+        """
+        リングバッファが確保している配列のバイト数を返すメソッド
+
+        Returns:
+            int: バイト数
+        """
+        return sum(
+            values.nbytes for values in (
+                self.created_at, self.tick_id, self.last_price, self.volume,
+                self.ask_prices, self.bid_prices, self.ask_sizes, self.bid_sizes,
+            )
+        )
+
+
+class OrderBookStore:
+    """
+    銘柄コード毎のリングバッファをまとめて管理するクラス
+
+    Attributes:
+        capacity (int): 1銘柄あたりに保持する件数
+
+    Methods:
+        append_rows(rows): get_stock_data の出力を各銘柄のリングバッファに追加するメソッド
+        buffer(code): 銘柄のリングバッファを返すメソッド
+        window(code, n): 銘柄の直近n件のビューを返すメソッド
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """
+        ストアクラスのコンストラクタ
+
+        Args:
+            capacity (int): 1銘柄あたりに保持する件数
+        """
+        self.capacity = capacity
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def append_rows(self, rows):
+        """
+        get_stock_data の出力を各銘柄のリングバッファに追加するメソッド
+
+        Args:
+            rows (list): 株価データの辞書のリスト
+        """
+        snapshots = [OrderBookSnapshot.from_row(row) for row in rows]
+        with self._lock:
+            for snapshot in snapshots:
+                ring = self._buffers.get(snapshot.code)
+                if ring is None:
+                    ring = OrderBookRingBuffer(self.capacity)
+                    self._buffers[snapshot.code] = ring
+                ring.append(snapshot)
+
+    def buffer(self, code):
+        """
+        銘柄のリングバッファを返すメソッド
+
+        Args:
+            code (int or str): 銘柄コード
+
+        Returns:
+            OrderBookRingBuffer: リングバッファ（未登録の場合はNone）
+        """
+        return self._buffers.get(int(code))
+
+    def window(self, code, n=None):
+        """
+        銘柄の直近n件（古い順）のビューを返すメソッド
+
+        ビューはリングバッファの配列を直接参照するため、以降の追加で内容が変わります。
+        保持する場合は呼び出し側でコピーしてください。
+
+        Args:
+            code (int or str): 銘柄コード
+            n (int): 件数（省略時は保持している全件）
+
+        Returns:
+            dict: 項目名 -> NumPy配列のビュー（未登録の場合はNone）
+        """
+        with self._lock:
+            ring = self._buffers.get(int(code))
+            return None if ring is None else ring.window(n)
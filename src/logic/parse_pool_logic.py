@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、時価情報の応答の解析とデータベースへの書き込みを、ワーカープロセスのプールで行うモジュールです。
+
+ファイル内の主な処理ステップ:
+1. 時価情報の要求は従来どおり呼び出し元のスレッドで行います（通信中はGILを解放するため並行に動きます）。
+2. 受け取った応答は、共有メモリ（multiprocessing.shared_memory）のスロットに書き込み、
+   スロット名と長さだけをワーカープロセスに渡します（応答本文をpickleしてパイプで送るコピーは行いません）。
+3. ワーカープロセスは共有メモリから応答を読み込み、解析（JSONのデコードと行の作成）とデータベースへの書き込み
+   （COPYのバッファ作成を含む）を行い、行数と所要時間だけを返します。
+4. 書き込みが終わるとスロットを空きに戻します。空きのスロットがない場合は、ワーカーの処理が追いつくまで
+   要求側のスレッドが待ちます（バックプレッシャー）。
+
+注意事項:
+- 解析と書き込みがワーカープロセスで行われるため、CPUのコア数に応じて処理量が増えます。
+- ワーカープロセスは fork で起動し、データベースの接続プールはワーカー毎に作成されます（database.db_connector）。
+  forkはコンストラクタで行うため、他のスレッドを起動する前にインスタンスを作成してください。
+- スロットより大きい応答は、共有メモリを使わずにワーカーに渡します（件数を ita_parse_pool_oversize_total に記録）。
+- ワーカーが強制終了される（OOM Killer等）とプールは使用できなくなります（BrokenProcessPool）。
+  スレッドが動いている状態で fork し直すことは避け、broken を True にして以降の要求を行わずに失敗させるため、
+  呼び出し元はプロセスを0以外の終了コードで終了し、監視プロセスに再起動させてください。
+- 行がワーカープロセス内で書き込まれるため、ライトビハインドバッファ・変化のフィルタ・板のリングバッファとは
+  併用できません。
+- ワーカー内で記録したメトリクスはワーカーのプロセスに残るため、解析と書き込みの所要時間、書き込んだ行数は
+  ワーカーから返された値を呼び出し元のプロセスで記録します。
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import queue
+import signal
+import time
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from database.insert_ita_database import ROWS_WRITTEN, insert_batch, insert_rows
+from http_requests.insert_ita_requests import decode_stock_data, request_market_price
+from http_requests.market_price_decoder import decode_market_price
+from logic.sharded_fetch_logic import current_tick_id, next_tick_id
+from utilities.metrics import STAGE_SECONDS, counter, gauge
+
+OVERSIZE_RESPONSES = counter("ita_parse_pool_oversize_total", "Responses too large for a shared memory slot.")
+BROKEN_POOLS = counter("ita_parse_pool_broken_total", "Parse pools broken by a worker that exited abruptly.")
+FREE_SLOTS = gauge("ita_parse_pool_free_slots", "Shared memory slots waiting for a response.")
+
+# 既定値
+DEFAULT_SLOT_BYTES = 4 * 1024 * 1024
+DEFAULT_SLOTS_PER_WORKER = 2
+
+# ワーカープロセスの状態（initializerで設定）
+_worker_db_params = None
+_worker_columnar = False
+_worker_slots = {}
+
+
+def _init_worker(db_params, columnar):
+    """
+    ワーカープロセスの初期化を行う関数
+
+    Args:
+        db_params (dict): データベースへの接続情報が格納された辞書
+        columnar (bool): 列指向のバッチで書き込むかどうか
+    """
+    global _worker_db_params, _worker_columnar
+    _worker_db_params = db_params
+    _worker_columnar = columnar
+    # Ctrl+Cは親プロセスだけが受け取り、書き込み中の行はプールの終了時に書き終える
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _attach_slot(slot_name):
+    """
+    共有メモリのスロットに接続する関数（ワーカープロセス毎に1回だけ接続して使い回します）
+
+    Args:
+        slot_name (str): 共有メモリの名前
+
+    Returns:
+        shared_memory.SharedMemory: 接続した共有メモリ
+    """
+    slot = _worker_slots.get(slot_name)
+    if slot is None:
+        slot = shared_memory.SharedMemory(name=slot_name)
+        _worker_slots[slot_name] = slot
+    return slot
+
+
+def _parse_and_persist(slot_name, length, payload, tick_id):
+    """
+    応答を解析してデータベースに書き込む関数（ワーカープロセスで実行）
+
+    Args:
+        slot_name (str): 応答を書き込んだ共有メモリの名前（Noneの場合は payload を使用）
+        length (int): 応答の長さ（バイト）
+        payload (bytes): スロットに入らなかった応答（slot_name を指定した場合はNone）
+        tick_id (int): 行に付与するtick_id
+
+    Returns:
+        tuple: (書き込んだ行数, 解析の所要時間（秒）, 書き込みの所要時間（秒）)
+    """
+    start_time = time.perf_counter()
+    if slot_name is not None:
+        view = _attach_slot(slot_name).buf[:length]
+        try:
+            response = str(view, "utf-8")
+        finally:
+            view.release()
+    else:
+        response = payload.decode("utf-8")
+
+    if _worker_columnar:
+        rows = decode_market_price(response)
+        rows.tick_id = tick_id
+    else:
+        rows = decode_stock_data(response)
+        for row in rows:
+            row["tick_id"] = tick_id
+    if len(rows) == 0:
+        raise ValueError("the response ita rows is empty")
+    decoded_time = time.perf_counter()
+
+    if _worker_columnar:
+        insert_batch(_worker_db_params, rows)
+    else:
+        insert_rows(_worker_db_params, rows)
+    return len(rows), decoded_time - start_time, time.perf_counter() - decoded_time
+
+
+class ParsedShard:
+    """
+    ワーカープロセスで解析・書き込みを終えたシャードの結果を保持するクラス
+
+    Attributes:
+        rows (int): 書き込んだ行数
+        tick_id (int): 行に付与したtick_id
+        journal_position (tuple): 応答のジャーナル上の位置（fetch_sharded_snapshot が設定、未設定の場合はNone）
+    """
+    __slots__ = ("rows", "tick_id", "journal_position")
+
+    def __init__(self, rows, tick_id):
+        self.rows = rows
+        self.tick_id = tick_id
+        self.journal_position = None
+
+    def __len__(self):
+        return self.rows
+
+
+class ParsePersistPool:
+    """
+    時価情報の応答の解析と書き込みをワーカープロセスのプールで行うクラス
+
+    Attributes:
+        workers (int): ワーカープロセス数
+        slot_bytes (int): 共有メモリの1スロットの大きさ（バイト）
+        stats (dict): 処理した応答数、行数、スロットに入らなかった応答数、失敗数
+        broken (bool): ワーカーの異常終了でプールが使用できなくなったかどうか
+
+    Methods:
+        fetch(tachibana_account, code_list): 時価情報を要求し、解析と書き込みをワーカーに任せて完了を待つメソッド
+        submit(response, tick_id): 応答の解析と書き込みをワーカーに依頼するメソッド
+        close(): 処理中の応答を書き終えてから、プールと共有メモリを解放するメソッド
+    """
+
+    def __init__(self, db_params, workers=None, slot_bytes=DEFAULT_SLOT_BYTES, slots=None, columnar=False):
+        """
+        ワーカープロセスのプールのコンストラクタ
+
+        Args:
+            db_params (dict): データベースへの接続情報が格納された辞書
+            workers (int): ワーカープロセス数（省略時はCPUのコア数）
+            slot_bytes (int): 共有メモリの1スロットの大きさ（バイト）
+            slots (int): スロット数（省略時はワーカー数の DEFAULT_SLOTS_PER_WORKER 倍）
+            columnar (bool): 列指向のバッチ（ItaColumnarBatch）で書き込むかどうか
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.slot_bytes = slot_bytes
+        self.stats = {"responses": 0, "rows": 0, "oversize": 0, "failures": 0}
+        self.broken = False
+
+        # スロットはワーカーの起動前に作成する（forkしたワーカーと同じリソーストラッカーに登録される）
+        self._slots = [
+            shared_memory.SharedMemory(create=True, size=slot_bytes)
+            for _ in range(slots or self.workers * DEFAULT_SLOTS_PER_WORKER)
+        ]
+        self._free_slots = queue.Queue()
+        for slot in self._slots:
+            self._free_slots.put(slot)
+        FREE_SLOTS.set_function(self._free_slots.qsize)
+
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+            initargs=(db_params, columnar),
+        )
+        # ワーカーはここで起動しておく（他のスレッドが動き出してからのforkを避ける）
+        self._executor.submit(os.getpid).result()
+
+    def submit(self, response, tick_id):
+        """
+        応答の解析と書き込みをワーカーに依頼するメソッド（空きのスロットがない場合は空くまで待ちます）
+
+        Args:
+            response (str): 時価情報の応答の文字列
+            tick_id (int): 行に付与するtick_id
+
+        Returns:
+            concurrent.futures.Future: 書き込んだ行数を返すFuture
+        """
+        payload = response.encode("utf-8")
+        if len(payload) > self.slot_bytes:
+            self.stats["oversize"] += 1
+            OVERSIZE_RESPONSES.inc()
+            try:
+                future = self._executor.submit(_parse_and_persist, None, len(payload), payload, tick_id)
+            except BrokenProcessPool:
+                self._mark_broken()
+                raise
+            return self._track(future, None)
+
+        slot = self._free_slots.get()
+        try:
+            slot.buf[:len(payload)] = payload
+            future = self._executor.submit(_parse_and_persist, slot.name, len(payload), None, tick_id)
+        except BaseException as error:
+            self._free_slots.put(slot)
+            if isinstance(error, BrokenProcessPool):
+                self._mark_broken()
+            raise
+        return self._track(future, slot)
+
+    def _mark_broken(self):
+        """
+        ワーカーの異常終了でプールが使用できなくなったことを記録するメソッド
+        """
+        if not self.broken:
+            self.broken = True
+            BROKEN_POOLS.inc()
+
+    def _track(self, future, slot):
+        """
+        ワーカーの完了時にスロットを空きに戻し、所要時間と行数を記録するFutureを返すメソッド
+
+        Args:
+            future (concurrent.futures.Future): ワーカーのFuture
+            slot (shared_memory.SharedMemory): 使用したスロット（使用していない場合はNone）
+
+        Returns:
+            concurrent.futures.Future: 書き込んだ行数を返すFuture
+        """
+        result = concurrent.futures.Future()
+
+        def on_done(done):
+            if slot is not None:
+                self._free_slots.put(slot)
+            try:
+                rows, decode_seconds, write_seconds = done.result()
+            except BaseException as error:
+                self.stats["failures"] += 1
+                if isinstance(error, BrokenProcessPool):
+                    self._mark_broken()
+                result.set_exception(error)
+                return
+            STAGE_SECONDS.observe(decode_seconds, stage="decode")
+            STAGE_SECONDS.observe(write_seconds, stage="db_write")
+            ROWS_WRITTEN.inc(rows)
+            self.stats["responses"] += 1
+            self.stats["rows"] += rows
+            result.set_result(rows)
+
+        future.add_done_callback(on_done)
+        return result
+
+    def fetch(self, tachibana_account, code_list):
+        """
+        時価情報を要求し、解析と書き込みをワーカーに任せて完了を待つメソッド
+
+        fetch_sharded_snapshot の fetch に指定して使います（tick_idは fetch_sharded_snapshot が設定したものを使用）。
+
+        Args:
+            tachibana_account (TachibanaAccount): 立花証券口座属性クラスのインスタンス
+            code_list (list): 株価データを取得する銘柄コードのリスト
+
+        Returns:
+            ParsedShard: 書き込んだ行数とtick_id
+
+        Raises:
+            BrokenProcessPool: ワーカーの異常終了でプールが使用できない場合（時価情報の要求は行いません）
+        """
+        if self.broken:
+            raise BrokenProcessPool("a parse worker exited abruptly; the pool can no longer be used")
+        tick_id = current_tick_id()
+        if tick_id is None:
+            tick_id = next_tick_id()
+        response = request_market_price(tachibana_account, code_list)
+        return ParsedShard(self.submit(response, tick_id).result(), tick_id)
+
+    def close(self):
+        """
+        処理中の応答を書き終えてから、プールと共有メモリを解放するメソッド（プールが使用できない場合も解放します）
+        """
+        try:
+            self._executor.shutdown(wait=True)
+        finally:
+            FREE_SLOTS.set_function(None)
+            for slot in self._slots:
+                slot.close()
+                slot.unlink()
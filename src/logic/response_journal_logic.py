@@ -0,0 +1,767 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、時価情報の応答を解析前にそのまま追記するジャーナルと、ジャーナルからita_tableへの再投入（リプレイ）を提供するモジュールです。
+
+ファイル内の主な処理ステップ:
+1. request_market_price の応答を、解析する前にメモリマップしたセグメントファイルに追記します。
+2. セグメントが segment_bytes に達したら封印（余白を切り詰めてインデックスを保存）し、新しいセグメントに切り替えます。
+3. 応答の行がita_tableに書き込まれた時点で（変化のフィルタですべて間引いた場合も含む）、
+   レコードのヘッダーに適用済みフラグを立てます（ResponseJournal.mark_applied）。
+4. リプレイでは、適用済みフラグのないレコードを列指向のバッチに変換し、COPYで一括してita_tableに書き込み、
+   書き込んだレコードに適用済みフラグを立てます。
+5. 読み終えた位置をチェックポイントファイル（applied.json）に保存し、次回はその位置から再開します。
+6. 封印したセグメントのうち、全レコードが適用済みで保持期間を過ぎたものを削除します（purge_applied_segments）。
+
+ファイル構成:
+- <連番>.journal: セグメント（レコードを隙間なく並べたファイル）
+- <連番>.idx: 封印したセグメントのインデックス（p_rv_dateの最小・最大、レコード数、サイズ）
+- applied.json: リプレイで適用済みの位置（セグメント名とオフセット）
+
+レコードの形式:
+- ヘッダー（32バイト）: マジック、ペイロード長、CRC32、フラグ、p_rv_date（エポックミリ秒）、tick_id
+  フラグは FLAG_APPLIED（適用済み）だけを使います。CRC32はペイロードだけを対象にするため、
+  追記後にフラグを書き換えてもレコードは壊れません。
+- ペイロード: 応答の文字列（UTF-8）
+
+注意事項:
+- ペイロードを書いてからヘッダーを書くため、書き込み途中で停止したレコードはCRCの不一致で読み飛ばされます。
+- プロセス起動時は前回のセグメントを封印してから新しいセグメントに書き込みます。
+- sync=True の場合は追記毎にmsyncします（OSの停止にも耐えますが遅くなります）。
+  既定ではプロセスが異常終了してもページキャッシュに残った内容は失われません。
+- 適用済みかどうかはレコード毎のフラグで判定するため、tick_idのないレコードや、変化のフィルタで
+  すべて間引いた応答も重複して書き込みません。書き込みのコミットからフラグを立てるまでの間に停止した場合だけ、
+  次のリプレイで同じ行がもう一度書き込まれます。
+- ライトビハインドバッファで捨てた行を含むレコードには、フラグを立てません（次のリプレイで書き込まれます）。
+- since / until を指定したリプレイではチェックポイントを進めません。include_applied=True の場合は
+  適用済みのレコードも書き込みます（データベースを復元した後の再投入など）。
+- 既定のディレクトリ（/src/journal）は .gitignore でリポジトリの管理から除外しています。
+"""
+import datetime
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from database.insert_ita_database import insert_journal_batches
+from http_requests.insert_ita_requests import set_response_hook
+from http_requests.market_price_decoder import decode_market_price, parse_p_rv_date
+from logic.sharded_fetch_logic import current_tick_id
+from utilities.utility import handle_log
+
+# 既定値
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+DEFAULT_REPLAY_CHUNK_ROWS = 20000
+DEFAULT_JOURNAL_DIR = "/src/journal"
+DEFAULT_RETENTION_SECONDS = 24 * 3600
+
+SEGMENT_SUFFIX = ".journal"
+INDEX_SUFFIX = ".idx"
+CHECKPOINT_FILE = "applied.json"
+
+# マジック、ペイロード長、CRC32、フラグ、p_rv_date（エポックミリ秒）、tick_id
+_HEADER = struct.Struct("<IIIIqq")
+_MAGIC = 0x4A415449  # "ITAJ"
+# ヘッダー内のフラグの位置と形式
+_FLAGS = struct.Struct("<I")
+_FLAGS_OFFSET = 12
+FLAG_APPLIED = 0x1
+
+_JST = datetime.timezone(datetime.timedelta(hours=9))
+_P_RV_DATE_PATTERN = re.compile(rb'"p_rv_date"\s*:\s*"([^"]*)"')
+
+
+def _p_rv_date_ms(payload):
+    """
+    応答を解析せずにp_rv_dateを取り出し、エポックミリ秒に変換する関数
+
+    Args:
+        payload (bytes): 応答のバイト列
+
+    Returns:
+        int: p_rv_date（エポックミリ秒、取り出せない場合は0）
+    """
+    match = _P_RV_DATE_PATTERN.search(payload)
+    if match is None:
+        return 0
+    try:
+        value = parse_p_rv_date(match.group(1).decode("ascii"))
+    except ValueError:
+        return 0
+    return int(value.replace(tzinfo=_JST).timestamp() * 1000)
+
+
+def to_epoch_ms(value):
+    """
+    datetime（タイムゾーンなしは日本時間とみなす）をエポックミリ秒に変換する関数
+
+    Args:
+        value (datetime.datetime): 変換する日時
+
+    Returns:
+        int: エポックミリ秒
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=_JST)
+    return int(value.timestamp() * 1000)
+
+
+def _segment_name(sequence):
+    return f"{sequence:010d}{SEGMENT_SUFFIX}"
+
+
+def list_segments(directory):
+    """
+    ジャーナルのセグメント名を古い順に返す関数
+
+    Args:
+        directory (str): ジャーナルのディレクトリ
+
+    Returns:
+        list: セグメントのファイル名のリスト
+    """
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+
+
+def _scan(buffer, start=0):
+    """
+    バッファ内の正しいレコードを先頭から順に返すジェネレータ（壊れたレコードの手前で止まります）
+
+    Args:
+        buffer (mmap.mmap or bytes): セグメントの内容
+        start (int): 読み始めるオフセット
+
+    Yields:
+        tuple: (オフセット, 次のレコードのオフセット, p_rv_date, tick_id, ペイロードの開始位置, フラグ)
+    """
+    offset = start
+    size = len(buffer)
+    while offset + _HEADER.size <= size:
+        magic, length, crc, flags, p_rv_date_ms, tick_id = _HEADER.unpack_from(buffer, offset)
+        payload_start = offset + _HEADER.size
+        end = payload_start + length
+        if magic != _MAGIC or end > size or zlib.crc32(buffer[payload_start:end]) != crc:
+            return
+        yield offset, end, p_rv_date_ms, tick_id, payload_start, flags
+        offset = end
+
+
+def _all_applied(buffer):
+    """
+    封印したセグメントの全レコードが適用済みかどうかを返す関数（ヘッダーだけを読みます）
+
+    Args:
+        buffer (mmap.mmap or bytes): 封印したセグメントの内容（正しいレコードの末尾で切り詰め済み）
+
+    Returns:
+        bool: 全レコードが適用済みであればTrue
+    """
+    offset = 0
+    size = len(buffer)
+    while offset + _HEADER.size <= size:
+        magic, length, _, flags, _, _ = _HEADER.unpack_from(buffer, offset)
+        if magic != _MAGIC or not flags & FLAG_APPLIED:
+            return False
+        offset += _HEADER.size + length
+    return True
+
+
+class JournalRecord:
+    """
+    ジャーナルの1レコードを表すクラス
+
+    Attributes:
+        segment (str): セグメントのファイル名
+        offset (int): レコードの先頭のオフセット
+        next_offset (int): 次のレコードのオフセット
+        p_rv_date_ms (int): 応答のp_rv_date（エポックミリ秒、不明な場合は0）
+        tick_id (int): スナップショットのtick_id（不明な場合はNone）
+        payload (bytes): 応答のバイト列
+        applied (bool): 適用済みフラグが立っているかどうか
+    """
+
+    __slots__ = ("segment", "offset", "next_offset", "p_rv_date_ms", "tick_id", "payload", "applied")
+
+    def __init__(self, segment, offset, next_offset, p_rv_date_ms, tick_id, payload, applied=False):
+        self.segment = segment
+        self.offset = offset
+        self.next_offset = next_offset
+        self.p_rv_date_ms = p_rv_date_ms
+        self.tick_id = tick_id
+        self.payload = payload
+        self.applied = applied
+
+    def text(self):
+        """
+        応答の文字列を返すメソッド
+
+        Returns:
+            str: 応答の文字列
+        """
+        return self.payload.decode("utf-8")
+
+
+def _build_index(buffer):
+    """
+    セグメントの内容からインデックスを作成する関数
+
+    Args:
+        buffer (mmap.mmap or bytes): セグメントの内容
+
+    Returns:
+        dict: first_p_rv_date_ms, last_p_rv_date_ms, records, size
+    """
+    index = {"first_p_rv_date_ms": None, "last_p_rv_date_ms": None, "records": 0, "size": 0}
+    for _, end, p_rv_date_ms, _, _, _ in _scan(buffer):
+        _update_index(index, p_rv_date_ms, end)
+    return index
+
+
+def _update_index(index, p_rv_date_ms, end):
+    """
+    インデックスに1レコード分の情報を反映する関数
+
+    Args:
+        index (dict): インデックス
+        p_rv_date_ms (int): レコードのp_rv_date（エポックミリ秒）
+        end (int): レコードの終端のオフセット
+    """
+    if p_rv_date_ms:
+        if index["first_p_rv_date_ms"] is None or p_rv_date_ms < index["first_p_rv_date_ms"]:
+            index["first_p_rv_date_ms"] = p_rv_date_ms
+        if index["last_p_rv_date_ms"] is None or p_rv_date_ms > index["last_p_rv_date_ms"]:
+            index["last_p_rv_date_ms"] = p_rv_date_ms
+    index["records"] += 1
+    index["size"] = end
+
+
+def _write_json(path, value):
+    """
+    JSONファイルを一時ファイル経由で置き換える関数（書き込み途中で停止しても元のファイルが残ります）
+
+    Args:
+        path (str): 書き込み先のパス
+        value (dict): 書き込む値
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(value, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def read_segment_index(directory, segment):
+    """
+    セグメントのインデックスを返す関数（封印前のセグメントは内容を走査して作成します）
+
+    Args:
+        directory (str): ジャーナルのディレクトリ
+        segment (str): セグメントのファイル名
+
+    Returns:
+        dict: first_p_rv_date_ms, last_p_rv_date_ms, records, size
+    """
+    index_path = os.path.join(directory, segment[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX)
+    if os.path.exists(index_path):
+        with open(index_path) as file:
+            return json.load(file)
+    with open(os.path.join(directory, segment), "rb") as file:
+        return _build_index(file.read())
+
+
+def seal_segment(directory, segment):
+    """
+    セグメントを封印する関数（正しいレコードの末尾で切り詰め、インデックスを保存します）
+
+    Args:
+        directory (str): ジャーナルのディレクトリ
+        segment (str): セグメントのファイル名
+
+    Returns:
+        dict: 保存したインデックス
+    """
+    path = os.path.join(directory, segment)
+    with open(path, "rb") as file:
+        index = _build_index(file.read())
+    os.truncate(path, index["size"])
+    _write_json(os.path.join(directory, segment[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX), index)
+    return index
+
+
+def journal_positions(rows):
+    """
+    株価データに付与された応答のジャーナル上の位置を重複なく返す関数
+
+    Args:
+        rows (list or ItaColumnarBatch or ParsedShard): 株価データ（行の辞書のリスト、または journal_position 属性を持つもの）
+
+    Returns:
+        set: (セグメントのファイル名, オフセット) の集合
+    """
+    if not isinstance(rows, list):
+        position = getattr(rows, "journal_position", None)
+        return set() if position is None else {position}
+    return {row["journal_position"] for row in rows if row.get("journal_position") is not None}
+
+
+def mark_records_applied(directory, positions):
+    """
+    レコードのヘッダーに適用済みフラグを立てる関数（封印したセグメントのファイルに直接書き込みます）
+
+    Args:
+        directory (str): ジャーナルのディレクトリ
+        positions (iterable): (セグメントのファイル名, オフセット) のリスト
+
+    Returns:
+        int: フラグを立てたレコード数（削除済みのセグメントのレコードは数えません）
+    """
+    marked = 0
+    by_segment = {}
+    for segment, offset in positions:
+        by_segment.setdefault(segment, []).append(offset)
+    flags = _FLAGS.pack(FLAG_APPLIED)
+    for segment, offsets in by_segment.items():
+        try:
+            fd = os.open(os.path.join(directory, segment), os.O_WRONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            for offset in offsets:
+                os.pwrite(fd, flags, offset + _FLAGS_OFFSET)
+                marked += 1
+        finally:
+            os.close(fd)
+    return marked
+
+
+def purge_applied_segments(directory, retention_seconds=DEFAULT_RETENTION_SECONDS, exclude=(), now=None):
+    """
+    封印したセグメントのうち、全レコードが適用済みで保持期間を過ぎたものを削除する関数
+
+    保持期間は、セグメント内の最新のp_rv_date（不明な場合はインデックスの更新時刻）から数えます。
+
+    Args:
+        directory (str): ジャーナルのディレクトリ
+        retention_seconds (float): 適用済みのセグメントを残す秒数（0の場合はすぐに削除）
+        exclude (iterable): 削除しないセグメントのファイル名（書き込み中のセグメントなど）
+        now (float): 現在時刻（エポック秒、省略時は time.time()）
+
+    Returns:
+        list: 削除したセグメントのファイル名のリスト
+    """
+    now = time.time() if now is None else now
+    exclude = set(exclude)
+    removed = []
+    for segment in list_segments(directory):
+        if segment in exclude:
+            continue
+        index_path = os.path.join(directory, segment[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX)
+        if not os.path.exists(index_path):
+            # 封印前のセグメント
+            continue
+        with open(index_path) as file:
+            index = json.load(file)
+        last_ms = index.get("last_p_rv_date_ms")
+        last_seen = last_ms / 1000 if last_ms else os.path.getmtime(index_path)
+        if now - last_seen < retention_seconds:
+            continue
+        path = os.path.join(directory, segment)
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size > 0:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    if not _all_applied(buffer):
+                        continue
+        os.remove(path)
+        os.remove(index_path)
+        removed.append(segment)
+    return removed
+
+
+class ResponseJournal:
+    """
+    時価情報の応答を追記するセグメント化されたジャーナルクラス
+
+    Attributes:
+        directory (str): ジャーナルのディレクトリ
+        segment_bytes (int): 1セグメントの最大バイト数
+        sync (bool): 追記毎にmsyncするかどうか
+        retention_seconds (float): 適用済みのセグメントを残す秒数（Noneの場合は削除しない）
+        stats (dict): 追記件数やバイト数、適用済みのレコード数、削除したセグメント数の統計
+
+    Methods:
+        append(text, tick_id): 応答を追記するメソッド
+        mark_applied(rows): 行の元になったレコードに適用済みフラグを立てるメソッド
+        mark_dropped(rows): 行を捨てたレコードに適用済みフラグを立てないようにするメソッド
+        rotate(): 現在のセグメントを封印して新しいセグメントに切り替えるメソッド
+        close(): 現在のセグメントを封印してジャーナルを閉じるメソッド
+    """
+
+    def __init__(self, directory, segment_bytes=DEFAULT_SEGMENT_BYTES, sync=False,
+                 retention_seconds=DEFAULT_RETENTION_SECONDS):
+        """
+        ジャーナルクラスのコンストラクタ
+
+        Args:
+            directory (str): ジャーナルのディレクトリ（存在しない場合は作成します）
+            segment_bytes (int): 1セグメントの最大バイト数
+            sync (bool): 追記毎にmsyncするかどうか
+            retention_seconds (float): 適用済みのセグメントを残す秒数（Noneの場合は削除しない）
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.sync = sync
+        self.retention_seconds = retention_seconds
+        self.stats = {
+            "records": 0, "bytes": 0, "segments": 0, "append_errors": 0,
+            "applied_records": 0, "dropped_records": 0, "purged_segments": 0,
+        }
+        # 行を捨てたレコードの位置（適用済みフラグを立てない）
+        self._dropped = set()
+        self._lock = threading.Lock()
+        self._file = None
+        self._mmap = None
+        self._segment = None
+        self._offset = 0
+        self._index = None
+
+        os.makedirs(directory, exist_ok=True)
+
+        # 前回のプロセスが書き込んでいたセグメントを封印（書き込み途中のレコードはここで切り捨てる）
+        segments = list_segments(directory)
+        for segment in segments:
+            if not os.path.exists(os.path.join(directory, segment[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX)):
+                seal_segment(directory, segment)
+        self._next_sequence = int(segments[-1][:-len(SEGMENT_SUFFIX)]) + 1 if segments else 0
+        self._purge()
+
+    def _open_segment(self, min_bytes):
+        """
+        新しいセグメントを作成してメモリマップする関数
+
+        Args:
+            min_bytes (int): 最低限必要なバイト数
+        """
+        self._segment = _segment_name(self._next_sequence)
+        self._next_sequence += 1
+        size = max(self.segment_bytes, min_bytes)
+        self._file = open(os.path.join(self.directory, self._segment), "w+b")
+        self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        self._offset = 0
+        self._index = {"first_p_rv_date_ms": None, "last_p_rv_date_ms": None, "records": 0, "size": 0}
+        self.stats["segments"] += 1
+
+    def _seal_current(self):
+        """
+        現在のセグメントを封印する関数（ロックを取得した状態で呼び出します）
+        """
+        if self._mmap is None:
+            return
+        self._mmap.flush()
+        self._mmap.close()
+        self._file.truncate(self._offset)
+        self._file.close()
+        _write_json(
+            os.path.join(self.directory, self._segment[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX), self._index
+        )
+        self._mmap = None
+        self._file = None
+
+    def append(self, text, tick_id=None):
+        """
+        応答を追記するメソッド
+
+        Args:
+            text (str): 応答の文字列
+            tick_id (int): スナップショットのtick_id（不明な場合はNone）
+
+        Returns:
+            tuple: (セグメントのファイル名, レコードのオフセット)
+        """
+        payload = text.encode("utf-8")
+        record_size = _HEADER.size + len(payload)
+        p_rv_date_ms = _p_rv_date_ms(payload)
+        header = _HEADER.pack(_MAGIC, len(payload), zlib.crc32(payload), 0, p_rv_date_ms, tick_id or 0)
+
+        rotated = False
+        with self._lock:
+            if self._mmap is None or self._offset + record_size > len(self._mmap):
+                rotated = self._mmap is not None
+                self._seal_current()
+                self._open_segment(record_size)
+
+            offset = self._offset
+            payload_start = offset + _HEADER.size
+            # ペイロードを書いてからヘッダーを書く（途中で停止したレコードはCRCの不一致で読み飛ばされる）
+            self._mmap[payload_start:payload_start + len(payload)] = payload
+            self._mmap[offset:payload_start] = header
+            if self.sync:
+                self._mmap.flush()
+            self._offset = payload_start + len(payload)
+            _update_index(self._index, p_rv_date_ms, self._offset)
+            self.stats["records"] += 1
+            self.stats["bytes"] += record_size
+            position = (self._segment, offset)
+        if rotated:
+            # セグメントを切り替えた時に、保持期間を過ぎた適用済みのセグメントを削除する
+            self._purge()
+        return position
+
+    def mark_applied(self, rows):
+        """
+        行の元になったレコードに適用済みフラグを立てるメソッド（書き込みが確定した後に呼び出します）
+
+        Args:
+            rows (list or ItaColumnarBatch or ParsedShard): 書き込んだ株価データ
+        """
+        positions = journal_positions(rows)
+        if not positions:
+            return
+        sealed = []
+        flags = _FLAGS.pack(FLAG_APPLIED)
+        with self._lock:
+            for position in positions:
+                if position in self._dropped:
+                    continue
+                segment, offset = position
+                if segment == self._segment and self._mmap is not None:
+                    self._mmap[offset + _FLAGS_OFFSET:offset + _FLAGS_OFFSET + _FLAGS.size] = flags
+                else:
+                    sealed.append(position)
+                self.stats["applied_records"] += 1
+        if sealed:
+            mark_records_applied(self.directory, sealed)
+
+    def mark_dropped(self, rows):
+        """
+        行を捨てたレコードに、以後は適用済みフラグを立てないようにするメソッド
+
+        Args:
+            rows (list or ItaColumnarBatch): 捨てた株価データ
+        """
+        positions = journal_positions(rows)
+        with self._lock:
+            new_positions = positions - self._dropped
+            self._dropped.update(new_positions)
+            self.stats["dropped_records"] += len(new_positions)
+
+    def _purge(self):
+        """
+        保持期間を過ぎた適用済みのセグメントを削除するメソッド（書き込み中のセグメントは除きます）
+        """
+        if self.retention_seconds is None:
+            return
+        with self._lock:
+            exclude = (self._segment,) if self._segment is not None else ()
+        removed = purge_applied_segments(self.directory, self.retention_seconds, exclude=exclude)
+        if removed:
+            with self._lock:
+                self.stats["purged_segments"] += len(removed)
+                self._dropped = {position for position in self._dropped if position[0] not in removed}
+
+    def rotate(self):
+        """
+        現在のセグメントを封印し、次の追記から新しいセグメントに書き込むメソッド
+        """
+        with self._lock:
+            self._seal_current()
+
+    def close(self):
+        """
+        現在のセグメントを封印してジャーナルを閉じるメソッド
+
+        Returns:
+            dict: 追記件数やバイト数、適用済みのレコード数、削除したセグメント数の統計
+        """
+        with self._lock:
+            self._seal_current()
+            self._segment = None
+        self._purge()
+        return dict(self.stats)
+
+
+def install_response_journal(journal, logger=None):
+    """
+    request_market_price の応答をジャーナルに追記するフックを設定する関数
+
+    ジャーナルへの追記に失敗した場合（ディスクフルなど）は、データベースへの書き込みを止めないように
+    エラーを記録して続行します。追記した位置は株価データの journal_position に付与され、
+    書き込みが確定した時点で ResponseJournal.mark_applied に渡されます。
+
+    Args:
+        journal (ResponseJournal): 追記先のジャーナル（Noneの場合はフックを解除）
+        logger (logging.Logger): ロガーインスタンス（省略可能）
+    """
+    if journal is None:
+        set_response_hook(None)
+        return
+
+    def hook(text):
+        try:
+            return journal.append(text, tick_id=current_tick_id())
+        except (OSError, ValueError) as error:
+            journal.stats["append_errors"] += 1
+            if logger is not None:
+                handle_log(logger, f"Failed to append to the response journal: {error}", logging.WARNING)
+            return None
+
+    set_response_hook(hook)
+
+
+def load_checkpoint(directory):
+    """
+    リプレイで適用済みの位置を読み込む関数
+
+    Args:
+        directory (str): ジャーナルのディレクトリ
+
+    Returns:
+        tuple: (セグメントのファイル名, オフセット)（未適用の場合は (None, 0)）
+    """
+    path = os.path.join(directory, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return None, 0
+    with open(path) as file:
+        checkpoint = json.load(file)
+    return checkpoint["segment"], checkpoint["offset"]
+
+
+def save_checkpoint(directory, segment, offset):
+    """
+    リプレイで適用済みの位置を保存する関数
+
+    Args:
+        directory (str): ジャーナルのディレクトリ
+        segment (str): セグメントのファイル名
+        offset (int): 次に適用するレコードのオフセット
+    """
+    _write_json(os.path.join(directory, CHECKPOINT_FILE), {"segment": segment, "offset": offset})
+
+
+def iter_records(directory, start=(None, 0), since_ms=None, until_ms=None):
+    """
+    ジャーナルのレコードを古い順に返すジェネレータ
+
+    Args:
+        directory (str): ジャーナルのディレクトリ
+        start (tuple): 読み始める位置（セグメントのファイル名, オフセット）
+        since_ms (int): この時刻（エポックミリ秒）以降のp_rv_dateのレコードだけを返す（省略可能）
+        until_ms (int): この時刻（エポックミリ秒）より前のp_rv_dateのレコードだけを返す（省略可能）
+
+    Yields:
+        JournalRecord: ジャーナルのレコード
+    """
+    start_segment, start_offset = start
+    for segment in list_segments(directory):
+        if start_segment is not None and segment < start_segment:
+            continue
+        offset = start_offset if segment == start_segment else 0
+
+        # インデックスでp_rv_dateの範囲が重ならないセグメントを読み飛ばす
+        if since_ms is not None or until_ms is not None:
+            index = read_segment_index(directory, segment)
+            if index["records"] == 0:
+                continue
+            if since_ms is not None and index["last_p_rv_date_ms"] is not None \
+                    and index["last_p_rv_date_ms"] < since_ms:
+                continue
+            if until_ms is not None and index["first_p_rv_date_ms"] is not None \
+                    and index["first_p_rv_date_ms"] >= until_ms:
+                continue
+
+        with open(os.path.join(directory, segment), "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                continue
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                for record_offset, end, p_rv_date_ms, tick_id, payload_start, flags in _scan(buffer, offset):
+                    if since_ms is not None and p_rv_date_ms < since_ms:
+                        continue
+                    if until_ms is not None and p_rv_date_ms >= until_ms:
+                        continue
+                    yield JournalRecord(
+                        segment, record_offset, end, p_rv_date_ms, tick_id or None, buffer[payload_start:end],
+                        bool(flags & FLAG_APPLIED),
+                    )
+
+
+def replay_journal(db_params, directory, since=None, until=None, chunk_rows=DEFAULT_REPLAY_CHUNK_ROWS,
+                   logger=None, include_applied=False, retention_seconds=None):
+    """
+    ジャーナルの未適用のレコードをita_tableに書き込み、適用済みフラグを立てる関数
+
+    Args:
+        db_params (dict): データベースへの接続情報が格納された辞書
+        directory (str): ジャーナルのディレクトリ
+        since (datetime.datetime): この時刻以降のp_rv_dateのレコードだけを書き込む（省略可能）
+        until (datetime.datetime): この時刻より前のp_rv_dateのレコードだけを書き込む（省略可能）
+        chunk_rows (int): 1トランザクションで書き込む行数の目安
+        logger (logging.Logger): ロガーインスタンス（省略可能）
+        include_applied (bool): 適用済みのレコードも書き込むかどうか
+        retention_seconds (float): リプレイの後に、保持期間を過ぎた適用済みのセグメントを削除する（Noneの場合は削除しない）
+
+    Returns:
+        dict: レコード数、書き込んだ行数、適用済みとして除外したレコード数、削除したセグメント数などの統計
+    """
+    stats = {
+        "records": 0, "applied_records": 0, "applied_rows": 0, "skipped_records": 0, "invalid_records": 0,
+        "purged_segments": 0,
+    }
+    use_checkpoint = since is None and until is None and not include_applied
+    start = load_checkpoint(directory) if use_checkpoint else (None, 0)
+
+    pending = []
+    pending_records = []
+    pending_rows = 0
+    last_record = None
+
+    def apply_pending():
+        stats["applied_rows"] += insert_journal_batches(db_params, pending)
+        stats["applied_records"] += len(pending_records)
+        # 書き込みをコミットしてから適用済みフラグを立てる
+        mark_records_applied(directory, [(record.segment, record.offset) for record in pending_records])
+        if use_checkpoint and last_record is not None:
+            save_checkpoint(directory, last_record.segment, last_record.next_offset)
+        if logger is not None and last_record is not None:
+            handle_log(logger, f"replayed up to {last_record.segment}:{last_record.next_offset}", logging.INFO)
+
+    for record in iter_records(
+        directory, start,
+        since_ms=None if since is None else to_epoch_ms(since),
+        until_ms=None if until is None else to_epoch_ms(until),
+    ):
+        stats["records"] += 1
+        last_record = record
+        if record.applied and not include_applied:
+            stats["skipped_records"] += 1
+            continue
+        try:
+            batch = decode_market_price(record.text())
+        except (ValueError, KeyError, TypeError):
+            # エラー応答など、株価データを含まないレコード
+            stats["invalid_records"] += 1
+            continue
+        if len(batch) == 0:
+            stats["invalid_records"] += 1
+            continue
+        batch.tick_id = record.tick_id
+        pending.append(batch)
+        pending_records.append(record)
+        pending_rows += len(batch)
+
+        if pending_rows >= chunk_rows:
+            apply_pending()
+            pending = []
+            pending_records = []
+            pending_rows = 0
+
+    if pending or (use_checkpoint and last_record is not None):
+        apply_pending()
+    if retention_seconds is not None:
+        stats["purged_segments"] = len(purge_applied_segments(directory, retention_seconds))
+    return stats
@@ -4,17 +4,25 @@
 
 ファイルの概要:
 - make_jpx_df(): 株価データのダウンロードから整形までの一連の処理を実行する関数
-- insert_jpx_to_db(db_params, df): 株価データをデータベースに挿入する関数
+- update_jpx_to_db(db_params, df): 株価データをデータベースに一括で反映する関数（値が変わった行だけ更新）
 - make_ipo_df(): IPOデータの抽出と整形を行う関数
-- update_ipo_to_db(df, db_params): IPOデータをデータベースに更新する関数
+- insert_ipo_to_db(db_params, df): IPOデータのうちデータベースにない銘柄を挿入する関数
+- refresh_master_data(db_params, cache_path, force): JPXとIPOのデータを並行してダウンロードし、
+  前回から変わっているものだけを解析してデータベースに反映する関数
 """
 
-import os
+import concurrent.futures
+import io
+import time
 import jaconv
 import pandas as pd
-from bs4 import BeautifulSoup
-from http_requests.set_code_requests import get_jpx_data, get_ipo_data
-from database.set_code_database import select_existing_codes, insert_rows_to_database, update_rows_on_database
+from http_requests.set_code_requests import (
+    IPO_LIST_URL, JPX_DATA_URL, DownloadCache, download_if_changed, get_jpx_data, get_ipo_data
+)
+from http_requests.ipo_table_parser import extract_ipo_rows
+from database.set_code_database import (
+    MASTER_COLUMNS, insert_rows_to_database, master_table_has_rows, update_rows_on_database
+)
 
 
 def make_jpx_df():
@@ -24,19 +32,22 @@ def make_jpx_df():
     Returns:
         pd.DataFrame: 整形された株価データが格納されたDataFrame
     """
-    # ファイルパスを指定
-    file_path = "data_j.xls"
-    # データの処理
     response = get_jpx_data()
+    return parse_jpx_df(response.content)
 
-    with open(file_path, "wb") as file:
-        file.write(response.content)
 
-    # Excelファイルを読み込む
-    df = pd.read_excel(file_path)
+def parse_jpx_df(content):
+    """
+    ダウンロードした株価データ（data_j.xls）を整形する関数
 
-    # データの前処理などの処理
-    os.remove(file_path)
+    Args:
+        content (bytes): data_j.xls の内容
+
+    Returns:
+        pd.DataFrame: 整形された株価データが格納されたDataFrame
+    """
+    # Excelファイルをメモリ上のバッファから読み込む（ファイルには書き出さない）
+    df = pd.read_excel(io.BytesIO(content))
 
     if "日付" in df.columns:
         df.drop("日付", axis=1, inplace=True)
@@ -90,18 +101,20 @@ def make_jpx_df():
     return df
 
 
-def update_jpx_to_db(df, db_params):
+def update_jpx_to_db(db_params, df):
     """
-    IPOデータをデータベースに更新する関数
+    株価データ（JPXの銘柄一覧）をデータベースに一括で反映する関数
 
     Args:
-        df (pd.DataFrame): 更新するIPOデータが格納されたDataFrame
         db_params (dict): データベースへの接続情報が格納された辞書
+        df (pd.DataFrame): 反映する株価データが格納されたDataFrame
 
     Returns:
-        None
+        dict: 読み込んだ行数、挿入・更新・変化のなかった行数
     """
-    update_rows_on_database(df, db_params)
+    # DataFrameにない列と欠損値はNULLとして書き込む
+    rows = df.reindex(columns=list(MASTER_COLUMNS)).itertuples(index=False, name=None)
+    return update_rows_on_database(db_params, rows)
 
 
 def make_ipo_df():
@@ -112,52 +125,98 @@ def make_ipo_df():
     pd.DataFrame: 抽出・整形したIPOデータが格納されたDataFrame
     """
     response = get_ipo_data()
-    html_content = response.text
-
-    # BeautifulSoupを使用してHTMLを解析
-    soup = BeautifulSoup(html_content, "html.parser")
+    return parse_ipo_df(response.text)
 
-    # 2つ目のテーブルを取得
-    tables = pd.read_html(str(soup), header=0)  # 1行目をヘッダーとして使用
-    # 必要な列を抽出
-    df = tables[1].loc[:, ["ｺｰﾄﾞ", "銘柄", "市場"]]
-    # 0番目のテーブルを選択し、必要な列を抽出
 
-    # 列名を指定して変更
-    df = df.rename(
-        columns={"ｺｰﾄﾞ": "code", "銘柄": "name", "市場": "market_product_category"}
-    )
+def parse_ipo_df(html_content):
+    """
+    ダウンロードしたIPOデータのHTMLから、IPOデータのdfを作成する関数
 
-    # 条件に合致する行の抽出と文字列の置換
-    df = df[df["market_product_category"].str.startswith("東")]
+    Args:
+    html_content (str): IPO一覧のHTML
 
-    # "市場"列の文字列から"東"を削除
-    df["market_product_category"] = df["market_product_category"].str.replace(
-        "東", "", regex=False
+    Returns:
+    pd.DataFrame: 抽出・整形したIPOデータが格納されたDataFrame
+    """
+    # 見出しに ｺｰﾄﾞ / 銘柄 / 市場 を含む表だけを1回の走査で読み込み、東証以外と上場中止の行は解析中に捨てる
+    parser = extract_ipo_rows(html_content)
+    index, codes, names, markets = zip(*parser.rows) if parser.rows else ((), (), (), ())
+
+    # pd.read_html と同じく、コードがすべて整数の場合は数値の列にする（空のコードがある場合は浮動小数点数）
+    code = pd.Series(codes, index=index)
+    if parser.code_dtype is not None:
+        code = pd.to_numeric(code).astype(parser.code_dtype)
+    return pd.DataFrame(
+        {
+            "code": code,
+            "name": pd.Series(names, index=index, dtype=str),
+            "market_product_category": pd.Series(markets, index=index, dtype=str),
+        },
+        index=pd.Index(index, dtype="int64"),
     )
 
-    # 'name'列に"(中止)"を含まない行だけを残す
-    df = df[~df["name"].str.contains("中止")]
-
-    return df
-
 
 def insert_ipo_to_db(db_params, df):
     """
-    株価データをデータベースに挿入する関数
+    株価データ（IPO銘柄）のうち、データベースにない銘柄を挿入する関数
 
     Args:
         db_params (dict): データベースへの接続情報が格納された辞書
         df (pd.DataFrame): 挿入する株価データが格納されたDataFrame
 
     Returns:
-        None
+        int: 挿入した行数
+    """
+    # コードが空の行は挿入できないため除く（空のコードがある場合、コードの列は浮動小数点数になる）
+    df = df.dropna(subset=["code"])
+    rows = df.loc[:, ["code", "name", "market_product_category"]].itertuples(index=False, name=None)
+    return insert_rows_to_database(db_params, rows)
+
+
+def refresh_master_data(db_params, cache_path=None, force=False):
     """
-    existing_codes = select_existing_codes(db_params)
+    JPXとIPOのデータを並行してダウンロードし、前回から変わっているものだけを解析してデータベースに反映する関数
+
+    条件付きリクエスト（ETag / Last-Modified）で304が返された場合や、内容のハッシュが前回と同じ場合は、
+    解析とデータベースへの反映を行いません。キャッシュはデータベースへの反映が成功した後に更新します。
+    キャッシュはデータベースとは別のファイルのため、master_stock_tableが空の場合（データベースを作り直した場合等）は
+    キャッシュを使わずにすべて反映します。
 
-    new_rows_to_insert = df.loc[~df["code"].isin(existing_codes)]
+    Args:
+        db_params (dict): データベースへの接続情報が格納された辞書
+        cache_path (str): ETag・Last-Modified・ハッシュを保存するファイルのパス（Noneの場合は保存しない）
+        force (bool): Trueの場合はキャッシュを使わずにすべて反映する
 
-    if not new_rows_to_insert.empty:
-        for _, row in new_rows_to_insert.iterrows():
-            data = (row["code"], row["name"], row["market_product_category"])
-            insert_rows_to_database(db_params, data)
+    Returns:
+        dict: jpx / ipo 毎の結果（status、反映した件数、所要時間）、キャッシュを使ったかどうかと全体の所要時間
+    """
+    start_time = time.perf_counter()
+    use_cache = cache_path is not None and not force and master_table_has_rows(db_params)
+    cache = DownloadCache(cache_path if use_cache else None)
+    # JPXとIPOのダウンロードは並行して行う
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        jpx_future = executor.submit(download_if_changed, JPX_DATA_URL, cache)
+        ipo_future = executor.submit(download_if_changed, IPO_LIST_URL, cache)
+        jpx_download = jpx_future.result()
+        ipo_download = ipo_future.result()
+    download_time = time.perf_counter() - start_time
+    # キャッシュを使わなかった場合も、反映した結果は保存して次回から使う
+    cache.path = cache_path
+
+    stats = {"download_seconds": round(download_time, 3), "cache_used": use_cache}
+    # 新規上場の銘柄がJPXの一覧に載った場合にJPXの内容で上書きされるよう、JPX → IPO の順に反映する
+    for name, download, apply in (
+        ("jpx", jpx_download, lambda downloaded: update_jpx_to_db(db_params, parse_jpx_df(downloaded.content))),
+        ("ipo", ipo_download, lambda downloaded: insert_ipo_to_db(db_params, parse_ipo_df(downloaded.text))),
+    ):
+        if not download.changed:
+            stats[name] = {"status": download.status}
+            continue
+        step_start = time.perf_counter()
+        result = apply(download)
+        cache.update(download)
+        stats[name] = {
+            "status": download.status, "result": result, "seconds": round(time.perf_counter() - step_start, 3),
+        }
+    stats["seconds"] = round(time.perf_counter() - start_time, 3)
+    return stats
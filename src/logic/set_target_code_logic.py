@@ -5,7 +5,7 @@
 ファイル内の主な処理ステップ:
 1. 必要なモジュールのインポート: PostgreSQLデータベースへの接続やコードの更新に必要なモジュールをインポートします。
 2. コードリストの取得: 指定されたapi_id_valueを持つmaster_stock_tableのコードを取得する関数を定義します。
-3. コードの更新: master_stock_tableの指定されたコードリストに該当する各行のapi_idを更新する関数を定義します。
+3. コードの更新: master_stock_tableの指定されたコードリストに該当する行のapi_idを1つのUPDATE文で更新する関数を定義します。
 
 注意事項:
 - このスクリプトは、特定のデータベースに対してコードの更新を行います。正確なデータベース接続情報やコードリストが提供されていることを確認してください。
@@ -62,16 +62,15 @@ def get_target_code_list(api_id_value, connection):
 
 def update_target_codes(db_params, code_list, api_id_value):
     """
-    master_stock_tableの指定されたコードリストに該当する各行のapi_idを更新する関数
+    master_stock_tableの指定されたコードリストに該当する行のapi_idを一括で更新する関数
 
     Args:
     code_list (list): 更新対象となるコードリスト
     api_id_value (str): 挿入するapi_idの値
 
     Returns:
-    None
+    int: 更新した行数
     """
 
-    # コードリストに該当する各行にapi_idを挿入
-    for code in code_list:
-        update_codes_by_api_id(db_params, api_id_value, code)
+    # コードリストに該当する行のapi_idを1つのUPDATE文で更新
+    return update_codes_by_api_id(db_params, api_id_value, code_list)
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、銘柄コードリストを複数のシャードに分割して株価データを並行取得する関数を提供するモジュールです。
+
+ファイル内の主な処理ステップ:
+1. 銘柄コードリストを指定サイズのシャードに分割します。
+2. シャード毎に get_stock_data を並行して実行します。
+3. 各シャードの行に同じtick_idを付与し、1つの論理的なスナップショットとして結合します。
+   応答をジャーナルに追記した場合は、その位置（journal_position）も付与します。
+4. シャード毎のレイテンシと失敗件数を集計します。
+
+注意事項:
+- シャードが完了した順に on_shard が呼ばれるため、遅いシャードはそのシャードの銘柄だけを遅らせます。
+- 一部のシャードが失敗した場合、成功したシャードの処理を終えた後に ShardFetchError を発生させます。
+"""
+import concurrent.futures
+import os
+import threading
+import time
+from http_requests.insert_ita_requests import get_stock_data, pop_journal_position
+from http_requests.market_price_decoder import ItaColumnarBatch
+from utilities.custom_exceptions import ShardFetchError
+from utilities.metrics import counter
+
+SHARD_FAILURES = counter("ita_shard_failures_total", "Failed shard fetches.")
+
+# シャード取得用のスレッド数の既定値
+DEFAULT_SHARD_WORKERS = 16
+
+_shard_executor = None
+_shard_executor_lock = threading.Lock()
+
+_tick_id_lock = threading.Lock()
+_last_tick_id = 0
+_tick_context = threading.local()
+
+_shard_stats_lock = threading.Lock()
+_shard_stats = {}
+
+
+def next_tick_id(scheduled_tick_id=None):
+    """
+    tick_id（エポックミリ秒を基準にした整数）を返す関数
+
+    スケジューラが決めたtick_idはそのまま返します（TickScheduler がtick_idの増加を保証しているため、
+    シャードのスレッドが開始する順序に関わらず、別のコレクターの行とtick_idで揃います）。
+    省略時は現在時刻を基準に、それまでのtick_idより大きい値を採番します。
+
+    Args:
+        scheduled_tick_id (int): スケジューラが決めたtickの予定時刻（エポックミリ秒、省略可能）
+
+    Returns:
+        int: tick_id
+    """
+    global _last_tick_id
+    with _tick_id_lock:
+        if scheduled_tick_id is not None:
+            _last_tick_id = max(_last_tick_id, scheduled_tick_id)
+            return scheduled_tick_id
+        _last_tick_id = max(_last_tick_id + 1, time.time_ns() // 1_000_000)
+        return _last_tick_id
+
+
+def current_tick_id():
+    """
+    呼び出し元のスレッドで取得中のシャードのtick_idを返す関数
+
+    Returns:
+        int: tick_id（シャードの取得中でない場合はNone）
+    """
+    return getattr(_tick_context, "tick_id", None)
+
+
+def split_code_list(code_list, shard_size):
+    """
+    銘柄コードリストを指定サイズのシャードに分割する関数
+
+    Args:
+        code_list (list): 銘柄コードのリスト
+        shard_size (int): 1シャードあたりの銘柄数（Noneまたは0以下の場合は分割しない）
+
+    Returns:
+        list: シャード（銘柄コードのリスト）のリスト
+    """
+    if not shard_size or shard_size <= 0 or len(code_list) <= shard_size:
+        return [list(code_list)]
+    return [list(code_list[i:i + shard_size]) for i in range(0, len(code_list), shard_size)]
+
+
+def _get_shard_executor():
+    """
+    シャード取得用のプロセス共通ThreadPoolExecutorを返す関数
+
+    Returns:
+        concurrent.futures.ThreadPoolExecutor: シャード取得用のExecutor
+    """
+    global _shard_executor
+    if _shard_executor is None:
+        with _shard_executor_lock:
+            if _shard_executor is None:
+                max_workers = int(os.environ.get("ITA_SHARD_WORKERS", DEFAULT_SHARD_WORKERS))
+                _shard_executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix="ita-shard"
+                )
+    return _shard_executor
+
+
+def _record_shard_result(shard_index, latency, failed):
+    """
+    シャード毎のレイテンシと失敗件数を集計する関数
+
+    Args:
+        shard_index (int): シャードの番号
+        latency (float): 取得にかかった秒数
+        failed (bool): 失敗したかどうか
+    """
+    with _shard_stats_lock:
+        stats = _shard_stats.setdefault(
+            shard_index, {"requests": 0, "failures": 0, "latency_total": 0.0, "latency_max": 0.0}
+        )
+        stats["requests"] += 1
+        stats["latency_total"] += latency
+        stats["latency_max"] = max(stats["latency_max"], latency)
+        if failed:
+            stats["failures"] += 1
+    if failed:
+        SHARD_FAILURES.inc(shard=shard_index)
+
+
+def get_shard_stats():
+    """
+    シャード毎のリクエスト数、失敗件数、平均・最大レイテンシを返す関数
+
+    Returns:
+        dict: シャード番号をキーとする統計の辞書
+    """
+    with _shard_stats_lock:
+        return {
+            index: dict(stats, latency_avg=stats["latency_total"] / stats["requests"])
+            for index, stats in _shard_stats.items()
+        }
+
+
+def _fetch_shard(tachibana_account, shard_index, shard, tick_id, fetch):
+    """
+    1シャード分の株価データを取得し、tick_idを付与して返す関数
+
+    Args:
+        tachibana_account (TachibanaAccount): 立花証券口座属性クラスのインスタンス
+        shard_index (int): シャードの番号
+        shard (list): シャードの銘柄コードのリスト
+        tick_id (int): スナップショットのtick_id
+        fetch (callable): 株価データを取得する関数
+
+    Returns:
+        list or ItaColumnarBatch: tick_idと応答のジャーナル上の位置を付与した株価データ
+    """
+    start_time = time.monotonic()
+    _tick_context.tick_id = tick_id
+    pop_journal_position()
+    try:
+        rows = fetch(tachibana_account, shard)
+    except Exception:
+        _record_shard_result(shard_index, time.monotonic() - start_time, True)
+        raise
+    finally:
+        _tick_context.tick_id = None
+        journal_position = pop_journal_position()
+    _record_shard_result(shard_index, time.monotonic() - start_time, False)
+
+    # ItaColumnarBatch や ParsedShard（logic.parse_pool_logic）は属性にtick_idを持つ
+    if not isinstance(rows, list):
+        rows.tick_id = tick_id
+        rows.journal_position = journal_position
+        return rows
+    for row in rows:
+        row["tick_id"] = tick_id
+        if journal_position is not None:
+            row["journal_position"] = journal_position
+    return rows
+
+
+def fetch_sharded_snapshot(tachibana_account, code_list, shard_size=None, on_shard=None, fetch=get_stock_data,
+                           tick_id=None):
+    """
+    銘柄コードリストをシャードに分割して並行取得し、1つのスナップショットに結合する関数
+
+    Args:
+        tachibana_account (TachibanaAccount): 立花証券口座属性クラスのインスタンス
+        code_list (list): 株価データを取得する銘柄コードのリスト
+        shard_size (int): 1シャードあたりの銘柄数（省略時は分割しない）
+        on_shard (callable): シャードの取得が完了する毎に、そのシャードの行のリストを渡して呼ぶ関数（省略可能）
+        fetch (callable): 株価データを取得する関数（get_stock_data または get_stock_data_columnar）
+        tick_id (int): tickの予定時刻（エポックミリ秒、TickSchedulerのtick_id）。省略時は現在時刻を使用
+
+    Returns:
+        list or ItaColumnarBatch: 全シャードの株価データを結合したもの（全行に同じtick_idが付与されています）
+            fetch が ParsedShard を返す場合は、シャード毎の ParsedShard のリスト
+
+    Raises:
+        ShardFetchError: 一部のシャードの取得に失敗した場合
+    """
+    tick_id = next_tick_id(tick_id)
+    shards = split_code_list(code_list, shard_size)
+
+    # 分割しない場合は呼び出し元のスレッドでそのまま取得
+    if len(shards) == 1:
+        rows = _fetch_shard(tachibana_account, 0, shards[0], tick_id, fetch)
+        if on_shard is not None:
+            on_shard(rows)
+        return rows
+
+    executor = _get_shard_executor()
+    futures = {
+        executor.submit(_fetch_shard, tachibana_account, index, shard, tick_id, fetch): index
+        for index, shard in enumerate(shards)
+    }
+
+    results = []
+    errors = []
+    for future in concurrent.futures.as_completed(futures):
+        index = futures[future]
+        try:
+            rows = future.result()
+            if on_shard is not None:
+                on_shard(rows)
+        except Exception as error:
+            errors.append(f"shard {index}: {error}")
+            continue
+        results.append(rows)
+
+    if errors:
+        raise ShardFetchError(f"tick {tick_id}: {len(errors)}/{len(shards)} shards failed: {'; '.join(errors)}")
+
+    if isinstance(results[0], ItaColumnarBatch):
+        return ItaColumnarBatch.concat(results)
+    if not isinstance(results[0], list):
+        return results
+    return [row for rows in results for row in rows]
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、壁時計の境界（例: 毎秒0ミリ秒から100ミリ秒毎）に揃えてtickを発行するスケジューラを提供するモジュールです。
+
+ファイル内の主な処理ステップ:
+1. 次のtickの予定時刻を「interval の整数倍のエポック時刻」として決めます。
+2. 予定時刻までの待ち時間はモノトニック時計で測ります（壁時計の補正による揺れの影響を受けません）。
+3. 予定時刻から late_tolerance 秒以上遅れて発行したtickを late、1周期以上遅れて飛ばした境界を missed として数えます。
+4. 各tickには予定時刻（エポックミリ秒）を tick_id として付与します。
+
+注意事項:
+- 前のtickの処理時間に関係なく予定時刻は固定のため、日を跨いでも、別のコレクター同士でも同じ時刻に揃います。
+- 壁時計とモノトニック時計の対応は resync_interval 秒毎に取り直します（NTPによる補正に追従します）。
+- 壁時計が戻った場合でも、tick_idが前のtickより小さくなることはありません。
+- session_gate（logic.trading_session_logic）を指定すると、立会時間外は次の立会の直前まで待機し、
+  待機中に過ぎた境界は missed として数えずに現在時刻の次の境界から再開します。
+"""
+import asyncio
+import math
+import threading
+import time
+from utilities.metrics import counter, histogram
+
+TICKS_LATE = counter("ita_ticks_late_total", "Ticks fired later than the late tolerance.")
+TICKS_MISSED = counter("ita_ticks_missed_total", "Tick boundaries skipped because the scheduler fell behind.")
+TICK_LATENESS = histogram(
+    "ita_tick_lateness_seconds", "Delay between the scheduled tick boundary and the actual fire time.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+# 既定値
+DEFAULT_RESYNC_INTERVAL = 60.0
+
+
+class Tick:
+    """
+    発行したtickを表すクラス
+
+    Attributes:
+        tick_id (int): 予定時刻（エポックミリ秒）
+        scheduled_at (float): 予定時刻（エポック秒）
+        lateness (float): 予定時刻からの遅れ（秒）
+        missed (int): このtickの直前に飛ばした境界の数
+    """
+
+    __slots__ = ("tick_id", "scheduled_at", "lateness", "missed")
+
+    def __init__(self, tick_id, scheduled_at, lateness, missed):
+        self.tick_id = tick_id
+        self.scheduled_at = scheduled_at
+        self.lateness = lateness
+        self.missed = missed
+
+
+class TickScheduler:
+    """
+    壁時計の境界に揃えてtickを発行するスケジューラクラス
+
+    Attributes:
+        interval (float): tickの間隔（秒、1秒を割り切れる値を推奨）
+        late_tolerance (float): これ以上遅れたtickを late として数える秒数
+        stats (dict): 発行・遅延・欠落したtickの件数、立会時間外の待機から再開した回数
+        session_gate (SessionGate): 立会時間外に待機するゲート（Noneの場合は待機しない）
+
+    Methods:
+        wait(): 次のtickの予定時刻まで待ってTickを返すメソッド
+        wait_async(): wait() のasyncio版
+        set_interval(interval): tickの間隔を変更するメソッド
+        skip_to_now(): 過ぎた境界を飛ばし、現在時刻の次の境界から再開するメソッド
+    """
+
+    def __init__(self, interval=0.1, late_tolerance=None, resync_interval=DEFAULT_RESYNC_INTERVAL,
+                 session_gate=None):
+        """
+        スケジューラクラスのコンストラクタ
+
+        Args:
+            interval (float): tickの間隔（秒）
+            late_tolerance (float): これ以上遅れたtickを late として数える秒数（省略時は interval の10%）
+            resync_interval (float): 壁時計とモノトニック時計の対応を取り直す間隔（秒）
+            session_gate (SessionGate): 立会時間外に待機するゲート（省略可能）
+        """
+        if interval <= 0:
+            raise ValueError("interval must be greater than 0")
+        self.interval = interval
+        self.late_tolerance = interval * 0.1 if late_tolerance is None else late_tolerance
+        self.resync_interval = resync_interval
+        self.session_gate = session_gate
+        self.stats = {"ticks": 0, "late": 0, "missed": 0, "max_lateness": 0.0, "resumed": 0}
+        self._lock = threading.Lock()
+        # 最初のtickは現在時刻より後の最初の境界
+        self._skip_to_now()
+
+    def skip_to_now(self):
+        """
+        過ぎた境界を飛ばし、現在時刻の次の境界から再開するメソッド（飛ばした境界は missed として数えません）
+        """
+        with self._lock:
+            self._skip_to_now()
+
+    def _skip_to_now(self):
+        self._resync()
+        self._next_index = math.floor(self._wall_at(self._anchor_monotonic) / self.interval) + 1
+
+    def set_interval(self, interval):
+        """
+        tickの間隔を変更するメソッド（wait() / wait_async() と同じスレッドから呼び出します）
+
+        次のtickは、直前のtickの予定時刻より後の、新しい間隔の最初の境界になります。
+
+        Args:
+            interval (float): 新しいtickの間隔（秒、ミリ秒単位の値を推奨）
+        """
+        if interval <= 0:
+            raise ValueError("interval must be greater than 0")
+        if interval == self.interval:
+            return
+        last_scheduled = (self._next_index - 1) * self.interval
+        self.interval = interval
+        interval_ms = round(interval * 1000)
+        if interval_ms > 0 and abs(interval * 1000 - interval_ms) < 1e-9:
+            # 浮動小数点の誤差で直前と同じ境界を選ばないように、ミリ秒の整数で計算する
+            self._next_index = round(last_scheduled * 1000) // interval_ms + 1
+        else:
+            self._next_index = math.floor(last_scheduled / interval) + 1
+
+    def _resync(self):
+        """
+        壁時計とモノトニック時計の対応を取り直すメソッド
+        """
+        self._anchor_monotonic = time.monotonic()
+        self._anchor_wall = time.time()
+
+    def _wall_at(self, monotonic):
+        return self._anchor_wall + (monotonic - self._anchor_monotonic)
+
+    def _monotonic_at(self, wall):
+        return self._anchor_monotonic + (wall - self._anchor_wall)
+
+    def _delay(self):
+        """
+        次のtickの予定時刻までの秒数を返すメソッド
+
+        Returns:
+            float: 待ち時間（秒、過ぎている場合は0以下）
+        """
+        now = time.monotonic()
+        if now - self._anchor_monotonic >= self.resync_interval:
+            self._resync()
+            now = self._anchor_monotonic
+        return self._monotonic_at(self._next_index * self.interval) - now
+
+    def _fire(self):
+        """
+        予定時刻を過ぎたtickを発行するメソッド（遅れて飛ばした境界は missed として数える）
+
+        Returns:
+            Tick: 発行したtick
+        """
+        now_wall = self._wall_at(time.monotonic())
+        index = self._next_index
+        missed = max(math.floor(now_wall / self.interval) - index, 0)
+        index += missed
+        scheduled_at = index * self.interval
+        lateness = max(now_wall - scheduled_at, 0.0)
+        self._next_index = index + 1
+
+        self.stats["ticks"] += 1
+        self.stats["max_lateness"] = max(self.stats["max_lateness"], lateness)
+        TICK_LATENESS.observe(lateness)
+        if missed:
+            self.stats["missed"] += missed
+            TICKS_MISSED.inc(missed)
+        if lateness >= self.late_tolerance:
+            self.stats["late"] += 1
+            TICKS_LATE.inc()
+        return Tick(round(scheduled_at * 1000), scheduled_at, lateness, missed)
+
+    def wait(self):
+        """
+        次のtickの予定時刻まで待ってTickを返すメソッド
+
+        Returns:
+            Tick: 発行したtick
+        """
+        with self._lock:
+            if self.session_gate is not None and self.session_gate.wait():
+                self.stats["resumed"] += 1
+                self._skip_to_now()
+            delay = self._delay()
+            while delay > 0:
+                time.sleep(delay)
+                delay = self._delay()
+            return self._fire()
+
+    async def wait_async(self):
+        """
+        次のtickの予定時刻まで待ってTickを返すメソッド（asyncio版）
+
+        Returns:
+            Tick: 発行したtick
+        """
+        if self.session_gate is not None and await self.session_gate.wait_async():
+            self.stats["resumed"] += 1
+            self._skip_to_now()
+        delay = self._delay()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self._delay()
+        return self._fire()
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、立会時間外（寄付前・昼休み）に株価データの取得を止め、次の立会の直前まで待機するゲートを提供するモジュールです。
+
+ファイル内の主な処理ステップ:
+1. 現在時刻の区分を取引カレンダー（utilities.trading_calendar）から取得します。
+   区分はその終了時刻までキャッシュし、tick毎の判定では時刻の比較だけを行います。
+2. 寄付前・昼休みの場合は、次の立会の開始 lead 秒前まで待機します（待機中はAPIに要求しません）。
+3. 待機から戻ったことを呼び出し元（logic.tick_scheduler_logic）に返し、スケジューラは待機中の境界を
+   欠落として数えずに現在時刻から再開します。
+4. before_close() は大引けの時刻まで True を返します（コレクターのループの継続条件に使います）。
+
+遅れて起動した場合:
+- 立会中に起動した場合は、そのまま取得を始めます。
+- 昼休みに起動した場合は、前場の最後の板を残すために1回だけ取得してから後場まで待機します（catch_up）。
+- 大引け後に起動した場合は、ループは実行されず、呼び出し元の最後の1回の取得だけが行われます。
+
+注意事項:
+- 待機は max_sleep 秒毎に区切って行い、壁時計の補正があっても起床時刻を見直します。
+  区切る毎に utilities.metrics.heartbeat() を呼び、待機中も監視プロセスに生存を知らせます。
+"""
+import asyncio
+import datetime
+import logging
+import time
+from utilities.metrics import counter, heartbeat
+from utilities.trading_calendar import JST, LUNCH, PRE_OPEN, get_trading_calendar
+from utilities.utility import handle_log
+
+SESSION_SLEEP_SECONDS = counter("ita_session_sleep_seconds_total", "Seconds the collector slept outside sessions.")
+
+# 既定値
+DEFAULT_WAKE_LEAD = 5.0
+DEFAULT_MAX_SLEEP = 60.0
+
+
+class SessionGate:
+    """
+    立会時間外に取得を止め、次の立会の直前まで待機するゲートクラス
+
+    Attributes:
+        calendar (TradingCalendar): 取引カレンダー
+        lead (float): 立会の開始の何秒前に起床するか
+        stats (dict): 待機の回数・秒数、遅れて起動した場合の取得の回数
+
+    Methods:
+        wait(): 立会時間外であれば次の立会の直前まで待機するメソッド
+        wait_async(): wait() のasyncio版
+        before_close(): 大引けの時刻より前かどうかを返すメソッド
+    """
+
+    def __init__(self, calendar=None, lead=DEFAULT_WAKE_LEAD, max_sleep=DEFAULT_MAX_SLEEP, logger=None):
+        """
+        ゲートクラスのコンストラクタ
+
+        Args:
+            calendar (TradingCalendar): 取引カレンダー（省略時はプロセスで共有するカレンダー）
+            lead (float): 立会の開始の何秒前に起床するか
+            max_sleep (float): 1回の sleep の最大秒数
+            logger (logging.Logger): ロガーインスタンス（省略可能）
+        """
+        self.calendar = calendar or get_trading_calendar()
+        self.lead = lead
+        self.max_sleep = max_sleep
+        self.logger = logger
+        self.stats = {"sleeps": 0, "slept_seconds": 0.0, "catch_up": 0}
+        self._window = None
+        self._close_date = None
+        self._close_at = None
+        self._started = False
+        self._next_session = None
+
+    def _window_at(self, now):
+        """
+        現在時刻を含む区分を返すメソッド（区分の終了時刻までは前回の区分を使い回します）
+
+        Args:
+            now (float): 現在時刻（エポック秒）
+
+        Returns:
+            SessionWindow: 現在時刻を含む区分
+        """
+        window = self._window
+        if window is None or now not in window:
+            window = self._window = self.calendar.window_at(now)
+        return window
+
+    def _wake_at(self, now):
+        """
+        待機する場合の起床時刻を返すメソッド
+
+        Args:
+            now (float): 現在時刻（エポック秒）
+
+        Returns:
+            float: 起床時刻（エポック秒、待機しない場合はNone）
+        """
+        window = self._window_at(now)
+        if window.name not in (PRE_OPEN, LUNCH):
+            return None
+        wake_at = window.end - self.lead
+        if now >= wake_at:
+            return None
+        if not self._started and window.name == LUNCH:
+            # 昼休みに起動した場合は、前場の最後の板を1回取得してから待機する
+            self._started = True
+            self.stats["catch_up"] += 1
+            self._log("started during the lunch break: take one snapshot before sleeping", logging.INFO)
+            return None
+        return wake_at
+
+    def _log(self, message, log_level=logging.ERROR):
+        if self.logger is not None:
+            handle_log(self.logger, message, log_level)
+
+    def _begin_sleep(self, wake_at):
+        self.stats["sleeps"] += 1
+        self._next_session = self.calendar.window_at(self._window.end).name
+        wake_time = datetime.datetime.fromtimestamp(wake_at, JST).strftime("%H:%M:%S")
+        self._log(f"outside trading session ({self._window.name}): sleep until {wake_time}", logging.INFO)
+
+    def _end_sleep(self, slept):
+        self.stats["slept_seconds"] += slept
+        SESSION_SLEEP_SECONDS.inc(slept)
+        self._log(f"woke up for the {self._next_session} session after {slept:.0f}s", logging.INFO)
+
+    def wait(self):
+        """
+        立会時間外であれば次の立会の直前まで待機するメソッド
+
+        Returns:
+            bool: 待機した場合はTrue（呼び出し元はtickの境界を現在時刻から取り直します）
+        """
+        now = time.time()
+        wake_at = self._wake_at(now)
+        self._started = True
+        if wake_at is None:
+            return False
+        self._begin_sleep(wake_at)
+        start_time = time.monotonic()
+        remaining = wake_at - now
+        while remaining > 0:
+            time.sleep(min(remaining, self.max_sleep))
+            heartbeat()
+            remaining = wake_at - time.time()
+        self._end_sleep(time.monotonic() - start_time)
+        return True
+
+    async def wait_async(self):
+        """
+        立会時間外であれば次の立会の直前まで待機するメソッド（asyncio版）
+
+        Returns:
+            bool: 待機した場合はTrue
+        """
+        now = time.time()
+        wake_at = self._wake_at(now)
+        self._started = True
+        if wake_at is None:
+            return False
+        self._begin_sleep(wake_at)
+        start_time = time.monotonic()
+        remaining = wake_at - now
+        while remaining > 0:
+            await asyncio.sleep(min(remaining, self.max_sleep))
+            heartbeat()
+            remaining = wake_at - time.time()
+        self._end_sleep(time.monotonic() - start_time)
+        return True
+
+    def before_close(self):
+        """
+        大引けの時刻より前かどうかを返すメソッド（休業日はFalse）
+
+        Returns:
+            bool: 大引けの時刻より前であればTrue
+        """
+        now = time.time()
+        today = datetime.datetime.fromtimestamp(now, JST).date()
+        if today != self._close_date:
+            self._close_date = today
+            self._close_at = self.calendar.close_at(today)
+        return self._close_at is not None and now < self._close_at
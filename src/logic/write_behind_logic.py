@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、株価データの取得とデータベースへの書き込みを切り離すライトビハインドバッファを提供するモジュールです。
+
+ファイル内の主な処理ステップ:
+1. 取得したスナップショットの行をバッファに溜めます（put は待たずにすぐ戻ります）。
+2. 専用の書き込みスレッドが、行数が max_rows に達するか、最も古い行が max_age 秒を超えた時点で書き込みます。
+3. 1回の書き込み（flush）は1トランザクションで行います。
+4. close() を呼ぶと、バッファに残っている行をすべて書き込んでから書き込みスレッドを終了します。
+
+注意事項:
+- データベースが一時的に失敗した場合は、バッファに行を残したまま再試行します。
+- 書き込めていない行が max_pending_rows を超えた場合は、古い行から捨てて件数を記録します。
+- on_written / on_dropped を指定すると、書き込んだ行と捨てた行を通知します（変化検知フィルタの確定・取り消しに使います）。
+- max_rows / max_age を大きくするとスループットが上がり、小さくするとプロセス停止時に失うデータが減ります。
+"""
+import collections
+import logging
+import threading
+import time
+from database.insert_ita_database import insert_rows
+from utilities.metrics import counter, gauge
+from utilities.utility import handle_log
+
+ROWS_DROPPED = counter("ita_rows_dropped_total", "Rows dropped before reaching ita_table.")
+BUFFERED_ROWS = gauge("ita_write_behind_buffered_rows", "Rows waiting in the write-behind buffer.")
+
+# 既定値
+DEFAULT_MAX_ROWS = 2000
+DEFAULT_MAX_AGE = 1.0
+DEFAULT_MAX_PENDING_ROWS = 500000
+DEFAULT_RETRY_INTERVAL = 1.0
+
+
+class ItaWriteBehindBuffer:
+    """
+    スナップショットを溜めて一括で書き込むライトビハインドバッファクラス
+
+    Attributes:
+        db_params (dict): データベースへの接続情報が格納された辞書
+        max_rows (int): この行数に達したら書き込む
+        max_age (float): 最も古い行がこの秒数を超えたら書き込む
+        max_pending_rows (int): 書き込めていない行の上限
+        stats (dict): 書き込み回数や行数の統計
+
+    Methods:
+        put(rows): 行をバッファに追加するメソッド
+        flush(): バッファの内容をすぐに書き込むよう要求し、完了まで待つメソッド
+        close(): 残りの行をすべて書き込んで書き込みスレッドを終了するメソッド
+    """
+
+    def __init__(self, db_params, max_rows=DEFAULT_MAX_ROWS, max_age=DEFAULT_MAX_AGE,
+                 max_pending_rows=DEFAULT_MAX_PENDING_ROWS, retry_interval=DEFAULT_RETRY_INTERVAL,
+                 logger=None, write=insert_rows, on_written=None, on_dropped=None):
+        """
+        ライトビハインドバッファクラスのコンストラクタ
+
+        Args:
+            db_params (dict): データベースへの接続情報が格納された辞書
+            max_rows (int): この行数に達したら書き込む
+            max_age (float): 最も古い行がこの秒数を超えたら書き込む
+            max_pending_rows (int): 書き込めていない行の上限
+            retry_interval (float): 書き込みに失敗した場合に再試行するまでの秒数
+            logger (logging.Logger): ロガーインスタンス（省略可能）
+            write (callable): 行のリストを1トランザクションで書き込む関数（既定は insert_rows）
+            on_written (callable): 書き込みに成功した行のリストを受け取る関数（省略可能）
+            on_dropped (callable): 上限を超えて捨てた行のリストを受け取る関数（省略可能、ロックを取得した状態で呼びます）
+        """
+        self.db_params = db_params
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.max_pending_rows = max_pending_rows
+        self.retry_interval = retry_interval
+        self.logger = logger
+        self.write = write
+        self.on_written = on_written
+        self.on_dropped = on_dropped
+
+        self.stats = {
+            "flushes": 0,
+            "rows_written": 0,
+            "failures": 0,
+            "dropped_rows": 0,
+            "last_flush_seconds": 0.0,
+            "max_buffered_rows": 0,
+        }
+        self._rows = collections.deque()
+        self._oldest = None  # バッファ内で最も古い行を追加した時刻
+        self._condition = threading.Condition()
+        self._flush_requested = 0
+        self._flush_done = 0
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name="ita-write-behind", daemon=True)
+        self._thread.start()
+        BUFFERED_ROWS.set_function(self.buffered_rows)
+
+    def put(self, rows):
+        """
+        行をバッファに追加するメソッド
+
+        Args:
+            rows (list): 株価データの辞書のリスト
+        """
+        if not rows:
+            return
+        with self._condition:
+            if self._closing:
+                raise RuntimeError("write-behind buffer is closed")
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._rows.extend(rows)
+            self._drop_overflow()
+            self.stats["max_buffered_rows"] = max(self.stats["max_buffered_rows"], len(self._rows))
+            if len(self._rows) >= self.max_rows:
+                self._condition.notify_all()
+
+    def buffered_rows(self):
+        """
+        バッファ内の行数を返すメソッド
+
+        Returns:
+            int: バッファ内の行数
+        """
+        with self._condition:
+            return len(self._rows)
+
+    def _drop_overflow(self):
+        """
+        書き込めていない行が上限を超えた場合に古い行から捨てるメソッド（ロックを取得した状態で呼ぶ）
+        """
+        overflow = len(self._rows) - self.max_pending_rows
+        if overflow > 0:
+            dropped = [self._rows.popleft() for _ in range(overflow)]
+            if self.on_dropped is not None:
+                self.on_dropped(dropped)
+            self.stats["dropped_rows"] += overflow
+            ROWS_DROPPED.inc(overflow, reason="write_behind_overflow")
+
+    def _ready(self):
+        """
+        書き込むべき状態かどうかを返すメソッド（ロックを取得した状態で呼ぶ）
+
+        Returns:
+            bool: 書き込むべき状態であればTrue
+        """
+        if not self._rows:
+            return False
+        if self._closing or self._flush_requested > self._flush_done or len(self._rows) >= self.max_rows:
+            return True
+        return time.monotonic() - self._oldest >= self.max_age
+
+    def _run(self):
+        """
+        書き込みスレッドの処理
+        """
+        while True:
+            with self._condition:
+                while not self._ready():
+                    # 書き込む行がない場合は、flush の要求を完了扱いにする
+                    if self._flush_done < self._flush_requested:
+                        self._flush_done = self._flush_requested
+                        self._condition.notify_all()
+                    if self._closing:
+                        return
+                    timeout = None
+                    if self._oldest is not None:
+                        timeout = max(self._oldest + self.max_age - time.monotonic(), 0.0)
+                    self._condition.wait(timeout)
+
+                batch = list(self._rows)
+                self._rows.clear()
+                self._oldest = None
+                flush_target = self._flush_requested
+
+            if self._write_batch(batch):
+                with self._condition:
+                    self._flush_done = max(self._flush_done, flush_target)
+                    self._condition.notify_all()
+                continue
+
+            # 失敗した行はバッファの先頭に戻して再試行する（終了時も close の timeout まで再試行します）
+            with self._condition:
+                self._rows.extendleft(reversed(batch))
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+                self._drop_overflow()
+            time.sleep(self.retry_interval)
+
+    def _write_batch(self, batch):
+        """
+        行のリストを1トランザクションで書き込むメソッド
+
+        Args:
+            batch (list): 株価データの辞書のリスト
+
+        Returns:
+            bool: 書き込みに成功した場合はTrue
+        """
+        start_time = time.monotonic()
+        try:
+            self.write(self.db_params, batch)
+        except Exception as error:
+            with self._condition:
+                self.stats["failures"] += 1
+            if self.logger is not None:
+                handle_log(self.logger, f"write-behind flush failed ({len(batch)} rows): {error}")
+            return False
+
+        with self._condition:
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += len(batch)
+            self.stats["last_flush_seconds"] = time.monotonic() - start_time
+        if self.on_written is not None:
+            self.on_written(batch)
+        return True
+
+    def flush(self, timeout=None):
+        """
+        バッファの内容をすぐに書き込むよう要求し、完了まで待つメソッド
+
+        Args:
+            timeout (float): 待つ秒数の上限（省略時は無制限）
+
+        Returns:
+            bool: 時間内に書き込みが完了した場合はTrue
+        """
+        with self._condition:
+            self._flush_requested += 1
+            target = self._flush_requested
+            self._condition.notify_all()
+            return self._condition.wait_for(
+                lambda: self._flush_done >= target or not self._thread.is_alive(), timeout
+            ) and self._flush_done >= target
+
+    def close(self, timeout=None):
+        """
+        残りの行をすべて書き込んで書き込みスレッドを終了するメソッド
+
+        Args:
+            timeout (float): 待つ秒数の上限（省略時は無制限）
+
+        Returns:
+            dict: 書き込み回数や行数の統計
+        """
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        with self._condition:
+            remaining = len(self._rows)
+            stats = dict(self.stats, unwritten_rows=remaining)
+        if remaining and self.logger is not None:
+            handle_log(self.logger, f"write-behind closed with {remaining} unwritten rows")
+        elif self.logger is not None:
+            handle_log(self.logger, f"write-behind closed: {stats}", logging.INFO)
+        return stats
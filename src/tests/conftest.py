@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""
+pytest の共通設定です。コンテナと同じく /src（このディレクトリの親）をモジュールの検索パスに追加します。
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
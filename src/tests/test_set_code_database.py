@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+IPO銘柄の挿入（insert_ipo_to_db → insert_rows_to_database）で、データベースに渡す値を確認するテストです。
+
+データベースの接続（pooled_connection）は、実行したクエリと値を記録する接続に差し替えます。
+"""
+import contextlib
+import pytest
+from database import set_code_database
+from dev_servers.fake_master_data_server import make_ipo_html
+from logic.set_code_logic import insert_ipo_to_db, parse_ipo_df
+
+
+class RecordingCursor:
+    def __init__(self, executed):
+        self.executed = executed
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params):
+        self.executed.append(params)
+        self.rowcount = len(params[0])
+
+
+class RecordingConnection:
+    closed = False
+
+    def __init__(self):
+        self.executed = []
+
+    def cursor(self):
+        return RecordingCursor(self.executed)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    conn = RecordingConnection()
+    monkeypatch.setattr(set_code_database, "pooled_connection", lambda db_params: contextlib.nullcontext(conn))
+    return conn
+
+
+def test_float_codes_are_sent_as_integers(connection):
+    # 空のコードの行（読み飛ばす名証の行を含む）があると、コードの列は浮動小数点数になる
+    html = make_ipo_html([
+        ("9999", "テストホールディングス", "東G"),
+        ("", "コード未定", "東S"),
+        ("", "名証テスト", "名M"),
+    ]).decode("utf-8")
+    df = parse_ipo_df(html)
+    assert df["code"].dtype == "float64"
+
+    inserted = insert_ipo_to_db({}, df)
+
+    codes, names, categories = connection.executed[0]
+    assert codes == ["9999"]
+    assert names == ["テストホールディングス"]
+    assert categories == ["G"]
+    assert inserted == 1
+
+
+def test_integer_codes_are_sent_unchanged(connection):
+    df = parse_ipo_df(make_ipo_html([("9999", "A", "東G"), ("9998", "B", "東S")]).decode("utf-8"))
+
+    insert_ipo_to_db({}, df)
+
+    assert connection.executed[0][0] == ["9999", "9998"]
+
+
+def test_empty_rows_are_not_executed(connection):
+    df = parse_ipo_df(make_ipo_html([("", "コード未定", "東S")]).decode("utf-8"))
+
+    assert insert_ipo_to_db({}, df) == 0
+    assert connection.executed == []
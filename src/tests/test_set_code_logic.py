@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+refresh_master_data の条件付きダウンロードを、ローカルの疑似サーバー（dev_servers.fake_master_data_server）に
+対して確認するテストです。
+
+データベースへの反映（update_jpx_to_db / insert_ipo_to_db）とmaster_stock_tableの行の有無は、
+呼び出しを記録する関数に差し替えます。data_j.xls の解析も差し替え、内容だけを記録します。
+"""
+import json
+import pytest
+from dev_servers.fake_master_data_server import IPO_PATH, JPX_PATH, FakeMasterDataServer
+from logic import set_code_logic
+
+JPX_CONTENT = b"jpx master v1"
+
+
+@pytest.fixture
+def applied(monkeypatch):
+    """
+    データベースへの反映の呼び出しを記録する辞書を返すフィクスチャ
+    """
+    calls = {"jpx": [], "ipo": [], "has_rows": True}
+    monkeypatch.setattr(set_code_logic, "parse_jpx_df", lambda content: content)
+    monkeypatch.setattr(set_code_logic, "update_jpx_to_db", lambda db_params, df: calls["jpx"].append(df) or len(df))
+    monkeypatch.setattr(set_code_logic, "insert_ipo_to_db", lambda db_params, df: calls["ipo"].append(df) or len(df))
+    monkeypatch.setattr(set_code_logic, "master_table_has_rows", lambda db_params: calls["has_rows"])
+    return calls
+
+
+def start_server(monkeypatch, validators=True):
+    server = FakeMasterDataServer(jpx_content=JPX_CONTENT, validators=validators)
+    server.start_background()
+    monkeypatch.setattr(set_code_logic, "JPX_DATA_URL", server.url(JPX_PATH))
+    monkeypatch.setattr(set_code_logic, "IPO_LIST_URL", server.url(IPO_PATH))
+    return server
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = start_server(monkeypatch)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "cache" / "master_download_cache.json")
+
+
+def test_changed_downloads_are_applied_and_cached(server, applied, cache_path):
+    stats = set_code_logic.refresh_master_data({}, cache_path=cache_path)
+
+    assert stats["jpx"]["status"] == "changed"
+    assert stats["ipo"]["status"] == "changed"
+    assert applied["jpx"] == [JPX_CONTENT]
+    # 東証以外と上場中止の行は読み込まない
+    assert applied["ipo"][0]["code"].tolist() == [9999, 9998]
+    with open(cache_path) as file:
+        cache = json.load(file)
+    assert set(cache) == {server.url(JPX_PATH), server.url(IPO_PATH)}
+    assert all(entry["etag"] and entry["sha256"] for entry in cache.values())
+
+
+def test_not_modified_is_skipped(server, applied, cache_path):
+    set_code_logic.refresh_master_data({}, cache_path=cache_path)
+    stats = set_code_logic.refresh_master_data({}, cache_path=cache_path)
+
+    assert stats["jpx"] == {"status": "not_modified"}
+    assert stats["ipo"] == {"status": "not_modified"}
+    assert len(applied["jpx"]) == 1
+    assert len(applied["ipo"]) == 1
+    assert server.requests[(JPX_PATH, 304)] == 1
+    assert server.requests[(IPO_PATH, 304)] == 1
+
+
+def test_only_the_changed_file_is_applied(server, applied, cache_path):
+    set_code_logic.refresh_master_data({}, cache_path=cache_path)
+    server.set_content(JPX_PATH, b"jpx master v2")
+    stats = set_code_logic.refresh_master_data({}, cache_path=cache_path)
+
+    assert stats["jpx"]["status"] == "changed"
+    assert stats["ipo"] == {"status": "not_modified"}
+    assert applied["jpx"] == [JPX_CONTENT, b"jpx master v2"]
+
+
+def test_unchanged_hash_is_skipped_without_validators(monkeypatch, applied, cache_path):
+    server = start_server(monkeypatch, validators=False)
+    try:
+        set_code_logic.refresh_master_data({}, cache_path=cache_path)
+        stats = set_code_logic.refresh_master_data({}, cache_path=cache_path)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert stats["jpx"] == {"status": "unchanged"}
+    assert stats["ipo"] == {"status": "unchanged"}
+    assert len(applied["jpx"]) == 1
+    assert server.requests[(JPX_PATH, 200)] == 2
+
+
+def test_cache_is_ignored_when_master_table_is_empty(server, applied, cache_path):
+    set_code_logic.refresh_master_data({}, cache_path=cache_path)
+    # データベースを作り直した場合は、キャッシュが残っていてもすべて反映し直す
+    applied["has_rows"] = False
+    stats = set_code_logic.refresh_master_data({}, cache_path=cache_path)
+
+    assert stats["cache_used"] is False
+    assert stats["jpx"]["status"] == "changed"
+    assert stats["ipo"]["status"] == "changed"
+    assert len(applied["jpx"]) == 2
+    assert len(applied["ipo"]) == 2
+    assert (JPX_PATH, 304) not in server.requests
+
+    # 反映し直した結果は保存され、次回からはキャッシュを使う
+    applied["has_rows"] = True
+    stats = set_code_logic.refresh_master_data({}, cache_path=cache_path)
+    assert stats["cache_used"] is True
+    assert stats["jpx"] == {"status": "not_modified"}
+
+
+def test_failed_apply_does_not_update_cache(server, applied, cache_path, monkeypatch):
+    def fail(db_params, df):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(set_code_logic, "update_jpx_to_db", fail)
+    with pytest.raises(RuntimeError):
+        set_code_logic.refresh_master_data({}, cache_path=cache_path)
+    monkeypatch.setattr(set_code_logic, "update_jpx_to_db", lambda db_params, df: applied["jpx"].append(df))
+    stats = set_code_logic.refresh_master_data({}, cache_path=cache_path)
+
+    assert stats["jpx"]["status"] == "changed"
+    assert applied["jpx"] == [JPX_CONTENT]
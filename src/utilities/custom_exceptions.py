@@ -10,3 +10,10 @@ class NoMatchingCodeError(Exception):
     対応するコードが存在しないときに発生する例外クラス
     """
     pass
+
+
+class ShardFetchError(Exception):
+    """
+    シャードに分割した株価データの取得で、一部のシャードが失敗したときに発生する例外クラス
+    """
+    pass
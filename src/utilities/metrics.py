@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、ITAパイプラインの計測用のカウンター、ゲージ、ヒストグラムと、その公開方法を提供するモジュールです。
+
+ファイルの概要:
+- Counter / Gauge / Histogram: ラベル毎の値を保持するメトリクスクラス
+- counter(name, ...) / gauge(name, ...) / histogram(name, ...): プロセス共通のレジストリからメトリクスを取得する関数
+- stage_timer(stage): 処理段階の所要時間を ita_stage_seconds に記録するコンテキストマネージャ
+- heartbeat(): 取得プロセスの処理が進んだ時刻を ita_heartbeat_timestamp_seconds に記録する関数
+- render_prometheus(): すべてのメトリクスをPrometheusのテキスト形式で返す関数
+- start_metrics_server(port): /metrics を返すHTTPサーバーを別スレッドで起動する関数
+- start_metrics_file_dump(path, interval): 一定間隔でメトリクスをファイルに書き出すスレッドを起動する関数
+- parse_prometheus(text): Prometheusのテキスト形式を読み込む関数（他のプロセスが書き出したメトリクスの集計用）
+
+注意事項:
+- 記録は1回あたりロック1回とbisect程度の処理のため、10Hz × 数百銘柄でも負荷は無視できる程度です。
+- ゲージには値を設定するほか、出力時に呼び出す関数（set_function）を登録できます。
+"""
+import bisect
+import contextlib
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ヒストグラムのバケットの既定値（秒）
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0,
+)
+DEFAULT_DUMP_INTERVAL = 10.0
+
+_SAMPLE_PATTERN = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)')
+_LABEL_PATTERN = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def _format_labels(labels):
+    """
+    ラベルのタプルをPrometheusのテキスト形式に変換する関数
+
+    Args:
+        labels (tuple): (ラベル名, 値) のタプル
+
+    Returns:
+        str: {name="value",...} の文字列（ラベルがない場合は空文字列）
+    """
+    if not labels:
+        return ""
+    escaped = (
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    """
+    メトリクスの共通部分（名前、説明、ラベル毎の値）を持つ基底クラス
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self._values = {}
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted(labels.items())) if labels else ()
+
+    def render(self):
+        """
+        Prometheusのテキスト形式の行のリストを返すメソッド
+
+        Returns:
+            list: 出力する行のリスト
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """
+    増加のみするカウンタークラス
+    """
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        """
+        カウンターを増やすメソッド
+
+        Args:
+            amount (float): 増やす量
+            **labels: ラベル
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """
+    任意の値を取るゲージクラス
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation):
+        super().__init__(name, documentation)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        """
+        ゲージの値を設定するメソッド
+
+        Args:
+            value (float): 値
+            **labels: ラベル
+        """
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function, **labels):
+        """
+        出力時に呼び出して値を取得する関数を登録するメソッド
+
+        Args:
+            function (callable): 値を返す関数（Noneの場合は登録を解除）
+            **labels: ラベル
+        """
+        key = self._key(labels)
+        with self._lock:
+            if function is None:
+                self._functions.pop(key, None)
+                self._values.pop(key, None)
+            else:
+                self._functions[key] = function
+
+    def render(self):
+        with self._lock:
+            functions = list(self._functions.items())
+        for key, function in functions:
+            try:
+                value = function()
+            except Exception:
+                continue
+            with self._lock:
+                self._values[key] = value
+        return super().render()
+
+
+class Histogram(_Metric):
+    """
+    累積バケット、合計、件数を持つヒストグラムクラス
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """
+        値を記録するメソッド
+
+        Args:
+            value (float): 記録する値
+            **labels: ラベル
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[key] = state
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self, **labels):
+        """
+        ラベルの件数と合計を返すメソッド
+
+        Returns:
+            tuple: (件数, 合計)
+        """
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (0, 0.0) if state is None else (state[2], state[1])
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = [(labels, list(state[0]), state[1], state[2]) for labels, state in self._values.items()]
+        for labels, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                bucket_labels = labels + (("le", _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _get_or_create(metric_class, name, documentation, **kwargs):
+    """
+    レジストリからメトリクスを取得し、なければ作成する関数
+
+    Args:
+        metric_class (type): メトリクスのクラス
+        name (str): メトリクス名
+        documentation (str): 説明
+
+    Returns:
+        _Metric: メトリクス
+    """
+    metric = _registry.get(name)
+    if metric is None:
+        with _registry_lock:
+            metric = _registry.get(name)
+            if metric is None:
+                metric = metric_class(name, documentation, **kwargs)
+                _registry[name] = metric
+    if not isinstance(metric, metric_class):
+        raise ValueError(f"metric {name} is already registered as {metric.kind}")
+    return metric
+
+
+def counter(name, documentation=""):
+    return _get_or_create(Counter, name, documentation)
+
+
+def gauge(name, documentation=""):
+    return _get_or_create(Gauge, name, documentation)
+
+
+def histogram(name, documentation="", buckets=DEFAULT_BUCKETS):
+    return _get_or_create(Histogram, name, documentation, buckets=buckets)
+
+
+# ITAパイプラインの処理段階毎の所要時間
+STAGE_SECONDS = histogram("ita_stage_seconds", "Latency of each ITA pipeline stage in seconds.")
+# 取得プロセスの処理が最後に進んだ時刻（監視プロセスが生存確認に使用）
+HEARTBEAT = gauge("ita_heartbeat_timestamp_seconds", "Unix time when the collector last made progress.")
+
+
+def heartbeat():
+    """
+    取得プロセスの処理が進んだ時刻（エポック秒）を記録する関数
+
+    タスクの完了時や立会時間外の待機中に呼び出し、監視プロセス（logic.collector_supervisor_logic）は
+    メトリクスファイルのこの値が更新されなくなったプロセスを停止・再起動します。
+    """
+    HEARTBEAT.set(time.time())
+
+
+@contextlib.contextmanager
+def stage_timer(stage):
+    """
+    処理段階の所要時間を ita_stage_seconds に記録するコンテキストマネージャ
+
+    Args:
+        stage (str): 処理段階の名前（build_request / http / decode / db_write / tick など）
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start_time, stage=stage)
+
+
+def render_prometheus():
+    """
+    すべてのメトリクスをPrometheusのテキスト形式で返す関数
+
+    Returns:
+        str: Prometheusのテキスト形式の文字列
+    """
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda metric: metric.name)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """
+    /metrics にPrometheusのテキスト形式を返すハンドラクラス
+    """
+
+    def log_message(self, format, *args):
+        return
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """
+    /metrics を返すHTTPサーバーを別スレッドで起動する関数
+
+    Args:
+        port (int): 待ち受けるポート
+        host (str): 待ち受けるホスト
+
+    Returns:
+        ThreadingHTTPServer: 起動したサーバー（停止する場合は shutdown() を呼びます）
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="ita-metrics", daemon=True).start()
+    return server
+
+
+def dump_metrics(path):
+    """
+    メトリクスをファイルに書き出す関数（一時ファイル経由で置き換えます）
+
+    Args:
+        path (str): 書き出し先のパス
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as file:
+        file.write(render_prometheus())
+    os.replace(temp_path, path)
+
+
+def start_metrics_file_dump(path, interval=DEFAULT_DUMP_INTERVAL):
+    """
+    一定間隔でメトリクスをファイルに書き出すスレッドを起動する関数
+
+    Args:
+        path (str): 書き出し先のパス
+        interval (float): 書き出す間隔（秒）
+
+    Returns:
+        threading.Event: setすると最後に1回書き出してスレッドを終了するイベント
+    """
+    stop_event = threading.Event()
+
+    def run():
+        while not stop_event.wait(interval):
+            dump_metrics(path)
+        dump_metrics(path)
+
+    threading.Thread(target=run, name="ita-metrics-dump", daemon=True).start()
+    return stop_event
+
+
+def parse_prometheus(text):
+    """
+    Prometheusのテキスト形式を読み込む関数（他のプロセスが書き出したメトリクスの集計用）
+
+    Args:
+        text (str): Prometheusのテキスト形式の文字列
+
+    Returns:
+        dict: (メトリクス名, ラベルのタプル) -> 値
+    """
+    samples = {}
+    for line in text.splitlines():
+        match = _SAMPLE_PATTERN.match(line)
+        if match is None:
+            continue
+        name, labels, value = match.groups()
+        labels = tuple(
+            (label, re.sub(r"\\(.)", r"\1", label_value))
+            for label, label_value in _LABEL_PATTERN.findall(labels or "")
+        )
+        try:
+            samples[(name, labels)] = float(value)
+        except ValueError:
+            continue
+    return samples
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+このファイルは、東証の営業日と1日の立会時間の区分を事前に計算しておくカレンダーを提供するモジュールです。
+
+ファイルの概要:
+- JST: 日本標準時のタイムゾーン
+- SessionWindow: 1日の中の時間の区分（寄付前・前場・昼休み・後場・大引け後）を表すクラス
+- TradingCalendar: 複数年分の休業日と営業日毎の区分を保持するクラス
+- get_trading_calendar(): プロセスで共有するカレンダーを返す関数
+
+注意事項:
+- 休業日は土日、holidays.JP の祝日（振替休日を含む）と、年末年始（12月31日、1月2日、1月3日）です。
+- 休業日と区分は構築時に前年から3年後までまとめて計算し、日付の判定は集合と辞書の参照だけで行います。
+  範囲外の年を参照した場合は、その年の分を追加で計算します。
+- 立会時間の既定値は前場 9:00～11:30、後場 12:30～15:00 です。環境変数 JPX_AFTERNOON_CLOSE（例: 15:30）で
+  大引けの時刻を変更できます。
+"""
+import datetime
+import os
+import threading
+import holidays
+
+JST = datetime.timezone(datetime.timedelta(hours=9), "JST")
+
+# 祝日以外の休業日（月, 日）
+JPX_EXTRA_HOLIDAYS = ((1, 2), (1, 3), (12, 31))
+
+# 1日の区分の名前
+PRE_OPEN = "pre_open"
+MORNING = "morning"
+LUNCH = "lunch"
+AFTERNOON = "afternoon"
+CLOSED = "closed"
+HOLIDAY = "holiday"
+TRADING_SESSIONS = (MORNING, AFTERNOON)
+
+# 立会時間の既定値
+DEFAULT_MORNING_OPEN = datetime.time(9, 0)
+DEFAULT_MORNING_CLOSE = datetime.time(11, 30)
+DEFAULT_AFTERNOON_OPEN = datetime.time(12, 30)
+DEFAULT_AFTERNOON_CLOSE = datetime.time(15, 0)
+
+# 構築時に計算する年の範囲（今年からの相対値）
+PRECOMPUTED_YEARS = range(-1, 4)
+
+
+class SessionWindow:
+    """
+    1日の中の時間の区分を表すクラス
+
+    Attributes:
+        name (str): 区分の名前（pre_open / morning / lunch / afternoon / closed / holiday）
+        start (float): 開始時刻（エポック秒）
+        end (float): 終了時刻（エポック秒、この時刻は含まない）
+        trading (bool): 立会時間（前場・後場）かどうか
+    """
+    __slots__ = ("name", "start", "end", "trading")
+
+    def __init__(self, name, start, end):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.trading = name in TRADING_SESSIONS
+
+    def __contains__(self, epoch):
+        return self.start <= epoch < self.end
+
+    def __repr__(self):
+        start = datetime.datetime.fromtimestamp(self.start, JST).strftime("%Y-%m-%d %H:%M")
+        end = datetime.datetime.fromtimestamp(self.end, JST).strftime("%H:%M")
+        return f"SessionWindow({self.name} {start}-{end})"
+
+
+def _parse_time(value, default):
+    """
+    "HH:MM" 形式の文字列を datetime.time に変換する関数
+
+    Args:
+        value (str): 時刻の文字列（空またはNoneの場合は default）
+        default (datetime.time): 既定値
+
+    Returns:
+        datetime.time: 変換した時刻
+    """
+    if not value:
+        return default
+    return datetime.datetime.strptime(value, "%H:%M").time()
+
+
+def _epoch(date, time_of_day):
+    return datetime.datetime.combine(date, time_of_day, JST).timestamp()
+
+
+class TradingCalendar:
+    """
+    東証の営業日と1日の立会時間の区分を保持するクラス
+
+    Attributes:
+        morning_open (datetime.time): 前場の開始時刻
+        morning_close (datetime.time): 前場の終了時刻
+        afternoon_open (datetime.time): 後場の開始時刻
+        afternoon_close (datetime.time): 大引けの時刻
+
+    Methods:
+        is_trading_day(date): 営業日かどうかを返すメソッド
+        sessions(date): その日の区分のタプルを返すメソッド
+        window_at(epoch): 指定した時刻を含む区分を返すメソッド
+        close_at(date): その日の大引けの時刻（エポック秒）を返すメソッド
+        is_before_close(epoch): 指定した時刻がその日の大引けより前かどうかを返すメソッド
+        next_trading_day(date): 指定した日より後の最初の営業日を返すメソッド
+    """
+
+    def __init__(self, years=None, morning_open=DEFAULT_MORNING_OPEN, morning_close=DEFAULT_MORNING_CLOSE,
+                 afternoon_open=DEFAULT_AFTERNOON_OPEN, afternoon_close=DEFAULT_AFTERNOON_CLOSE):
+        """
+        カレンダークラスのコンストラクタ
+
+        Args:
+            years (iterable): 事前に計算する年（省略時は前年から3年後まで）
+            morning_open (datetime.time): 前場の開始時刻
+            morning_close (datetime.time): 前場の終了時刻
+            afternoon_open (datetime.time): 後場の開始時刻
+            afternoon_close (datetime.time): 大引けの時刻
+        """
+        if not morning_open < morning_close <= afternoon_open < afternoon_close:
+            raise ValueError("session times must be in order: morning open < morning close <= afternoon open < close")
+        self.morning_open = morning_open
+        self.morning_close = morning_close
+        self.afternoon_open = afternoon_open
+        self.afternoon_close = afternoon_close
+
+        self._lock = threading.Lock()
+        self._years = set()
+        self._sessions = {}
+        if years is None:
+            this_year = datetime.datetime.now(JST).year
+            years = [this_year + offset for offset in PRECOMPUTED_YEARS]
+        self._add_years(years)
+
+    def _add_years(self, years):
+        """
+        休業日と営業日毎の区分を年単位で計算して追加するメソッド
+
+        Args:
+            years (iterable): 追加する年
+        """
+        years = sorted(set(years) - self._years)
+        if not years:
+            return
+        closed_days = set(holidays.JP(years=years))
+        for year in years:
+            closed_days.update(datetime.date(year, month, day) for month, day in JPX_EXTRA_HOLIDAYS)
+
+        sessions = {}
+        for year in years:
+            date = datetime.date(year, 1, 1)
+            while date.year == year:
+                if date.weekday() < 5 and date not in closed_days:
+                    sessions[date] = self._build_sessions(date)
+                date += datetime.timedelta(days=1)
+
+        with self._lock:
+            self._sessions.update(sessions)
+            self._years.update(years)
+
+    def _build_sessions(self, date):
+        """
+        営業日の区分を作成するメソッド
+
+        Args:
+            date (datetime.date): 営業日
+
+        Returns:
+            tuple: SessionWindowのタプル（寄付前・前場・昼休み・後場・大引け後）
+        """
+        day_start = _epoch(date, datetime.time(0, 0))
+        day_end = day_start + 86400
+        boundaries = (
+            day_start,
+            _epoch(date, self.morning_open),
+            _epoch(date, self.morning_close),
+            _epoch(date, self.afternoon_open),
+            _epoch(date, self.afternoon_close),
+            day_end,
+        )
+        names = (PRE_OPEN, MORNING, LUNCH, AFTERNOON, CLOSED)
+        return tuple(
+            SessionWindow(name, start, end)
+            for name, start, end in zip(names, boundaries, boundaries[1:])
+            if start < end
+        )
+
+    def _ensure_year(self, year):
+        if year not in self._years:
+            self._add_years([year])
+
+    def is_trading_day(self, date):
+        """
+        営業日かどうかを返すメソッド
+
+        Args:
+            date (datetime.date): 判定する日付
+
+        Returns:
+            bool: 営業日であればTrue
+        """
+        self._ensure_year(date.year)
+        return date in self._sessions
+
+    def sessions(self, date):
+        """
+        その日の区分のタプルを返すメソッド
+
+        Args:
+            date (datetime.date): 日付
+
+        Returns:
+            tuple: SessionWindowのタプル（休業日の場合は1日全体の holiday の区分のみ）
+        """
+        self._ensure_year(date.year)
+        sessions = self._sessions.get(date)
+        if sessions is None:
+            day_start = _epoch(date, datetime.time(0, 0))
+            return (SessionWindow(HOLIDAY, day_start, day_start + 86400),)
+        return sessions
+
+    def window_at(self, epoch):
+        """
+        指定した時刻を含む区分を返すメソッド
+
+        Args:
+            epoch (float): 時刻（エポック秒）
+
+        Returns:
+            SessionWindow: 時刻を含む区分
+        """
+        date = datetime.datetime.fromtimestamp(epoch, JST).date()
+        for window in self.sessions(date):
+            if epoch < window.end:
+                return window
+        return window
+
+    def close_at(self, date):
+        """
+        その日の大引けの時刻を返すメソッド
+
+        Args:
+            date (datetime.date): 日付
+
+        Returns:
+            float: 大引けの時刻（エポック秒、休業日の場合はNone）
+        """
+        if not self.is_trading_day(date):
+            return None
+        return _epoch(date, self.afternoon_close)
+
+    def is_before_close(self, epoch):
+        """
+        指定した時刻がその日の大引けより前かどうかを返すメソッド
+
+        Args:
+            epoch (float): 時刻（エポック秒）
+
+        Returns:
+            bool: 営業日の大引けより前であればTrue（休業日はFalse）
+        """
+        close_at = self.close_at(datetime.datetime.fromtimestamp(epoch, JST).date())
+        return close_at is not None and epoch < close_at
+
+    def next_trading_day(self, date):
+        """
+        指定した日より後の最初の営業日を返すメソッド
+
+        Args:
+            date (datetime.date): 日付
+
+        Returns:
+            datetime.date: 次の営業日
+        """
+        date += datetime.timedelta(days=1)
+        while not self.is_trading_day(date):
+            date += datetime.timedelta(days=1)
+        return date
+
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+
+def get_trading_calendar():
+    """
+    プロセスで共有するカレンダーを返す関数（初回の呼び出し時に作成します）
+
+    Returns:
+        TradingCalendar: カレンダーのインスタンス
+    """
+    global _calendar
+    if _calendar is None:
+        with _calendar_lock:
+            if _calendar is None:
+                _calendar = TradingCalendar(
+                    afternoon_close=_parse_time(os.environ.get("JPX_AFTERNOON_CLOSE"), DEFAULT_AFTERNOON_CLOSE)
+                )
+    return _calendar
@@ -8,8 +8,8 @@
 import datetime
 import subprocess
 import urllib.parse
-import holidays
 import logging
+from utilities.trading_calendar import JST, get_trading_calendar
 
 
 def convert_empty_string_to_none(item):
@@ -56,23 +56,17 @@ def is_holiday_jpx(date):
     Returns:
     bool: 休日であればTrue、休日でなければFalseを返します。
     """
-    # 東証の休日カレンダーを取得
-    jpx_holidays = holidays.JP(years=datetime.date.today().year)
-
-    # 祝日として1月2日、1月3日、12月31日を追加
-    jpx_holidays.append({datetime.date(datetime.date.today().year, 1, 2): "2nd January"})
-    jpx_holidays.append({datetime.date(datetime.date.today().year, 1, 3): "3rd January"})
-    jpx_holidays.append({datetime.date(datetime.date.today().year, 12, 31): "31st December"})
-
     # dateが文字列の場合はdatetime.dateオブジェクトに変換
     if isinstance(date, str):
         try:
             date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
         except ValueError:
             raise ValueError("Invalid date format. Please use 'YYYY-MM-DD' format.")
+    elif isinstance(date, datetime.datetime):
+        date = date.date()
 
-    # 判定
-    return date in jpx_holidays or date.weekday() >= 5  # 土曜日(5)か日曜日(6)であれば休日とみなす
+    # 判定（土日・祝日・年末年始の休業日は事前に計算したカレンダーを参照）
+    return not get_trading_calendar().is_trading_day(date)
 
 
 def is_today_holiday():
@@ -82,8 +76,8 @@ def is_today_holiday():
     Returns:
     bool: 今日が休日であればTrue、休日でなければFalseを返します。
     """
-    # 今日の日付を取得
-    today = datetime.date.today()
+    # 今日の日付（日本時間）を取得
+    today = datetime.datetime.now(JST).date()
 
     # 今日が東証の休日か否かを判定
     is_holiday_today = is_holiday_jpx(today)